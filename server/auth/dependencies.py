@@ -2,13 +2,24 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import PyJWTError
 import jwt
+import hashlib
+import time
+from bson import ObjectId
 from config.settings import settings
 from config.database import db
 from models.user import UserRole
 from auth.utils import SECRET_KEY, ALGORITHM
+from services.cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# (user id, token digest) -> user document; keeps polling clients off Mongo
+user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_MAX_ENTRIES, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: str):
+    """Drop cached documents of a user; call after changing or deleting them."""
+    user_cache.invalidate_where(lambda key: key[0] == str(user_id))
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -18,27 +29,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        role: str = payload.get("role")
         if user_id is None:
             raise credentials_exception
-        # token_data = {"sub": user_id, "role": role}
     except PyJWTError:
         raise credentials_exception
-    
-    # Database lookup
-    user = await db.db.users.find_one({"_id": user_id}) 
-    
+
+    cache_key = (user_id, hashlib.sha256(token.encode()).hexdigest())
+    user = user_cache.get(cache_key)
     if user is None:
-        from bson import ObjectId
-        try:
-             user = await db.db.users.find_one({"_id": ObjectId(user_id)})
-        except:
-             pass
-        
+        # Tokens carry str(ObjectId); non-ObjectId subjects are legacy string ids
+        lookup_id = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+        user = await db.db.users.find_one({"_id": lookup_id}, {"hashed_password": 0})
         if user is None:
             raise credentials_exception
-            
-    return user
+        # Never outlive the token: an expired token must fail decode, not hit the cache
+        ttl = settings.AUTH_USER_CACHE_TTL_SECONDS
+        if payload.get("exp"):
+            ttl = min(ttl, max(0, payload["exp"] - time.time()))
+        user_cache.set(cache_key, user, ttl=ttl)
+
+    # Handlers may add keys (e.g. /auth/me sets "id"); keep the cached document pristine
+    return dict(user)
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     return current_user
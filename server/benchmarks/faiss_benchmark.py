@@ -0,0 +1,277 @@
+"""
+Search latency and recall benchmark for FaissService index configurations.
+
+Fills a FaissService with N synthetic 512-d unit vectors and, for each index
+configuration (exact flat, IVF-Flat, HNSW, IVF-PQ), reports build time,
+memory, QPS and p50/p99 latency for single and batched queries, plus recall
+against exact search:
+
+- recall@k: share of the exact k nearest neighbours that were returned.
+- threshold recall: share of the exact neighbours within MAX_DISTANCE (what
+  the search endpoint actually keeps) that were returned.
+
+Vectors are grouped into synthetic identities (several faces per person),
+with the spread chosen so faces of one identity fall within MAX_DISTANCE of
+each other, like real FaceNet embeddings. Uniform random vectors have no such
+structure and would understate IVF/HNSW recall. Queries are fresh samples of
+existing identities, like selfies.
+
+Usage (from server/):
+    python -m benchmarks.faiss_benchmark --sizes 10000,100000,1000000 --output faiss.json
+    python -m benchmarks.faiss_benchmark --sizes 1000000 --configs ivf,hnsw --nprobe 8,32,128 --ef-search 64,256
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import faiss  # noqa: E402
+from benchmarks.ingest_benchmark import _environment, _git_commit  # noqa: E402
+from services.faiss_service import FaissService  # noqa: E402
+
+# Same cut-off and k as routers/search.py
+MAX_DISTANCE = 0.8
+K_SEARCH = 100
+CHUNK_SIZE = 100_000
+
+class SyntheticFaces:
+    """
+    Deterministic stream of normalized embeddings grouped into identities.
+    Chunks are regenerated from the seed on demand, so N can exceed what
+    fits in memory twice (once for the index, once for the data).
+    """
+
+    def __init__(self, n: int, dimension: int, faces_per_identity: int, spread: float, seed: int):
+        self.n = n
+        self.dimension = dimension
+        self.spread = spread
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.centroids = self._normalize(rng.standard_normal((max(1, n // faces_per_identity), dimension), dtype=np.float32))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    def _sample(self, rng, count: int) -> np.ndarray:
+        identities = rng.integers(len(self.centroids), size=count)
+        noise = rng.standard_normal((count, self.dimension), dtype=np.float32)
+        noise *= self.spread / np.sqrt(self.dimension)
+        return self._normalize(self.centroids[identities] + noise)
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE):
+        """Yield (ids, vectors) chunks covering ids 0..n-1."""
+        for start in range(0, self.n, chunk_size):
+            count = min(chunk_size, self.n - start)
+            rng = np.random.default_rng([self.seed, 0, start])
+            yield np.arange(start, start + count, dtype=np.int64), self._sample(rng, count)
+
+    def extra(self, count: int, stream: int) -> np.ndarray:
+        """Vectors that are not in the database (queries, training samples)."""
+        return self._sample(np.random.default_rng([self.seed, 1, stream]), count)
+
+def exact_neighbours(data: SyntheticFaces, queries: np.ndarray, k: int):
+    """Exact k-NN of the queries over the whole stream, merged chunk by chunk."""
+    heap = faiss.ResultHeap(len(queries), k)
+    for ids, vectors in data.chunks():
+        distances, positions = faiss.knn(queries, vectors, min(k, len(vectors)))
+        if positions.shape[1] < k:
+            pad = k - positions.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            positions = np.pad(positions, ((0, 0), (0, pad)), constant_values=-1)
+        heap.add_result(distances, np.where(positions >= 0, ids[np.maximum(positions, 0)], -1))
+    heap.finalize()
+    return heap.D, heap.I
+
+def index_spec(config: str, n: int) -> str:
+    """index_factory string for a configuration name; IVF list counts follow the ~4*sqrt(N) rule."""
+    nlist = max(1, min(65536, int(4 * np.sqrt(n))))
+    specs = {
+        "flat": None,
+        "ivf": f"IVF{nlist},Flat",
+        "hnsw": "HNSW32",
+        "ivfpq": f"IVF{nlist},PQ64",
+    }
+    if config not in specs:
+        raise SystemExit(f"Unknown index configuration {config!r}; choose from {', '.join(specs)}")
+    return specs[config]
+
+def build_service(config: str, data: SyntheticFaces, workdir: str) -> dict:
+    """Fill a FaissService with the stream; returns the service with build stats."""
+    service = FaissService(dimension=data.dimension, index_path=os.path.join(workdir, f"{config}.bin"), model_version="benchmark")
+    spec = index_spec(config, data.n)
+    start = time.perf_counter()
+    train_seconds = 0.0
+    if spec is not None:
+        service.index = faiss.IndexIDMap2(faiss.index_factory(data.dimension, spec, faiss.METRIC_L2))
+        inner = faiss.downcast_index(service.index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efConstruction = 40
+        if not service.index.is_trained:
+            ivf = faiss.extract_index_ivf(service.index)
+            training = data.extra(min(data.n, max(64 * ivf.nlist, 65536)), stream=1)
+            train_start = time.perf_counter()
+            service.index.train(training)
+            train_seconds = time.perf_counter() - train_start
+            del training
+
+    add_seconds = 0.0
+    for ids, vectors in data.chunks():
+        # Ingest hands FaissService plain lists; the conversion is part of the cost
+        embeddings = vectors.tolist()
+        add_start = time.perf_counter()
+        service.add_vectors(embeddings, ids=ids)
+        add_seconds += time.perf_counter() - add_start
+
+    # Ingest saves after every batch, so the save cost matters as much as the size
+    save_start = time.perf_counter()
+    service.save_index()
+    save_seconds = time.perf_counter() - save_start
+
+    return {
+        "service": service,
+        "spec": spec or "IDMap2,Flat",
+        "train_seconds": round(train_seconds, 3),
+        "add_seconds": round(add_seconds, 3),
+        "build_seconds": round(train_seconds + add_seconds, 3),
+        "save_seconds": round(save_seconds, 3),
+        "index_mb": round(os.path.getsize(service.index_path) / 2**20, 1),
+        "wall_seconds": round(time.perf_counter() - start, 3)
+    }
+
+def set_search_param(service: FaissService, config: str, value: int):
+    if config in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(service.index).nprobe = value
+    elif config == "hnsw":
+        faiss.downcast_index(service.index.index).hnsw.efSearch = value
+
+def recall(found: np.ndarray, exact_ids: np.ndarray, exact_distances: np.ndarray, k: int) -> dict:
+    """
+    recall@10 and recall@k against exact search, and recall of the exact
+    neighbours within MAX_DISTANCE. With ~20 faces per identity, neighbours
+    far down the top-100 are other people, so threshold recall is the number
+    that predicts missed photos.
+    """
+    top = min(10, k)
+    hits_top, hits_k, hits_threshold, total_threshold = 0, 0, 0, 0
+    for row, truth, truth_distances in zip(found, exact_ids[:, :k], exact_distances[:, :k]):
+        returned = set(row[row >= 0].tolist())
+        hits_top += len(set(row[:top].tolist()).intersection(truth[:top].tolist()))
+        hits_k += len(returned.intersection(truth.tolist()))
+        within = truth[truth_distances <= MAX_DISTANCE]
+        total_threshold += len(within)
+        hits_threshold += len(returned.intersection(within.tolist()))
+    return {
+        f"recall_at_{top}": round(hits_top / (len(found) * top), 4),
+        f"recall_at_{k}": round(hits_k / (len(found) * k), 4),
+        "threshold_recall": round(hits_threshold / total_threshold, 4) if total_threshold else None,
+        "neighbours_within_threshold": round(total_threshold / len(found), 2)
+    }
+
+def _latency_stats(latencies: list, queries: int) -> dict:
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "qps": round(queries / (latencies.sum() / 1000), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3)
+    }
+
+def measure_search(service: FaissService, queries: np.ndarray, k: int, batch_size: int, exact) -> dict:
+    # Single queries through FaissService.search, the path the search endpoint takes
+    single = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries.tolist()):
+        start = time.perf_counter()
+        _, ids = service.search(query, k=k)
+        single.append(time.perf_counter() - start)
+        found[i] = ids
+
+    # Batched queries straight on the index (amortizes per-call overhead)
+    batched = []
+    for start_row in range(0, len(queries), batch_size):
+        start = time.perf_counter()
+        service.index.search(queries[start_row:start_row + batch_size], k)
+        batched.append(time.perf_counter() - start)
+
+    return {
+        "single": _latency_stats(single, len(queries)),
+        "batched": dict(_latency_stats(batched, len(queries)), batch_size=batch_size),
+        **recall(found, exact[1], exact[0], k)
+    }
+
+def _int_list(value: str) -> list:
+    return [int(float(v)) for v in value.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS search latency and recall benchmark")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated index sizes (e.g. 10000,1e6,1e7)")
+    parser.add_argument("--configs", default="flat,ivf,hnsw,ivfpq", help="Index configurations to measure")
+    parser.add_argument("--nprobe", default="1,8,32,128", help="nprobe values for IVF configurations")
+    parser.add_argument("--ef-search", default="16,64,256", help="efSearch values for HNSW")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=K_SEARCH)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--faces-per-identity", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.58, help="Per-face noise; 0.58 puts same-identity pairs at ~0.5 squared L2")
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    results = {
+        "benchmark": "faiss",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "commit": _git_commit(),
+        "environment": dict(_environment(), faiss_threads=faiss.omp_get_max_threads()),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "runs": []
+    }
+
+    with tempfile.TemporaryDirectory(prefix="faiss-bench-") as workdir:
+        for n in _int_list(args.sizes):
+            data = SyntheticFaces(n, 512, args.faces_per_identity, args.spread, args.seed)
+            queries = data.extra(args.queries, stream=0)
+            start = time.perf_counter()
+            exact = exact_neighbours(data, queries, args.k)
+            print(f"\nN={n:,}: exact ground truth in {time.perf_counter() - start:.1f}s")
+
+            for config in configs:
+                built = build_service(config, data, workdir)
+                service = built.pop("service")
+                params = {"ivf": _int_list(args.nprobe), "ivfpq": _int_list(args.nprobe),
+                          "hnsw": _int_list(args.ef_search)}.get(config, [None])
+                for value in params:
+                    if value is not None:
+                        set_search_param(service, config, value)
+                    run = {"size": n, "config": config, "search_param": value, **built,
+                           **measure_search(service, queries, args.k, args.batch_size, exact)}
+                    results["runs"].append(run)
+                    label = f"{config}" + (f" ({'efSearch' if config == 'hnsw' else 'nprobe'}={value})" if value is not None else "")
+                    print(f"  {label:<24} build {run['build_seconds']:>8.2f}s  size {run['index_mb']:>8.1f}MB  "
+                          f"single {run['single']['qps']:>9.1f} qps p50 {run['single']['p50_ms']:.2f}ms p99 {run['single']['p99_ms']:.2f}ms  "
+                          f"batched {run['batched']['qps']:>9.1f} qps  recall@10 {run[f'recall_at_{min(10, args.k)}']:.3f} @{args.k} {run[f'recall_at_{args.k}']:.3f}  "
+                          f"threshold {run['threshold_recall'] if run['threshold_recall'] is not None else 'n/a'}")
+                del service
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Offline ingest benchmark on synthetic event photo sets.
+
+Generates an event of N photos at a given resolution with a configurable
+number of faces each, then times every ingest stage in isolation with the
+production components (ImageLoader, FaceDetector, IngestFilter, FaceEncoder,
+FaissService, face crop store, derivatives, BulkWriter) and optionally the
+whole process_batch_upload_logic end to end.
+
+Everything runs in a scratch working directory, so the real index, uploads
+and crop store are never touched. MongoDB stages use a throwaway database
+(bench_<id>) that is dropped afterwards, and only run with --mongo.
+
+Faces: with --faces-dir, real face crops (e.g. LFW) are composited onto the
+backgrounds, which is what gives representative detect/encode numbers.
+Without it, simple drawn faces are used; MTCNN finds few of them, so the
+encode/index stages see little work. Decode and detect cost still scale
+with resolution either way.
+
+Usage (from server/):
+    python -m benchmarks.ingest_benchmark --images 200 --resolution 4000x3000 \\
+        --faces-per-image 1-4 --faces-dir ~/lfw --output bench.json
+    python -m benchmarks.ingest_benchmark ... --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+STAGES = ("decode", "detect", "filter", "encode", "index", "crop_store", "derivatives", "persist")
+
+def _rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class StageTimer:
+    """
+    Accumulates wall time and item counts per stage, and samples RSS in a
+    background thread to attribute peak memory to the stage that was running.
+    """
+
+    def __init__(self, sample_interval: float = 0.02):
+        self.seconds = {}
+        self.items = {}
+        self.peak_rss = {}
+        self.current = None
+        self.overall_peak = _rss_mb()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, args=(sample_interval,), daemon=True)
+        self._sampler.start()
+
+    def _sample(self, interval: float):
+        while not self._stop.wait(interval):
+            self._record(_rss_mb())
+
+    def _record(self, rss: float):
+        self.overall_peak = max(self.overall_peak, rss)
+        if self.current:
+            self.peak_rss[self.current] = max(self.peak_rss.get(self.current, 0.0), rss)
+
+    @contextmanager
+    def stage(self, name: str, items: int = 1):
+        previous, self.current = self.current, name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            self.items[name] = self.items.get(name, 0) + items
+            self._record(_rss_mb())
+            self.current = previous
+
+    def close(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def report(self) -> dict:
+        stages = {}
+        for name in STAGES + tuple(n for n in self.seconds if n not in STAGES):
+            if name not in self.seconds:
+                continue
+            seconds, items = self.seconds[name], self.items[name]
+            stages[name] = {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_second": round(items / seconds, 2) if seconds > 0 else None,
+                "ms_per_item": round(1000 * seconds / items, 3) if items else None,
+                "peak_rss_mb": round(self.peak_rss.get(name, 0.0), 1)
+            }
+        return stages
+
+# Synthetic dataset
+
+def _background(rng, width: int, height: int):
+    """Smooth gradient plus low-frequency noise: compresses like a photo, unlike white noise."""
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    base = np.array(rng.integers(40, 200, size=3), dtype=np.float32)
+    gy, gx = np.mgrid[0:height:8, 0:width:8].astype(np.float32)
+    gradient = (gx / max(1, width) - 0.5)[..., None] * rng.uniform(-80, 80, size=3) \
+             + (gy / max(1, height) - 0.5)[..., None] * rng.uniform(-80, 80, size=3)
+    small = np.clip(base + gradient + rng.normal(0, 12, size=gradient.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(small).resize((width, height), Image.Resampling.BILINEAR).filter(ImageFilter.GaussianBlur(2))
+
+def _drawn_face(rng, size: int):
+    from PIL import Image, ImageDraw
+
+    face = Image.new("RGBA", (size, int(size * 1.25)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(face)
+    skin = tuple(int(c) for c in rng.integers([150, 100, 80], [240, 190, 160])) + (255,)
+    w, h = face.size
+    draw.ellipse([0, 0, w - 1, h - 1], fill=skin)
+    eye = max(2, size // 10)
+    for cx in (int(w * 0.32), int(w * 0.68)):
+        draw.ellipse([cx - eye, int(h * 0.4) - eye // 2, cx + eye, int(h * 0.4) + eye // 2], fill=(40, 30, 30, 255))
+    draw.polygon([(w // 2, int(h * 0.45)), (int(w * 0.44), int(h * 0.62)), (int(w * 0.56), int(h * 0.62))], fill=tuple(max(0, c - 30) for c in skin[:3]) + (255,))
+    draw.ellipse([int(w * 0.35), int(h * 0.72), int(w * 0.65), int(h * 0.8)], fill=(150, 60, 60, 255))
+    return face
+
+def generate_event(dest_dir: str, images: int, width: int, height: int, faces_range, faces_dir: str, seed: int) -> dict:
+    """Write a synthetic event as JPEGs; returns dataset stats."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(dest_dir, exist_ok=True)
+    face_files = []
+    if faces_dir:
+        for root, _, files in os.walk(os.path.expanduser(faces_dir)):
+            face_files += [os.path.join(root, f) for f in files if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+        if not face_files:
+            raise SystemExit(f"No face images found under {faces_dir}")
+
+    paths, faces_placed, total_bytes = [], 0, 0
+    for i in range(images):
+        photo = _background(rng, width, height)
+        for _ in range(int(rng.integers(faces_range[0], faces_range[1] + 1))):
+            # Face side between 8% and 25% of the shorter image side (group shots to portraits)
+            side = int(min(width, height) * rng.uniform(0.08, 0.25))
+            if face_files:
+                face = Image.open(face_files[int(rng.integers(len(face_files)))]).convert("RGB")
+                face = face.resize((side, int(side * face.height / face.width)), Image.Resampling.BILINEAR)
+                mask = None
+            else:
+                face = _drawn_face(rng, side)
+                mask = face
+            x = int(rng.integers(0, max(1, width - face.width)))
+            y = int(rng.integers(0, max(1, height - face.height)))
+            photo.paste(face, (x, y), mask)
+            faces_placed += 1
+
+        path = os.path.join(dest_dir, f"{uuid.UUID(int=int(rng.integers(2**63)) << 64 | i)}.jpg")
+        photo.save(path, format="JPEG", quality=90)
+        total_bytes += os.path.getsize(path)
+        paths.append(path)
+
+    return {"paths": paths, "faces_placed": faces_placed, "bytes": total_bytes}
+
+# Benchmark
+
+def run_stages(paths, event_id: str, timer: StageTimer, use_mongo: bool) -> dict:
+    """Time each ingest stage with the production components, in ingest order."""
+    from bson import ObjectId
+    from config.database import get_sync_db
+    from ml.face_detector import face_detector
+    from ml.face_encoder import face_encoder
+    from ml.image_loader import image_loader
+    from ml.ingest_filter import IngestFilter
+    from ml.quality_checker import face_tensors_to_crops
+    from services.bulk_writer import BulkWriter
+    from services.derivatives import generate_derivatives
+    from services.face_crop_store import face_crop_store
+    from services.faiss_service import faiss_service
+
+    ingest_filter = IngestFilter.from_policy(None)
+    writer = BulkWriter(get_sync_db(), label="benchmark") if use_mongo else None
+    detections, photo_docs, decoded = [], [], 0
+
+    for path in paths:
+        with timer.stage("decode"):
+            image = image_loader.load_from_path(path)
+        if image is None:
+            continue
+        decoded += 1
+        photo_id = ObjectId()
+        with timer.stage("derivatives"):
+            variants = generate_derivatives(image, path)
+        photo_docs.append({"_id": photo_id, "event_id": event_id, "file_path": path, "variants": variants})
+        with timer.stage("detect"):
+            found = face_detector.detect_faces(image)
+        with timer.stage("filter", items=len(found)):
+            found = ingest_filter.filter_geometry(found, image.shape)
+        for det in found:
+            det["photo_id"] = photo_id
+        detections.extend(found)
+
+    with timer.stage("filter", items=0):
+        detections = ingest_filter.filter_quality(detections)
+
+    with timer.stage("encode", items=len(detections)):
+        encoded = [det for det in face_encoder.encode_faces(detections) if det.get("embedding") is not None]
+
+    with timer.stage("index", items=len(encoded)):
+        ids = faiss_service.add_vectors([det["embedding"].tolist() for det in encoded])
+        if len(encoded):
+            faiss_service.save_index()
+
+    with timer.stage("crop_store", items=len(encoded)):
+        if encoded:
+            face_crop_store.append(event_id, ids, face_tensors_to_crops([det["face"] for det in encoded]))
+
+    if writer is not None:
+        with timer.stage("persist", items=len(photo_docs) + len(encoded)):
+            writer.add("photos", photo_docs)
+            writer.add("faces", [{
+                "event_id": event_id, "photo_id": det["photo_id"], "bounding_box": det["box"],
+                "confidence": det["confidence"], "image_embedded_number": int(faiss_id)
+            } for det, faiss_id in zip(encoded, ids)])
+            writer.close()
+
+    return {"images_decoded": decoded, "faces_detected": ingest_filter.stats()["faces_detected"],
+            "faces_indexed": len(encoded), "filtering": ingest_filter.stats()}
+
+def run_end_to_end(paths, event_id: str) -> dict:
+    from jobs.tasks import process_batch_upload_logic
+
+    start = time.perf_counter()
+    result = process_batch_upload_logic(f"bench-{uuid.uuid4().hex[:8]}", paths, event_id, "benchmark", "Benchmark")
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "images_per_second": round(len(paths) / seconds, 2), "result": result}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def _environment() -> dict:
+    import numpy
+    env = {"python": platform.python_version(), "platform": platform.platform(),
+           "cpu_count": os.cpu_count(), "numpy": numpy.__version__}
+    try:
+        import torch
+        env.update({"torch": torch.__version__, "device": "cuda" if torch.cuda.is_available() else "cpu",
+                    "torch_threads": torch.get_num_threads()})
+    except ImportError:
+        pass
+    try:
+        import faiss
+        env["faiss"] = faiss.__version__
+    except ImportError:
+        pass
+    return env
+
+def compare(current: dict, baseline: dict):
+    """Print per-stage throughput against a previous run."""
+    print(f"\n{'stage':<12} {'baseline/s':>12} {'current/s':>12} {'change':>9}")
+    for name, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("items_per_second")
+        now = stats.get("items_per_second")
+        change = f"{100 * (now - before) / before:+.1f}%" if before and now else "n/a"
+        print(f"{name:<12} {before or 0:>12.2f} {now or 0:>12.2f} {change:>9}")
+    before, now = baseline.get("images_per_second"), current.get("images_per_second")
+    if before and now:
+        print(f"{'images/s':<12} {before:>12.2f} {now:>12.2f} {100 * (now - before) / before:>+8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest benchmark on a synthetic event")
+    parser.add_argument("--images", type=int, default=50, help="Photos in the synthetic event")
+    parser.add_argument("--resolution", default="4000x3000", help="WIDTHxHEIGHT of generated photos")
+    parser.add_argument("--faces-per-image", default="1-3", help="Faces per photo, N or MIN-MAX")
+    parser.add_argument("--faces-dir", help="Directory of real face crops to composite (recommended)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo", action="store_true", help="Also time persistence against a throwaway MongoDB database")
+    parser.add_argument("--e2e", action="store_true", help="Also run process_batch_upload_logic end to end (needs --mongo)")
+    parser.add_argument("--workdir", help="Scratch directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    low, _, high = args.faces_per_image.partition("-")
+    faces_range = (int(low), int(high or low))
+    if args.e2e and not args.mongo:
+        parser.error("--e2e writes photos and faces; it needs --mongo")
+
+    # Output paths are relative to where the benchmark was started, not the scratch dir
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ingest-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    bench_db = f"bench_{uuid.uuid4().hex[:8]}"
+    # Settings resolve index, crop store and upload paths relative to the cwd
+    os.chdir(workdir)
+    os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["DATABASE_NAME"] = bench_db
+    os.environ["CLUSTERING_ENABLED"] = "false"
+
+    event_id = uuid.uuid4().hex[:24]
+    timer = None
+    try:
+        print(f"Generating {args.images} photos at {width}x{height} in {workdir} ...")
+        start = time.perf_counter()
+        dataset = generate_event(os.path.join(workdir, "uploads", "benchmark", event_id), args.images,
+                                 width, height, faces_range, args.faces_dir, args.seed)
+        print(f"Generated {dataset['faces_placed']} faces, {dataset['bytes'] / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+        # Model loading is excluded from stage timings
+        start = time.perf_counter()
+        import ml.face_detector, ml.face_encoder  # noqa: F401
+        model_load_seconds = time.perf_counter() - start
+
+        timer = StageTimer()
+        start = time.perf_counter()
+        counts = run_stages(dataset["paths"], event_id, timer, args.mongo)
+        total_seconds = time.perf_counter() - start
+
+        results = {
+            "benchmark": "ingest",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": _git_commit(),
+            "environment": _environment(),
+            "config": {"images": args.images, "resolution": [width, height], "faces_per_image": list(faces_range),
+                       "faces_source": "dir" if args.faces_dir else "drawn", "seed": args.seed, "mongo": args.mongo},
+            "dataset": {"faces_placed": dataset["faces_placed"], "megabytes": round(dataset["bytes"] / 1e6, 2)},
+            "model_load_seconds": round(model_load_seconds, 2),
+            "counts": counts,
+            "stages": timer.report(),
+            "total_seconds": round(total_seconds, 3),
+            "images_per_second": round(counts["images_decoded"] / total_seconds, 2) if total_seconds else None,
+            "peak_rss_mb": round(timer.overall_peak, 1)
+        }
+        if args.e2e:
+            results["end_to_end"] = run_end_to_end(dataset["paths"], event_id)
+
+        print(json.dumps({k: results[k] for k in ("stages", "images_per_second", "peak_rss_mb")}, indent=2))
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2, default=str)
+        if baseline_path:
+            with open(baseline_path) as f:
+                compare(results, json.load(f))
+    finally:
+        if timer is not None:
+            timer.close()
+        if args.mongo:
+            try:
+                from config.database import get_sync_client
+                get_sync_client().drop_database(bench_db)
+            except Exception as e:
+                print(f"Could not drop {bench_db}: {e}")
+        os.chdir(SERVER_DIR)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
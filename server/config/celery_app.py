@@ -2,6 +2,7 @@
 # eventlet.monkey_patch()
 
 from celery import Celery
+from kombu import Queue
 from config.settings import settings
 
 # Initialize Celery
@@ -11,17 +12,45 @@ celery_app = Celery(
     "event_photo_system",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["jobs.tasks"] # Auto-load tasks from this module
+    include=["jobs.tasks", "jobs.reembed"] # Auto-load tasks from these modules
 )
 
-# Optional: Configure default queue options
+# Queues: interactive (short, latency-sensitive), ingest (small uploads), bulk (large upload chunks).
+# Run at least one worker on "interactive,ingest" so small uploads never wait behind bulk work.
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    task_queues=(
+        Queue("interactive"),
+        Queue("ingest"),
+        Queue("bulk"),
+    ),
+    task_default_queue="ingest",
+    task_routes={
+        "aggregate_batch_results": {"queue": "interactive"},
+        "test_celery_task": {"queue": "interactive"},
+        "compact_faiss_index": {"queue": "bulk"},
+        "cluster_event_faces": {"queue": "bulk"},
+        "reembed_index": {"queue": "bulk"},
+        "ingest_pending_files": {"queue": "interactive"},
+        # process_batch_upload is routed per call (ingest vs bulk) by jobs.scheduling
+    },
+    # Redis emulates priorities with one list per step; 0 is consumed first
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    task_default_priority=settings.CELERY_DEFAULT_PRIORITY,
+    # Long ML tasks: don't let a busy worker hoard queued tasks other workers could run
+    worker_prefetch_multiplier=settings.CELERY_PREFETCH_MULTIPLIER,
 )
 
+# Queue wait / task timing signal handlers (publisher and worker side)
+import jobs.metrics  # noqa: E402,F401
+
 if __name__ == "__main__":
     celery_app.start()
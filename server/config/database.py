@@ -1,6 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from .settings import settings
 import logging
+import os
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,3 +39,27 @@ class Database:
         return self.db
 
 db = Database()
+
+# Process-lifetime sync client for Celery workers.
+# MongoClient is not fork-safe, so a forked worker child builds its own.
+_sync_client = None
+_sync_client_pid = None
+_sync_client_lock = threading.Lock()
+
+def get_sync_client():
+    """Returns the pooled pymongo client for this process, creating it on first use."""
+    global _sync_client, _sync_client_pid
+    if _sync_client is not None and _sync_client_pid == os.getpid():
+        return _sync_client
+
+    with _sync_client_lock:
+        if _sync_client is None or _sync_client_pid != os.getpid():
+            from pymongo import MongoClient
+            _sync_client = MongoClient(settings.MONGODB_URL, maxPoolSize=settings.MONGO_MAX_POOL_SIZE)
+            _sync_client_pid = os.getpid()
+            logger.info(f"Created pooled MongoDB client for process {_sync_client_pid}")
+    return _sync_client
+
+def get_sync_db():
+    """Returns the sync database handle backed by the pooled client."""
+    return get_sync_client()[settings.DATABASE_NAME]
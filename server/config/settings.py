@@ -14,6 +14,115 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     BASE_URL: str = "http://localhost:3000"
 
+    # Media serving
+    MEDIA_BASE_URL: str = ""  # Host serving /uploads (media_server.py, nginx or a CDN); empty = BASE_URL
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""  # e.g. "/_media/": hand file bodies to nginx (sendfile) via X-Accel-Redirect
+    MEDIA_MUTABLE_MAX_AGE_SECONDS: int = 3600  # Files without a UUID name may be replaced in place
+    DOWNLOAD_MAX_PHOTOS: int = 500  # Photos per ZIP download request
+    DOWNLOAD_CHUNK_SIZE: int = 256 * 1024  # Bytes read from disk per streamed ZIP chunk
+
+    # Password hashing (bcrypt runs on a thread pool, off the event loop)
+    BCRYPT_ROUNDS: int = 12  # Cost factor; existing hashes are upgraded on the next login
+    PASSWORD_HASH_WORKERS: int = 0  # Threads hashing concurrently (0 = one per CPU core)
+
+    # MongoDB (sync client used by Celery workers)
+    MONGO_MAX_POOL_SIZE: int = 20
+    MONGO_BULK_BATCH_SIZE: int = 1000
+    MONGO_WRITER_MAX_PENDING_BATCHES: int = 8
+    MIGRATION_LEASE_SECONDS: int = 300  # A data migration that stops heartbeating this long is taken over by the next startup
+
+    # Uploads
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_FILE_MB: int = 15  # Matches ImageLoader's limit; larger files would be skipped at ingest
+    UPLOAD_WRITE_CONCURRENCY: int = 8
+    UPLOAD_SESSION_DIR: str = "upload_sessions"  # Resumable upload state; keep on the same disk as uploads/
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_LOCK_STALE_SECONDS: int = 600
+    RESUMABLE_INGEST_DELAY_SECONDS: int = 15  # Resumable files completing within this window are ingested as one batch
+
+    # Caching
+    CACHE_REDIS_ENABLED: bool = False  # Shared Redis tier behind the in-process caches
+    SELFIE_CACHE_TTL_SECONDS: int = 600
+    SELFIE_CACHE_MAX_ENTRIES: int = 512
+    SEARCH_RESULT_CACHE_TTL_SECONDS: int = 300
+    SEARCH_RESULT_CACHE_MAX_ENTRIES: int = 1024
+    AUTH_USER_CACHE_TTL_SECONDS: int = 30  # Bounds how long a role change or deletion takes to apply in other processes
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    PHOTOGRAPHER_SLUG_CACHE_TTL_SECONDS: int = 600  # user id -> slug for share links
+    PUBLIC_EVENT_CACHE_TTL_SECONDS: int = 30  # Public event page payloads (also bounds staleness across processes)
+    PUBLIC_EVENT_CACHE_MAX_ENTRIES: int = 2048
+    PUBLIC_EVENT_MAX_AGE_SECONDS: int = 30  # Cache-Control max-age for browsers/CDNs
+
+    # Ingest jobs
+    INGEST_CHUNK_SIZE: int = 100  # Images per parallel chunk task
+    INGEST_ENCODE_BATCH_SIZE: int = 64  # Faces encoded (and their records written) together while detection continues
+    FAISS_LOCK_TIMEOUT_SECONDS: int = 120  # Lock auto-expiry (covers reload + add + save)
+    FAISS_LOCK_WAIT_SECONDS: int = 600  # How long a chunk waits for other chunks' index writes
+    FAISS_COMPACTION_DELAY_SECONDS: int = 60  # Deletes within this window share one compaction run
+    FAISS_ACTIVE_INDEX_FILE: str = "faiss_active.json"  # Pointer to the serving index; swapped atomically on model cutover
+
+    # Celery scheduling
+    CELERY_PREFETCH_MULTIPLIER: int = 1
+    CELERY_DEFAULT_PRIORITY: int = 5
+    SMALL_UPLOAD_MAX_IMAGES: int = 50  # Uploads up to this size go to the 'ingest' queue, larger ones to 'bulk'
+    FAIR_SHARE_TASKS_PER_PRIORITY_STEP: int = 2  # In-flight tasks per photographer before their priority drops a step
+    FAIR_SHARE_COUNTER_TTL_SECONDS: int = 6 * 3600
+
+    # Thumbnails / previews generated at ingest
+    DERIVATIVES_ENABLED: bool = True
+    DERIVATIVE_FORMAT: str = "WEBP"  # WEBP or AVIF (AVIF needs Pillow with libavif; falls back to WEBP)
+    DERIVATIVE_QUALITY: int = 80
+    THUMBNAIL_MAX_PX: int = 320
+    PREVIEW_MAX_PX: int = 1280
+    DERIVATIVE_WORKERS: int = 2
+    DERIVATIVE_MAX_PENDING: int = 8  # Decoded images held while their variants encode
+
+    # Embedding model
+    EMBEDDING_MODEL_VERSION: str = "facenet-vggface2-v1"  # Model for new/untagged indexes (see ml.face_encoder.MODEL_REGISTRY)
+    REEMBED_BATCH_SIZE: int = 256
+
+    # Face crop store (160x160 model inputs kept for re-embedding)
+    FACE_CROP_STORE_ENABLED: bool = True
+    FACE_CROP_STORE_DIR: str = "face_crops"
+    FACE_CROP_SHARD_MAX_MB: int = 256  # Size at which a process starts a new shard for the event (~3,400 crops)
+
+    # Identity clustering (per event, after ingest)
+    CLUSTERING_ENABLED: bool = True
+    CLUSTER_LINK_DISTANCE: float = 0.6  # Squared L2; faces closer than this are linked into one identity
+    CLUSTER_MAX_DIAMETER: float = 1.2  # Squared L2 cap between any two faces of one identity; wider chains are split
+    CLUSTER_MATCH_DISTANCE: float = 0.8  # Squared L2 between selfie and cluster centroid to count as a match
+    CLUSTER_MATCH_MARGIN: float = 0.15  # Nearest centroid must beat the runner-up by this much, else search uses the index
+    CLUSTERING_DELAY_SECONDS: int = 30  # Uploads/deletes within this window share one clustering run
+    CLUSTER_CACHE_TTL_SECONDS: int = 60
+
+    # Progress reporting
+    PROGRESS_UPDATE_INTERVAL_SECONDS: float = 1.0  # Min gap between task state updates
+    PROGRESS_STREAM_POLL_SECONDS: float = 1.0  # Backend poll interval, shared by all SSE clients of a task
+    PROGRESS_STREAM_KEEPALIVE_SECONDS: float = 15.0
+
+    # Metrics (/metrics, Prometheus text format)
+    METRICS_ENABLED: bool = True
+    METRICS_PUSH_INTERVAL_SECONDS: float = 10.0  # Min gap between a worker's snapshot pushes to Redis
+    METRICS_WORKER_TTL_SECONDS: int = 86400  # Snapshots of idle or stopped workers expire after this
+
+    # Profiling (opt-in per request via X-Profile header, per task via profile=True)
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str = ""  # X-Profile header value that triggers a capture; empty disables header triggering
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.005
+    PROFILE_MAX_SECONDS: float = 600.0  # Sampler stops after this; long batches keep the first part
+    PROFILE_TORCH: bool = True  # Also capture a torch.profiler trace of model calls
+    PROFILE_MAX_KEPT: int = 50
+
+    # Ingest-time face filtering (defaults; events can override via ingest_policy)
+    INGEST_FILTER_ENABLED: bool = True
+    INGEST_MIN_FACE_PX: int = 32
+    INGEST_MIN_FACE_RATIO: float = 0.03  # Face side relative to the image's shorter side
+    INGEST_BLUR_THRESHOLD: float = 40.0
+    INGEST_DARKNESS_THRESHOLD: float = 30.0
+    INGEST_MAX_YAW: float = 0.6  # Nose offset asymmetry between the eyes (0 = frontal, 1 = profile)
+    INGEST_MAX_ROLL_DEGREES: float = 40.0
+
     # We can still use model_config to be safe, but load_dotenv() handles the OS environment
     model_config = SettingsConfigDict(extra="ignore")
 
@@ -0,0 +1,215 @@
+import os
+import sys
+
+# Settings require these; unit tests never connect to either
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-unit-tests-only")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$exists" and (field in doc) != operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _apply_update(doc: dict, update: dict):
+    doc.update(update.get("$set", {}))
+    for field, amount in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + amount
+    for field in update.get("$unset", {}):
+        doc.pop(field, None)
+
+class FakeCursor(list):
+    def batch_size(self, size):
+        return self
+
+class FakeCollection:
+    """The subset of pymongo's Collection API the jobs use: equality, $or, $in, $ne, $gt(e), $lt, $exists."""
+
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        from bson import ObjectId
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(copy.deepcopy(doc) for doc in self.docs if _matches(doc, query or {}))
+
+    def find_one(self, query=None, projection=None):
+        found = self.find(query)
+        return found[0] if found else None
+
+    def distinct(self, field, query=None):
+        values = []
+        for doc in self.find(query):
+            if field in doc and doc[field] not in values:
+                values.append(doc[field])
+        return values
+
+    def count_documents(self, query):
+        return sum(_matches(doc, query) for doc in self.docs)
+
+    def update_one(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                break
+
+    def update_many(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                _apply_update(doc, update)
+
+    def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+        return before - len(self.docs)
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection()
+        return collection
+
+    def __getattr__(self, name):
+        return self[name]
+
+class FakeAsyncCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def sort(self, key, direction=1):
+        keys = [(key, direction)] if isinstance(key, str) else key
+        # Stable sorts from the least significant key up
+        for field, field_direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc.get(field), reverse=field_direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs if length is None else self.docs[:length]
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+class FakeAsyncCollection:
+    """Motor-style (awaitable) front for a FakeCollection, for the API code paths."""
+
+    def __init__(self):
+        self.collection = FakeCollection()
+
+    @property
+    def docs(self):
+        return self.collection.docs
+
+    def find(self, query=None, projection=None):
+        return FakeAsyncCursor(self.collection.find(query))
+
+    async def find_one(self, query=None, projection=None):
+        return self.collection.find_one(query)
+
+    async def count_documents(self, query):
+        return self.collection.count_documents(query)
+
+    async def insert_one(self, doc):
+        from pymongo.errors import DuplicateKeyError
+        if "_id" in doc and self.collection.find_one({"_id": doc["_id"]}) is not None:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        self.collection.insert_many([doc])
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def update_one(self, query, update):
+        for doc in self.collection.docs:
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                break
+
+    async def update_many(self, query, update):
+        self.collection.update_many(query, update)
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=False):
+        """return_document: pymongo's ReturnDocument.BEFORE (False) or AFTER (True)."""
+        for doc in self.collection.docs:
+            if _matches(doc, query):
+                before = copy.deepcopy(doc)
+                _apply_update(doc, update)
+                return copy.deepcopy(doc) if return_document else before
+        if not upsert:
+            return None
+        doc = {field: value for field, value in query.items() if not field.startswith("$") and not isinstance(value, dict)}
+        doc.update(update.get("$setOnInsert", {}))
+        _apply_update(doc, update)
+        self.collection.insert_many([doc])
+        return copy.deepcopy(doc) if return_document else None
+
+    async def delete_one(self, query):
+        for i, doc in enumerate(self.collection.docs):
+            if _matches(doc, query):
+                del self.collection.docs[i]
+                break
+
+    def aggregate(self, pipeline, **kwargs):
+        """$match, and $group with $first/$min accumulators."""
+        docs = self.collection.find()
+        for stage in pipeline:
+            if "$match" in stage:
+                docs = [doc for doc in docs if _matches(doc, stage["$match"])]
+            elif "$group" in stage:
+                spec = dict(stage["$group"])
+                key_spec = spec.pop("_id")
+                groups = {}
+                for doc in docs:
+                    key = {name: doc.get(path[1:]) for name, path in key_spec.items()}
+                    group = groups.setdefault(repr(sorted(key.items())), {"_id": key})
+                    for name, accumulator in spec.items():
+                        (op, path), = accumulator.items()
+                        value = doc.get(path[1:])
+                        if name not in group or (op == "$min" and value is not None and (group[name] is None or value < group[name])):
+                            group[name] = value
+                docs = list(groups.values())
+        return FakeAsyncCursor(docs)
+
+class FakeAsyncDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeAsyncCollection()
+        return collection
+
+    def __getattr__(self, name):
+        return self[name]
+
+@pytest.fixture
+def fake_sync_db():
+    return FakeDatabase()
+
+@pytest.fixture
+def fake_async_db():
+    return FakeAsyncDatabase()
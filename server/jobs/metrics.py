@@ -0,0 +1,58 @@
+"""
+Celery signal handlers feeding services.metrics: queue wait (from an
+enqueued_at header stamped at publish time), task run time, and stage timings
+labelled with the running task. Worker processes push their snapshot to Redis
+so the API's /metrics endpoint can include them.
+"""
+from celery import signals
+from datetime import datetime, timezone
+import time
+
+from config.settings import settings
+from services.metrics import metrics, set_scope, CELERY_QUEUE_WAIT_SECONDS, CELERY_TASK_SECONDS
+
+# task_id -> perf_counter at start; prefork workers run one task per process at a time
+_started = {}
+
+def _eta_timestamp(eta) -> float:
+    if not eta:
+        return 0.0
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta.tzinfo is None:
+        eta = eta.replace(tzinfo=timezone.utc)
+    return eta.timestamp()
+
+@signals.before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+@signals.task_prerun.connect
+def start_task_metrics(task_id=None, task=None, **kwargs):
+    if not settings.METRICS_ENABLED or task is None:
+        return
+    set_scope(task.name)
+    _started[task_id] = time.perf_counter()
+
+    enqueued_at = getattr(task.request, "enqueued_at", None)
+    if enqueued_at:
+        # Countdown/eta tasks only start waiting once they are due
+        ready_at = max(float(enqueued_at), _eta_timestamp(getattr(task.request, "eta", None)))
+        queue = (task.request.delivery_info or {}).get("routing_key") or "unknown"
+        CELERY_QUEUE_WAIT_SECONDS.observe(max(0.0, time.time() - ready_at), task=task.name, queue=queue)
+
+@signals.task_postrun.connect
+def finish_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    if not settings.METRICS_ENABLED or task is None:
+        return
+    started = _started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_SECONDS.observe(time.perf_counter() - started, task=task.name, state=state or "UNKNOWN")
+    set_scope("worker")
+    metrics.push_snapshot()
+
+@signals.worker_process_shutdown.connect
+def flush_worker_metrics(**kwargs):
+    if settings.METRICS_ENABLED:
+        metrics.push_snapshot(force=True)
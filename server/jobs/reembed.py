@@ -0,0 +1,248 @@
+"""
+Zero-downtime embedding model migration.
+
+Builds a second FAISS index with a new model while the active one keeps
+serving, then cuts over atomically:
+
+1. Bulk pass (no lock): re-embed every face into faiss_index.<version>.bin,
+   keeping each face's FAISS id, so faces/clusters/tombstones stay valid.
+   Crops come from the face crop store; faces ingested before it existed are
+   re-cropped from their photo and stored bounding box (no detection).
+   The target is checkpointed per event, so an interrupted run resumes.
+2. Catch-up pass (no lock): faces ingested or deleted meanwhile.
+3. Cutover (under the FAISS index lock, which blocks ingest briefly): apply
+   the last delta, then swap the active-index pointer. Every process picks up
+   the new index and model on its next reload. The old index file is kept.
+   Ingest stores face records before adding their vectors, so every vector
+   of the delta has a record to re-embed from; if one can't be re-embedded
+   the run fails instead of cutting over without it.
+
+Usage:
+    python -m jobs.reembed <model_version>           # enqueue on the bulk queue
+    python -m jobs.reembed <model_version> --inline  # run in this process
+"""
+from config.celery_app import celery_app
+from config.database import get_sync_db
+from config.settings import settings
+from ml.face_encoder import FaceEncoder, MODEL_REGISTRY
+from services.faiss_service import FaissService, faiss_service, set_active_index
+from services.face_crop_store import face_crop_store, crops_to_face_tensors
+from jobs.tasks import faiss_index_lock
+from jobs.scheduling import schedule_event_clustering
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+import argparse
+import logging
+import uuid
+import faiss
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+FACE_PROJECTION = {"_id": 0, "image_embedded_number": 1, "event_id": 1, "photo_id": 1, "bounding_box": 1, "crop": 1}
+
+def _index_ids(service: FaissService) -> Set[int]:
+    if service.index.ntotal == 0:
+        return set()
+    return set(faiss.vector_to_array(service.index.id_map).tolist())
+
+def _face_tensors(faces: List[Dict], sync_db) -> Dict[int, torch.Tensor]:
+    """
+    Standardized 160x160 input per FAISS id: from the crop store when the face
+    has a crop ref, otherwise re-cropped from the photo with its stored box.
+    """
+    from ml.face_detector import face_detector
+    from ml.image_loader import image_loader
+
+    tensors = {}
+    by_shard = defaultdict(list)
+    by_photo = defaultdict(list)
+    for face in faces:
+        if face.get("crop"):
+            by_shard[(face["event_id"], face["crop"]["shard"])].append(face)
+        else:
+            by_photo[face.get("photo_id")].append(face)
+
+    for (event_id, shard), shard_faces in by_shard.items():
+        try:
+            crops = face_crop_store.load(event_id, shard, [face["crop"]["offset"] for face in shard_faces])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Crop shard {event_id}/{shard} unreadable, re-cropping from photos: {e}")
+            for face in shard_faces:
+                by_photo[face.get("photo_id")].append(face)
+            continue
+        for face, tensor in zip(shard_faces, crops_to_face_tensors(crops)):
+            tensors[face["image_embedded_number"]] = tensor
+
+    if by_photo:
+        photos = {photo["_id"]: photo["file_path"] for photo in sync_db.photos.find(
+            {"_id": {"$in": [photo_id for photo_id in by_photo if photo_id is not None]}}, {"file_path": 1})}
+        for photo_id, photo_faces in by_photo.items():
+            # Same loader settings as ingest, so stored boxes line up with the pixels
+            image = image_loader.load_from_path(photos[photo_id]) if photo_id in photos else None
+            if image is None:
+                logger.warning(f"Cannot re-crop {len(photo_faces)} faces of photo {photo_id}; skipping them")
+                continue
+            for face in photo_faces:
+                tensor = face_detector.extract_face(image, face["bounding_box"])
+                if tensor is not None:
+                    tensors[face["image_embedded_number"]] = tensor
+    return tensors
+
+def _embed_faces(faces: List[Dict], encoder: FaceEncoder, target: FaissService, sync_db) -> int:
+    """Re-embed one batch of face records into the target index under their existing ids."""
+    tensors = _face_tensors(faces, sync_db)
+    if not tensors:
+        return 0
+    ids = np.fromiter(tensors.keys(), dtype=np.int64, count=len(tensors))
+    embeddings = encoder.encode_tensors(torch.stack(list(tensors.values())))
+    valid = np.isfinite(embeddings).all(axis=1)
+    target.add_vectors(embeddings[valid].tolist(), ids=ids[valid])
+    return int(valid.sum())
+
+def _embed_query(query: Dict, encoder: FaceEncoder, target: FaissService, sync_db,
+                 skip_ids: Set[int] = frozenset(), on_batch: Callable[[], None] = None) -> int:
+    embedded = 0
+    batch = []
+    for face in sync_db.faces.find(query, FACE_PROJECTION).batch_size(settings.REEMBED_BATCH_SIZE):
+        if face["image_embedded_number"] in skip_ids:
+            continue
+        batch.append(face)
+        if len(batch) >= settings.REEMBED_BATCH_SIZE:
+            embedded += _embed_faces(batch, encoder, target, sync_db)
+            batch = []
+            if on_batch:
+                on_batch()
+    if batch:
+        embedded += _embed_faces(batch, encoder, target, sync_db)
+        if on_batch:
+            on_batch()
+    return embedded
+
+def _sync_delta(encoder: FaceEncoder, target: FaissService, sync_db) -> Dict:
+    """
+    Make the target hold exactly the active index's ids: embed faces added
+    since the bulk pass, drop vectors deleted/compacted since.
+
+    Raises:
+        RuntimeError: A face record exists for a missing vector but it could not
+                      be embedded; cutting over would silently drop the face.
+    """
+    faiss_service.reload_index()
+    active_ids = _index_ids(faiss_service)
+    target_ids = _index_ids(target)
+
+    removed = target.remove_ids(sorted(target_ids - active_ids))
+    missing = sorted(active_ids - target_ids)
+    added = 0
+    for start in range(0, len(missing), settings.MONGO_BULK_BATCH_SIZE):
+        query = {"image_embedded_number": {"$in": missing[start:start + settings.MONGO_BULK_BATCH_SIZE]}}
+        added += _embed_query(query, encoder, target, sync_db)
+
+    skipped = 0
+    if added != len(missing):
+        # Ingest writes face records before adding vectors, so a vector without a
+        # record belongs to a failed write and is unreachable from search anyway
+        unresolved = sorted(set(missing) - _index_ids(target))
+        with_record = []
+        for start in range(0, len(unresolved), settings.MONGO_BULK_BATCH_SIZE):
+            query = {"image_embedded_number": {"$in": unresolved[start:start + settings.MONGO_BULK_BATCH_SIZE]}}
+            with_record += [face["image_embedded_number"] for face in sync_db.faces.find(query, {"_id": 0, "image_embedded_number": 1})]
+        if with_record:
+            raise RuntimeError(f"{len(with_record)} faces could not be re-embedded (e.g. FAISS ids {with_record[:5]}); not cutting over")
+        skipped = len(unresolved)
+        if skipped:
+            logger.warning(f"Dropping {skipped} vectors that have no face record")
+    return {"added": added, "removed": removed, "skipped": skipped}
+
+@celery_app.task(name="reembed_index", bind=True)
+def reembed_index(self, model_version: str):
+    """
+    Celery wrapper for the model migration.
+    """
+    def report_progress(meta: Dict):
+        self.update_state(state="PROGRESS", meta=meta)
+
+    return reembed_index_logic(self.request.id, model_version, report_progress)
+
+def reembed_index_logic(task_id: str, model_version: str, progress_callback: Optional[Callable[[Dict], None]] = None):
+    """
+    Build the index for model_version beside the active one and cut over to it.
+    """
+    spec = MODEL_REGISTRY.get(model_version)
+    if spec is None:
+        return {"status": "failed", "error": f"Unknown embedding model version: {model_version}"}
+
+    faiss_service.reload_index()
+    if faiss_service.model_version == model_version:
+        return {"status": "completed", "message": f"{model_version} is already active"}
+
+    try:
+        sync_db = get_sync_db()
+        encoder = FaceEncoder(model_version)
+        target_path = f"faiss_index.{model_version}.bin"
+        # Resumes from the last checkpoint if a previous run was interrupted
+        target = FaissService(dimension=spec["dimension"], index_path=target_path, model_version=model_version)
+        if target.model_version != model_version:
+            return {"status": "failed", "error": f"{target_path} holds {target.model_version} vectors"}
+
+        faces_total = faiss_service.index.ntotal
+        # Faces already in the target (resumed run) are not embedded again
+        done_ids = _index_ids(target)
+        logger.info(f"[{task_id}] Re-embedding {faces_total} faces with {model_version} ({len(done_ids)} already done)")
+
+        def report(stage: str):
+            if progress_callback:
+                progress_callback({"stage": stage, "faces_done": target.index.ntotal, "faces_total": faces_total})
+
+        # 1. Bulk pass, event by event; the active index keeps serving
+        for event_id in sync_db.faces.distinct("event_id"):
+            query = {"event_id": event_id, "image_embedded_number": {"$gte": 0}}
+            _embed_query(query, encoder, target, sync_db, skip_ids=done_ids, on_batch=lambda: report("reembedding"))
+            target.save_index()
+
+        # 2. Catch up with ingest/deletes that happened during the bulk pass
+        delta = _sync_delta(encoder, target, sync_db)
+        target.save_index()
+        logger.info(f"[{task_id}] Catch-up pass: {delta}")
+
+        # 3. Final delta + atomic cutover; ingest waits on the lock for the duration
+        report("cutover")
+        with faiss_index_lock(task_id):
+            delta = _sync_delta(encoder, target, sync_db)
+            target.next_id = max(target.next_id, faiss_service.next_id)
+            target.save_index()
+            set_active_index(target_path, model_version)
+        logger.info(f"[{task_id}] Cut over to {model_version}: {target.index.ntotal} vectors (final delta {delta})")
+
+        # Centroids of the old model no longer match selfies; search falls back to the index meanwhile
+        for event_id in sync_db.faces.distinct("event_id"):
+            try:
+                schedule_event_clustering(event_id)
+            except Exception as e:
+                logger.warning(f"[{task_id}] Could not schedule re-clustering of {event_id}: {e}")
+                break
+
+        return {
+            "status": "completed",
+            "model_version": model_version,
+            "index_path": target_path,
+            "vectors": target.index.ntotal
+        }
+
+    except Exception as e:
+        logger.error(f"[{task_id}] Re-embedding to {model_version} failed: {e}", exc_info=True)
+        return {"status": "failed", "error": str(e)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the FAISS index to another embedding model")
+    parser.add_argument("model_version", choices=sorted(MODEL_REGISTRY))
+    parser.add_argument("--inline", action="store_true", help="Run here instead of enqueueing on the bulk queue")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.inline:
+        print(reembed_index_logic(str(uuid.uuid4()), args.model_version))
+    else:
+        print(f"Enqueued re-embedding task {reembed_index.apply_async((args.model_version,), queue='bulk').id}")
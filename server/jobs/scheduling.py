@@ -0,0 +1,137 @@
+from config.settings import settings
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queue names (see config/celery_app.py for routing)
+INTERACTIVE_QUEUE = "interactive"  # Short, latency-sensitive tasks (aggregators, future search jobs)
+INGEST_QUEUE = "ingest"            # Small uploads
+BULK_QUEUE = "bulk"                # Chunks of large uploads, maintenance jobs
+
+# Redis priorities: 0 is served first, 9 last
+HIGHEST_PRIORITY = 0
+LOWEST_PRIORITY = 9
+
+def _inflight_key(uploader_id: str) -> str:
+    return f"ingest:inflight:{uploader_id}"
+
+def _redis():
+    from redis import Redis
+    return Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+
+def reserve_fair_share(uploader_id: str, task_count: int) -> List[int]:
+    """
+    Count task_count new ingest tasks against the photographer and return a
+    priority for each. Priorities drop as the photographer's in-flight task
+    count grows, so a 3,000-photo upload's later chunks yield to other
+    photographers' small uploads instead of blocking them.
+    """
+    try:
+        client = _redis()
+        pipe = client.pipeline()
+        pipe.incrby(_inflight_key(uploader_id), task_count)
+        pipe.expire(_inflight_key(uploader_id), settings.FAIR_SHARE_COUNTER_TTL_SECONDS)
+        inflight_after, _ = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Fair-share counter unavailable, using default priority: {e}")
+        return [settings.CELERY_DEFAULT_PRIORITY] * task_count
+
+    inflight_before = inflight_after - task_count
+    step = max(1, settings.FAIR_SHARE_TASKS_PER_PRIORITY_STEP)
+    return [
+        min(LOWEST_PRIORITY, HIGHEST_PRIORITY + (inflight_before + i) // step)
+        for i in range(task_count)
+    ]
+
+def release_fair_share(uploader_id: str):
+    """Mark one of the photographer's ingest tasks as finished."""
+    try:
+        client = _redis()
+        if client.decr(_inflight_key(uploader_id)) < 0:
+            client.set(_inflight_key(uploader_id), 0, ex=settings.FAIR_SHARE_COUNTER_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to release fair-share slot for {uploader_id}: {e}")
+
+COMPACTION_SCHEDULED_KEY = "faiss:compaction:scheduled"
+
+def _schedule_once(key: str, task_name: str, args: list, delay: int, queue: str = BULK_QUEUE) -> Optional[str]:
+    """
+    Enqueue task_name (on the bulk queue by default) after delay seconds unless a run guarded
+    by key is already pending, so a burst of triggers costs one run.
+    Returns the task id, or None if a run was already scheduled.
+    Raises if the broker is unreachable.
+    """
+    from config.celery_app import celery_app
+
+    if not _redis().set(key, 1, nx=True, ex=delay + settings.FAISS_LOCK_WAIT_SECONDS):
+        return None
+    return celery_app.send_task(task_name, args=args, queue=queue, countdown=delay).id
+
+def _clear_schedule(key: str):
+    try:
+        _redis().delete(key)
+    except Exception as e:
+        logger.warning(f"Failed to clear schedule {key}: {e}")
+
+def schedule_faiss_compaction() -> Optional[str]:
+    """Run compact_faiss_index once for a burst of deletes."""
+    return _schedule_once(COMPACTION_SCHEDULED_KEY, "compact_faiss_index", [], settings.FAISS_COMPACTION_DELAY_SECONDS)
+
+def clear_compaction_schedule():
+    """Called when a compaction starts; deletes arriving from now on schedule the next run."""
+    _clear_schedule(COMPACTION_SCHEDULED_KEY)
+
+def _clustering_key(event_id: str) -> str:
+    return f"faces:clustering:scheduled:{event_id}"
+
+def schedule_event_clustering(event_id: str) -> Optional[str]:
+    """Re-cluster an event's faces once for a burst of uploads/deletes (all chunks of one upload)."""
+    return _schedule_once(_clustering_key(event_id), "cluster_event_faces", [event_id], settings.CLUSTERING_DELAY_SECONDS)
+
+def clear_clustering_schedule(event_id: str):
+    """Called when clustering starts; faces arriving from now on schedule the next run."""
+    _clear_schedule(_clustering_key(event_id))
+
+def _pending_files_key(event_id: str, uploader_id: str) -> str:
+    return f"ingest:pending:{event_id}:{uploader_id}"
+
+def _pending_schedule_key(event_id: str, uploader_id: str) -> str:
+    return f"ingest:pending:scheduled:{event_id}:{uploader_id}"
+
+def queue_pending_file(file_path: str, event_id: str, uploader_id: str, photographer_name: str = None, ingest_policy: Dict = None) -> Optional[str]:
+    """
+    Add a completed resumable upload to its event's pending batch. One
+    ingest_pending_files run picks up every file completed within
+    RESUMABLE_INGEST_DELAY_SECONDS, so a memory card uploaded file by file
+    costs a handful of ingest tasks (and FAISS index rewrites), not one per file.
+    Returns the scheduled task id, or None if a run was already pending.
+    Raises if Redis or the broker is unreachable.
+    """
+    key = _pending_files_key(event_id, uploader_id)
+    pipe = _redis().pipeline()
+    pipe.rpush(key, file_path)
+    pipe.expire(key, settings.UPLOAD_SESSION_TTL_HOURS * 3600)
+    pipe.execute()
+    return _schedule_once(
+        _pending_schedule_key(event_id, uploader_id), "ingest_pending_files",
+        [event_id, uploader_id, photographer_name, ingest_policy], settings.RESUMABLE_INGEST_DELAY_SECONDS,
+        queue=INTERACTIVE_QUEUE
+    )
+
+def take_pending_files(event_id: str, uploader_id: str) -> List[str]:
+    """
+    Remove and return the files waiting for ingest. The schedule is cleared
+    first, so files completing from now on schedule the next run.
+    """
+    _clear_schedule(_pending_schedule_key(event_id, uploader_id))
+    key = _pending_files_key(event_id, uploader_id)
+    pipe = _redis().pipeline()  # MULTI: nothing pushed between read and delete is lost
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    paths, _ = pipe.execute()
+    return [path.decode() for path in paths]
+
+def ingest_queue_for(image_count: int) -> str:
+    """Small uploads get their own queue so they never wait behind bulk chunks."""
+    return INGEST_QUEUE if image_count <= settings.SMALL_UPLOAD_MAX_IMAGES else BULK_QUEUE
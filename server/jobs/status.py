@@ -0,0 +1,133 @@
+from celery.result import GroupResult
+from config.celery_app import celery_app
+from typing import List, Dict
+
+# Kept free of ML imports so the API can report job status without loading models.
+
+SUMMED_FIELDS = ("images_processed", "failed_images", "faces_indexed", "records_stored", "photos_stored")
+
+def merge_batch_results(results: List[Dict]) -> Dict:
+    """
+    Combine the result dicts of the chunk tasks of one upload into a single summary.
+    """
+    merged = {field: 0 for field in SUMMED_FIELDS}
+    filtering = {"faces_detected": 0, "faces_kept": 0, "rejected": {}}
+    errors = []
+    profile_ids = []
+    failed_chunks = 0
+
+    for result in results:
+        if not isinstance(result, dict):
+            failed_chunks += 1
+            errors.append(str(result))
+            continue
+        if result.get("status") == "failed":
+            failed_chunks += 1
+            errors.append(result.get("error", "unknown error"))
+            continue
+
+        if result.get("profile_id"):
+            profile_ids.append(result["profile_id"])
+        for field in SUMMED_FIELDS:
+            merged[field] += result.get(field, 0)
+        # Chunks that found no faces report failures under 'failed'
+        merged["failed_images"] += result.get("failed", 0)
+
+        chunk_filtering = result.get("filtering") or {}
+        filtering["faces_detected"] += chunk_filtering.get("faces_detected", 0)
+        filtering["faces_kept"] += chunk_filtering.get("faces_kept", 0)
+        for reason, count in (chunk_filtering.get("rejected") or {}).items():
+            filtering["rejected"][reason] = filtering["rejected"].get(reason, 0) + count
+
+    if failed_chunks == 0:
+        merged["status"] = "completed"
+    elif failed_chunks < len(results):
+        merged["status"] = "partial"
+    else:
+        merged["status"] = "failed"
+
+    merged["chunks"] = len(results)
+    merged["failed_chunks"] = failed_chunks
+    merged["filtering"] = filtering
+    if errors:
+        merged["errors"] = errors
+    if profile_ids:
+        merged["profile_ids"] = profile_ids
+    return merged
+
+TERMINAL_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+def _task_meta(task_id: str) -> Dict:
+    """One backend round trip per task (AsyncResult properties each re-fetch)."""
+    return celery_app.backend.get_task_meta(task_id)
+
+def _chunk_fraction(meta: Dict) -> float:
+    """How far along one chunk task is, from its PROGRESS meta."""
+    if meta["status"] in TERMINAL_STATES:
+        return 1.0
+    info = meta.get("result") if meta["status"] == "PROGRESS" else None
+    if isinstance(info, dict) and info.get("images_total"):
+        return min(1.0, info.get("images_done", 0) / info["images_total"])
+    return 0.0
+
+def get_job_status(task_id: str) -> Dict:
+    """
+    Status of an upload job. task_id is either a single task id or the id of a
+    saved GroupResult (fanned-out upload); groups report a combined status.
+    """
+    group = GroupResult.restore(task_id, app=celery_app)
+    if group is None:
+        meta = _task_meta(task_id)
+        status = meta["status"]
+        response = {
+            "task_id": task_id,
+            "status": status,
+            "result": meta.get("result") if status in TERMINAL_STATES else None
+        }
+        if status == "PROGRESS" and isinstance(meta.get("result"), dict):
+            response["progress"] = meta["result"]
+        if status == "SUCCESS" and isinstance(meta.get("result"), dict) and meta["result"].get("status") == "failed":
+            # The task caught its own error and returned it; Celery still calls that SUCCESS
+            status = response["status"] = "FAILURE"
+            response["error"] = meta["result"].get("error", "unknown error")
+        elif status == "FAILURE":
+            response["error"] = str(meta.get("result"))
+        return response
+
+    metas = [_task_meta(child.id) for child in group.results]
+    finished = [meta for meta in metas if meta["status"] in TERMINAL_STATES]
+    finished_results = [meta.get("result") for meta in finished]
+    running = [meta["result"] for meta in metas if meta["status"] == "PROGRESS" and isinstance(meta.get("result"), dict)]
+
+    merged = merge_batch_results(finished_results)
+    if len(finished) == len(metas):
+        # Chunks return {"status": "failed"} as Celery SUCCESS, so judge by their results
+        status = "FAILURE" if merged["status"] == "failed" else "SUCCESS"
+    elif finished or any(meta["status"] != "PENDING" for meta in metas):
+        status = "PROGRESS"
+    else:
+        status = "PENDING"
+
+    # Combined progress: finished chunks count fully, running chunks by their own progress
+    completed = [r for r in finished_results if isinstance(r, dict)]
+    progress = {
+        "percent": round(100 * sum(_chunk_fraction(meta) for meta in metas) / len(metas), 1) if metas else 100.0,
+        "images_done": sum(r.get("images_processed", 0) + r.get("failed_images", 0) + r.get("failed", 0) for r in completed)
+                       + sum(info.get("images_done", 0) for info in running),
+        "faces_found": sum(r.get("faces_indexed", 0) for r in completed)
+                       + sum(info.get("faces_found", 0) for info in running),
+        "images_per_second": round(sum(info.get("images_per_second", 0) for info in running), 2),
+        "chunks_running": len(running),
+    }
+
+    return {
+        "task_id": task_id,
+        "status": status,
+        "progress": progress,
+        "chunks_total": len(metas),
+        "chunks_done": len(finished),
+        "failed_chunks": merged["failed_chunks"],
+        "partial_failure": 0 < merged["failed_chunks"] < len(metas),
+        "result": merged if status in TERMINAL_STATES else None,
+        "partial_result": merged if status not in TERMINAL_STATES else None
+    }
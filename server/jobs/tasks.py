@@ -1,14 +1,34 @@
 from config.celery_app import celery_app
-from config.database import db
+from config.database import db, get_sync_db
+from config.settings import settings
 from ml.face_detector import face_detector
 from ml.face_encoder import face_encoder
 from ml.image_loader import image_loader
+from ml.ingest_filter import IngestFilter
 from services.faiss_service import faiss_service
+from services.bulk_writer import BulkWriter
+from services.derivatives import DerivativePipeline
+from services.face_crop_store import face_crop_store
+from ml.quality_checker import face_tensors_to_crops
+from jobs.status import merge_batch_results
+from jobs.scheduling import (
+    reserve_fair_share, release_fair_share, ingest_queue_for, take_pending_files,
+    clear_compaction_schedule, schedule_event_clustering, clear_clustering_schedule
+)
+from services.clustering import cluster_embeddings, summarize_clusters
+from services.metrics import stage_timer
+from services.profiling import profile_session
+from bson.binary import Binary
+import numpy as np
+import torch
+from celery import chord, group
+from contextlib import contextmanager
 import logging
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 import time
 from datetime import datetime
+from bson import ObjectId
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +41,76 @@ def run_async(coro):
     else:
         return asyncio.run(coro)
 
+@contextmanager
+def faiss_index_lock(task_id: str):
+    """
+    Cross-worker lock around read-modify-write of the on-disk FAISS index.
+    Without Redis (dev mode, single process) it proceeds unlocked. With Redis,
+    failing to get the lock is an error: parallel chunk tasks would otherwise
+    overwrite each other's vectors.
+    """
+    lock = None
+    try:
+        from redis import Redis
+        redis_client = Redis.from_url(settings.REDIS_URL)
+        # Simple check if redis is reachable
+        redis_client.ping()
+        lock = redis_client.lock("faiss_index_update_lock", timeout=settings.FAISS_LOCK_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"[{task_id}] Redis lock failed (likely no Redis), proceeding without lock: {e}")
+
+    if lock is not None:
+        with stage_timer("faiss_lock_wait"):
+            acquired = lock.acquire(blocking=True, blocking_timeout=settings.FAISS_LOCK_WAIT_SECONDS)
+    if lock is not None and not acquired:
+        raise RuntimeError(f"Could not acquire FAISS index lock within {settings.FAISS_LOCK_WAIT_SECONDS}s")
+
+    try:
+        yield
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except Exception:
+                pass
+
+class ProgressReporter:
+    """
+    Throttled structured progress for an ingest task.
+    Stage changes are always reported; per-image updates at most every PROGRESS_UPDATE_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, callback: Optional[Callable[[Dict], None]], images_total: int):
+        self.callback = callback
+        self.images_total = images_total
+        self.started_at = time.monotonic()
+        self.last_sent_at = 0.0
+        self.stage = None
+
+    def update(self, stage: str, images_done: int, faces_found: int):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if stage == self.stage and now - self.last_sent_at < settings.PROGRESS_UPDATE_INTERVAL_SECONDS:
+            return
+
+        elapsed = now - self.started_at
+        meta = {
+            "stage": stage,
+            "images_done": images_done,
+            "images_total": self.images_total,
+            "faces_found": faces_found,
+            "elapsed_seconds": round(elapsed, 2),
+            "images_per_second": round(images_done / elapsed, 2) if elapsed > 0 else 0.0
+        }
+        try:
+            self.callback(meta)
+        except Exception as e:
+            # Progress is best effort; never fail ingest over it
+            logger.warning(f"Progress update failed: {e}")
+        self.stage = stage
+        self.last_sent_at = now
+
 @celery_app.task(name="test_celery_task")
 def test_celery_task(word: str):
     """
@@ -33,27 +123,214 @@ def test_celery_task(word: str):
     return f"Processed {word}"
 
 @celery_app.task(name="process_batch_upload", bind=True, max_retries=3)
-def process_batch_upload(self, file_paths: List[str], event_id: str, uploader_id: str, photographer_name: str = None):
+def process_batch_upload(self, file_paths: List[str], event_id: str, uploader_id: str, photographer_name: str = None, ingest_policy: Dict = None, profile: bool = False):
     """
     Celery wrapper for batch processing.
+    profile: Capture a CPU + torch profile of this task (needs PROFILING_ENABLED).
     """
     task_id = self.request.id
-    return process_batch_upload_logic(task_id, file_paths, event_id, uploader_id, photographer_name)
 
-def process_batch_upload_logic(task_id: str, file_paths: List[str], event_id: str, uploader_id: str, photographer_name: str = None):
+    def report_progress(meta: Dict):
+        self.update_state(state="PROGRESS", meta=meta)
+
+    try:
+        return process_batch_upload_logic(task_id, file_paths, event_id, uploader_id, photographer_name, ingest_policy, report_progress, profile=profile)
+    finally:
+        release_fair_share(uploader_id)
+        if settings.CLUSTERING_ENABLED:
+            try:
+                # Debounced: all chunks of one upload share a single clustering run
+                schedule_event_clustering(event_id)
+            except Exception as e:
+                logger.warning(f"[{task_id}] Could not schedule clustering for event {event_id}: {e}")
+
+@celery_app.task(name="aggregate_batch_results")
+def aggregate_batch_results(results: List[Dict], event_id: str, uploader_id: str):
+    """
+    Chord callback: merge the chunk results of one fanned-out upload.
+    """
+    merged = merge_batch_results(results)
+    logger.info(f"Upload for event {event_id} by {uploader_id} finished: {merged['status']}, "
+                f"{merged['images_processed']} images, {merged['faces_indexed']} faces indexed across {merged['chunks']} chunks")
+    return merged
+
+def dispatch_batch_upload(file_paths: List[str], event_id: str, uploader_id: str, photographer_name: str = None, ingest_policy: Dict = None, profile: bool = False) -> str:
+    """
+    Enqueue an upload. Batches larger than INGEST_CHUNK_SIZE are split into chunk
+    tasks that run in parallel across workers, joined by a chord aggregator.
+    Small uploads go to the 'ingest' queue, large ones to 'bulk'; each task's
+    priority comes from the photographer's fair share (jobs.scheduling).
+    Returns the id to poll: a task id, or a saved GroupResult id for fanned-out uploads.
+    profile: Profile every chunk task (one artifact set per chunk).
+    """
+    # Only profiled uploads carry the kwarg, so messages stay compatible with older workers
+    task_kwargs = {"profile": True} if profile else {}
+    chunk_size = max(1, settings.INGEST_CHUNK_SIZE)
+    queue = ingest_queue_for(len(file_paths))
+    chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+    priorities = reserve_fair_share(uploader_id, len(chunks))
+
+    if len(chunks) == 1:
+        return process_batch_upload.apply_async(
+            (file_paths, event_id, uploader_id, photographer_name, ingest_policy), task_kwargs,
+            queue=queue, priority=priorities[0]
+        ).id
+
+    header = group(
+        process_batch_upload.s(chunk, event_id, uploader_id, photographer_name, ingest_policy, **task_kwargs).set(queue=queue, priority=priority)
+        for chunk, priority in zip(chunks, priorities)
+    )
+    callback = chord(header)(aggregate_batch_results.s(event_id=event_id, uploader_id=uploader_id))
+
+    # Persist the group so the status endpoint can restore it in another process
+    group_result = callback.parent
+    group_result.save()
+    logger.info(f"Fanned out {len(file_paths)} images into {len(group_result.results)} chunks (group {group_result.id})")
+    return group_result.id
+
+@celery_app.task(name="ingest_pending_files")
+def ingest_pending_files(event_id: str, uploader_id: str, photographer_name: str = None, ingest_policy: Dict = None):
+    """
+    Dispatch the resumable uploads of one event that completed since the last
+    run as a single batch (see jobs.scheduling.queue_pending_file).
+    """
+    file_paths = take_pending_files(event_id, uploader_id)
+    if not file_paths:
+        return {"status": "completed", "files": 0}
+    job_id = dispatch_batch_upload(file_paths, event_id, uploader_id, photographer_name, ingest_policy)
+    logger.info(f"Dispatched {len(file_paths)} resumable uploads for event {event_id} as {job_id}")
+    return {"status": "dispatched", "files": len(file_paths), "job_id": job_id}
+
+def bump_faces_version(event_id: str):
+    """
+    Mark the event's searchable faces as changed. Clusters remember the version
+    they were built from, and search ignores them once it moves on.
+    """
+    if ObjectId.is_valid(event_id):
+        get_sync_db().events.update_one({"_id": ObjectId(event_id)}, {"$inc": {"faces_version": 1}})
+
+def discard_task_records(task_id: str, event_id: str, faiss_ids: np.ndarray):
+    """
+    Undo the records of an ingest task that failed before its vectors were saved:
+    its face records would point at ids that never reach the index, and its
+    photos would show in the event without being findable.
+    The ids are tombstoned first (compaction drops any that did reach the index),
+    then the face and photo records and the photos' variants are deleted.
+    Originals stay on disk so the files can be submitted again.
+    """
+    sync_db = get_sync_db()
+    faiss_ids = [int(faiss_id) for faiss_id in faiss_ids]
+    batch_size = settings.MONGO_BULK_BATCH_SIZE
+    for start in range(0, len(faiss_ids), batch_size):
+        batch = faiss_ids[start:start + batch_size]
+        sync_db.faiss_tombstones.insert_many([
+            {"faiss_id": faiss_id, "event_id": event_id, "created_at": datetime.utcnow()} for faiss_id in batch
+        ], ordered=False)
+        sync_db.faces.delete_many({"event_id": event_id, "image_embedded_number": {"$in": batch}})
+
+    photos = list(sync_db.photos.find({"task_id": task_id}, {"variants": 1}))
+    sync_db.photos.delete_many({"task_id": task_id})
+    from services.event_service import remove_photo_files
+    remove_photo_files([variant["path"] for photo in photos
+                        for variant in (photo.get("variants") or {}).values() if variant.get("path")])
+    logger.info(f"[{task_id}] Discarded {len(faiss_ids)} face records and {len(photos)} photos of the failed task")
+
+def process_batch_upload_logic(task_id: str, file_paths: List[str], event_id: str, uploader_id: str, photographer_name: str = None, ingest_policy: Dict = None, progress_callback: Optional[Callable[[Dict], None]] = None, profile: bool = False):
     """
     Core logic for batch processing. Can be called by Celery or BackgroundTasks.
+    ingest_policy: Optional per-event overrides for the ingest face filter.
+    progress_callback: Receives structured progress dicts (stage, images_done, faces_found, throughput).
+    profile: Run under a profiling session; the result then carries its profile_id.
     """
+    if profile:
+        with profile_session(f"ingest-{task_id}", kind="ingest") as session:
+            result = process_batch_upload_logic(task_id, file_paths, event_id, uploader_id, photographer_name, ingest_policy, progress_callback)
+        if session is not None:
+            result["profile_id"] = session.profile_id
+        return result
+
     logger.info(f"[{task_id}] Processing batch of {len(file_paths)} images for event {event_id} by {photographer_name or uploader_id}")
 
-    all_detections = []
+    pending_detections = []
     processed_count = 0
     failed_count = 0
+    ingest_filter = IngestFilter.from_policy(ingest_policy)
+    progress = ProgressReporter(progress_callback, len(file_paths))
+    writer = None
+    derivatives = None
+    indexed = False
+
+    # Encoded faces of the whole task, added to FAISS in one locked step at the end
+    vectors = []
+    face_tensors = []
+    face_ids = []
+    records_queued = 0
+
+    def store_photos(finished):
+        # Photo docs are written once their thumbnail/preview variants exist
+        for photo_doc, variants in finished:
+            if variants:
+                photo_doc["variants"] = variants
+            writer.add("photos", [photo_doc])
+
+    def encode_pending():
+        """
+        Quality-gate and encode the detections gathered so far, then hand their
+        face records to the background writer right away, so Mongo inserts
+        overlap detection and encoding of the following images.
+        """
+        nonlocal pending_detections, records_queued
+        # Blur/brightness gating in one vectorized pass over the batch's crops
+        detections = ingest_filter.filter_quality(pending_detections)
+        pending_detections = []
+        if not detections:
+            return
+        encoded = [res for res in face_encoder.encode_faces(detections) if res.get('embedding') is not None]
+        if not encoded:
+            return
+
+        # Ids are reserved now and the vectors added under them later, so the records can be written first
+        ids = faiss_service.reserve_ids(len(encoded))
+        face_ids.append(ids)
+        face_records = [{
+            "event_id": res.get('event_id'),
+            "photo_id": res.get('photo_id'),
+            "bounding_box": res['box'],
+            "confidence": res['confidence'],
+            "image_embedded_number": int(faiss_id),
+            "created_at": datetime.now()
+        } for res, faiss_id in zip(encoded, ids)]
+
+        # Keep the exact 160x160 model inputs so re-embedding skips decode + MTCNN
+        if settings.FACE_CROP_STORE_ENABLED:
+            try:
+                shard, first_offset = face_crop_store.append(event_id, ids, face_tensors_to_crops([res['face'] for res in encoded]))
+                for i, record in enumerate(face_records):
+                    record['crop'] = {"shard": shard, "offset": first_offset + i}
+            except Exception as e:
+                logger.warning(f"[{task_id}] Failed to store face crops: {e}")
+
+        # Compact schema (photo metadata lives in 'photos'); unordered bulk inserts
+        writer.add("faces", face_records)
+        records_queued += len(face_records)
+
+        vectors.extend(res['embedding'].tolist() for res in encoded)
+        face_tensors.extend(res['face'] for res in encoded)
 
     try:
-        # 1. Detect Faces in all images
+        # Pooled client + background writer so persistence overlaps the rest of the task
+        writer = BulkWriter(get_sync_db(), label=task_id)
+        # Thumbnails/previews encode from the decoded image while detection runs
+        derivatives = DerivativePipeline()
+        # Encode with the model of the index being served (follows model cutovers)
+        faiss_service.reload_index()
+        face_encoder.load(faiss_service.model_version)
+
+        # 1. Detect faces, encoding every INGEST_ENCODE_BATCH_SIZE of them as they accumulate
         for idx, file_path in enumerate(file_paths):
             try:
+                progress.update("detecting", processed_count + failed_count, len(vectors) + len(pending_detections))
+
                 # Load Image
                 image = image_loader.load_from_path(file_path)
                 if image is None:
@@ -61,6 +338,21 @@ def process_batch_upload_logic(task_id: str, file_paths: List[str], event_id: st
                     failed_count += 1
                     continue
 
+                # One photo document per image; faces refer to it by photo_id
+                photo_id = ObjectId()
+                photo_doc = {
+                    "_id": photo_id,
+                    "event_id": event_id,
+                    "file_path": file_path,
+                    "photographer_name": photographer_name,
+                    "uploader_id": uploader_id,
+                    "task_id": task_id,
+                    "width": int(image.shape[1]),
+                    "height": int(image.shape[0]),
+                    "created_at": datetime.now()
+                }
+                store_photos(derivatives.submit(image, file_path, photo_doc))
+
                 # Detect Faces
                 detections = face_detector.detect_faces(image)
                 processed_count += 1
@@ -69,126 +361,244 @@ def process_batch_upload_logic(task_id: str, file_paths: List[str], event_id: st
                 if processed_count % 10 == 0:
                     logger.info(f"[{task_id}] Processed {processed_count}/{len(file_paths)} images...")
                 
+                # Drop tiny background faces and extreme poses before encoding
+                detections = ingest_filter.filter_geometry(detections, image.shape)
                 if not detections:
                     continue
 
                 # Add metadata to detections
                 for det in detections:
                     det['event_id'] = event_id
-                    det['photographer_name'] = photographer_name
-                    det['file_path'] = file_path
-                    det['batch_task_id'] = task_id
+                    det['photo_id'] = photo_id
                 
-                all_detections.extend(detections)
+                pending_detections.extend(detections)
+                if len(pending_detections) >= settings.INGEST_ENCODE_BATCH_SIZE:
+                    encode_pending()
 
             except Exception as e:
                 logger.error(f"[{task_id}] Error processing file {file_path}: {e}")
                 failed_count += 1
 
-        logger.info(f"[{task_id}] Detection complete. Found {len(all_detections)} faces in {processed_count} images.")
+        store_photos(derivatives.drain())
 
-        if not all_detections:
+        # 2. Encode the last partial batch
+        progress.update("encoding", processed_count + failed_count, len(vectors) + len(pending_detections))
+        encode_pending()
+        filter_stats = ingest_filter.stats()
+
+        logger.info(f"[{task_id}] Detection complete. Encoded {len(vectors)}/{filter_stats['faces_detected']} faces in {processed_count} images. Rejected: {filter_stats['rejected']}")
+
+        if not vectors:
+            write_stats = writer.close()
             return {
                 "status": "completed", 
                 "images_processed": processed_count, 
                 "faces_found": 0,
-                "failed": failed_count
+                "failed": failed_count,
+                "photos_stored": write_stats['inserted'].get('photos', 0),
+                "filtering": filter_stats
             }
 
-        # 2. Encode Faces (Batch)
-        # face_encoder handles batching internally if list is large
-        embeddings_dicts = face_encoder.encode_faces(all_detections)
-        
-        # 3. Prepare for FAISS & DB
-        vectors = []
-        face_records = []
-        
-        for i, res in enumerate(embeddings_dicts):
-            if 'embedding' not in res or res['embedding'] is None:
-                continue
-                
-            embedding_list = res['embedding'].tolist()
-            vectors.append(embedding_list)
-            
-            # Record for MongoDB - Refined Schema
-            face_records.append({
-                "event_id": res.get('event_id'),
-                "photographer_name": res.get('photographer_name'),
-                "file_path": res.get('file_path'),
-                "task_id": task_id,
-                "bounding_box": res['box'],
-                "confidence": res['confidence'],
-                "image_embedded_number": -1, # To be updated
-                "created_at": datetime.now() 
-            })
-
-        if vectors:
-            # 4. Add to FAISS (Thread-Safe / Process-Safe)
-            # In a simple BackgroundTasks scenario without Redis, locking might be skipped or mocked if Redis unavailable
-            # But let's try to be robust. 
-            try:
-                from redis import Redis
-                from config.settings import settings
-                
-                # Connect to Redis for locking
-                redis_client = Redis.from_url(settings.REDIS_URL)
-                # Simple check if redis is reachable
-                redis_client.ping()
-                
-                lock = redis_client.lock("faiss_index_update_lock", timeout=30)
-                acquired = lock.acquire(blocking=True, timeout=5) # Add timeout to avoid hanging
-                
-                if not acquired:
-                     logger.warning(f"[{task_id}] Could not acquire FAISS lock (Redis). Proceeding without lock (Risk of race condition if multiple workers).")
-            except Exception as e:
-                logger.warning(f"[{task_id}] Redis lock failed (likely no Redis), proceeding without lock: {e}")
-                acquired = False
+        # 3. Face records are durable before their vectors become searchable: a
+        # re-embedding cutover only carries over vectors it finds records for
+        progress.update("saving", processed_count + failed_count, len(vectors))
+        write_stats = writer.close()
+        logger.info(f"[{task_id}] Saved {write_stats['inserted'].get('faces', 0)}/{records_queued} face records to DB")
 
-            try:
-                # Sync with disk before adding
-                faiss_service.reload_index()
-                
-                # Add and Save
-                ids = faiss_service.add_vectors(vectors)
-                faiss_service.save_index()
-            finally:
-                if acquired:
-                    try:
-                         lock.release()
-                    except:
-                        pass
-            
-            # Update IDs in records
-            for i, faiss_id in enumerate(ids):
-                face_records[i]['image_embedded_number'] = int(faiss_id)
+        # 4. Add to FAISS under the reserved ids (Thread-Safe / Process-Safe)
+        progress.update("indexing", processed_count + failed_count, len(vectors))
+        ids = np.concatenate(face_ids)
+        with faiss_index_lock(task_id):
+            # Sync with disk before adding
+            faiss_service.reload_index()
 
-            # 5. Save to MongoDB in Chunks
-            from pymongo import MongoClient
-            from config.settings import settings 
-            
-            client = MongoClient(settings.MONGODB_URL)
-            database = client[settings.DATABASE_NAME]
+            if faiss_service.model_version != face_encoder.model_version:
+                # A model cutover landed while we were encoding; never mix models in one index
+                logger.info(f"[{task_id}] Index switched to {faiss_service.model_version}; re-encoding {len(vectors)} faces")
+                face_encoder.load(faiss_service.model_version)
+                vectors = face_encoder.encode_tensors(torch.stack(face_tensors)).tolist()
             
-            if face_records:
-                # Chunked insertion to avoid huge BSON documents and show progress in DB
-                chunk_size = 100
-                total_inserted = 0
-                for i in range(0, len(face_records), chunk_size):
-                    chunk = face_records[i:i + chunk_size]
-                    database.faces.insert_many(chunk)
-                    total_inserted += len(chunk)
-                    logger.info(f"[{task_id}] Progress: Saved {total_inserted}/{len(face_records)} face records to DB")
-                
-            client.close()
+            # Add and Save
+            faiss_service.add_vectors(vectors, ids=ids)
+            faiss_service.save_index()
+        indexed = True
+        try:
+            bump_faces_version(event_id)
+        except Exception as e:
+            logger.warning(f"[{task_id}] Could not bump the faces version of event {event_id}: {e}")
 
         return {
             "status": "completed",
             "images_processed": processed_count,
             "failed_images": failed_count,
             "faces_indexed": len(vectors),
-            "records_stored": len(face_records)
+            "records_stored": write_stats['inserted'].get('faces', 0),
+            "photos_stored": write_stats['inserted'].get('photos', 0),
+            "filtering": filter_stats
         }
 
     except Exception as e:
         logger.error(f"[{task_id}] Batch task failed: {e}", exc_info=True)
+        if writer is not None and not indexed:
+            # Records may already be in Mongo; without their vectors they must not stay
+            try:
+                try:
+                    writer.close()
+                finally:
+                    discard_task_records(task_id, event_id, np.concatenate(face_ids) if face_ids else [])
+            except Exception as cleanup_error:
+                logger.error(f"[{task_id}] Could not discard the records of the failed task: {cleanup_error}", exc_info=True)
+        return {"status": "failed", "error": str(e)}
+
+    finally:
+        if derivatives is not None:
+            derivatives.close()
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+@celery_app.task(name="compact_faiss_index", bind=True)
+def compact_faiss_index(self):
+    """
+    Celery wrapper for FAISS compaction.
+    """
+    clear_compaction_schedule()
+    return compact_faiss_index_logic(self.request.id)
+
+def compact_faiss_index_logic(task_id: str):
+    """
+    Remove deleted faces' vectors from the FAISS index so its size tracks live data.
+    Drains faiss_tombstones and also sweeps faces/photos of events that were
+    deleted while one of their uploads was still being ingested.
+    """
+    sync_db = get_sync_db()
+    try:
+        # 1. Orphans: records written by an ingest that outlived its event.
+        # Only hex-id event references are considered; anything else is legacy data we leave alone.
+        # References are read before events: an event always exists before its first record.
+        referenced = set(sync_db.faces.distinct("event_id")) | set(sync_db.photos.distinct("event_id"))
+        live_events = {str(event["_id"]) for event in sync_db.events.find({}, {"_id": 1})}
+        orphan_events = [event_id for event_id in referenced
+                         if isinstance(event_id, str) and ObjectId.is_valid(event_id) and event_id not in live_events]
+
+        orphan_ids = set()
+        orphan_files = []
+        if orphan_events:
+            orphan_query = {"event_id": {"$in": orphan_events}}
+            for face in sync_db.faces.find(orphan_query, {"_id": 0, "image_embedded_number": 1}):
+                if face.get("image_embedded_number", -1) >= 0:
+                    orphan_ids.add(face["image_embedded_number"])
+            from services.derivatives import variant_paths
+            for photo in sync_db.photos.find(orphan_query, {"file_path": 1, "variants": 1}):
+                orphan_files.extend(variant_paths(photo))
+            logger.info(f"[{task_id}] Sweeping {len(orphan_ids)} faces and {len(orphan_files)} files of {len(orphan_events)} deleted events")
+
+        # 2. Tombstones written by event/photo deletes
+        tombstones = list(sync_db.faiss_tombstones.find({}, {"faiss_id": 1}))
+        ids = sorted({t["faiss_id"] for t in tombstones} | orphan_ids)
+
+        removed = 0
+        if ids:
+            with faiss_index_lock(task_id):
+                faiss_service.reload_index()
+                removed = faiss_service.remove_ids(ids)
+                if removed:
+                    faiss_service.save_index()
+
+        # 3. Only now drop the records: a failed rewrite leaves everything to retry next run
+        if orphan_events:
+            sync_db.faces.delete_many(orphan_query)
+            sync_db.photos.delete_many(orphan_query)
+            sync_db.face_clusters.delete_many(orphan_query)
+            from services.event_service import remove_photo_files
+            remove_photo_files(orphan_files)
+            for event_id in orphan_events:
+                face_crop_store.delete_event(event_id)
+
+        batch_size = settings.MONGO_BULK_BATCH_SIZE
+        for start in range(0, len(tombstones), batch_size):
+            batch = [t["_id"] for t in tombstones[start:start + batch_size]]
+            sync_db.faiss_tombstones.delete_many({"_id": {"$in": batch}})
+
+        logger.info(f"[{task_id}] FAISS compaction removed {removed} vectors. Index size: {faiss_service.index.ntotal}")
+        return {
+            "status": "completed",
+            "vectors_removed": removed,
+            "tombstones_cleared": len(tombstones),
+            "orphan_faces": len(orphan_ids),
+            "index_size": faiss_service.index.ntotal
+        }
+
+    except Exception as e:
+        logger.error(f"[{task_id}] FAISS compaction failed: {e}", exc_info=True)
+        return {"status": "failed", "error": str(e)}
+
+@celery_app.task(name="cluster_event_faces", bind=True)
+def cluster_event_faces(self, event_id: str):
+    """
+    Celery wrapper for per-event identity clustering.
+    """
+    clear_clustering_schedule(event_id)
+    return cluster_event_faces_logic(self.request.id, event_id)
+
+def cluster_event_faces_logic(task_id: str, event_id: str):
+    """
+    Group an event's faces into identities and store one face_clusters doc per
+    identity (normalized centroid + member photos). Selfie search then matches
+    against the event's centroids instead of scanning the global index.
+    A new generation is written before the previous one is dropped, so
+    searches never see an event without clusters.
+    """
+    sync_db = get_sync_db()
+    try:
+        # Read before the faces: a change landing while this runs leaves the
+        # clusters behind the event's version, so search keeps using the index
+        event = sync_db.events.find_one({"_id": ObjectId(event_id)}, {"faces_version": 1}) if ObjectId.is_valid(event_id) else None
+        faces_version = (event or {}).get("faces_version", 0)
+        faces = list(sync_db.faces.find(
+            {"event_id": event_id, "image_embedded_number": {"$gte": 0}},
+            {"_id": 0, "image_embedded_number": 1, "photo_id": 1, "confidence": 1}
+        ))
+        faces = [face for face in faces if face.get("photo_id") is not None]
+        generation = ObjectId()
+
+        clusters = []
+        if faces:
+            faiss_service.reload_index()
+            found_ids, vectors = faiss_service.get_vectors([face["image_embedded_number"] for face in faces])
+            found = set(found_ids.tolist())
+            unindexed = sum(face["image_embedded_number"] not in found for face in faces)
+            if unindexed:
+                # Records of an ingest still running: it bumps the version once its vectors are added
+                logger.info(f"[{task_id}] Event {event_id}: {unindexed} faces not in the index yet")
+            faces = [face for face in faces if face["image_embedded_number"] in found]
+
+            labels = cluster_embeddings(vectors, settings.CLUSTER_LINK_DISTANCE, settings.CLUSTER_MAX_DIAMETER)
+            clusters = summarize_clusters(labels, vectors, faces)
+
+        docs = [{
+            "event_id": event_id,
+            "generation": generation,
+            "centroid": Binary(cluster["centroid"].tobytes()),
+            "size": cluster["size"],
+            "photos": cluster["photos"],
+            # Any other version means faces arrived or left since; search falls back to the index
+            "faces_version": faces_version,
+            # Centroids are only comparable with selfies embedded by the same model
+            "model_version": faiss_service.model_version,
+            "created_at": datetime.utcnow()
+        } for cluster in clusters]
+
+        batch_size = settings.MONGO_BULK_BATCH_SIZE
+        for start in range(0, len(docs), batch_size):
+            sync_db.face_clusters.insert_many(docs[start:start + batch_size], ordered=False)
+        sync_db.face_clusters.delete_many({"event_id": event_id, "generation": {"$ne": generation}})
+
+        logger.info(f"[{task_id}] Event {event_id}: {len(faces)} faces in {len(docs)} clusters")
+        return {"status": "completed", "event_id": event_id, "faces": len(faces), "clusters": len(docs)}
+
+    except Exception as e:
+        logger.error(f"[{task_id}] Clustering failed for event {event_id}: {e}", exc_info=True)
         return {"status": "failed", "error": str(e)}
@@ -1,19 +1,24 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from config.database import db
-from fastapi.staticfiles import StaticFiles
-from routers import auth, uploads, events, search
+from config.settings import settings
+from routers import auth, uploads, events, search, profiles, media
+from services.schema_service import ensure_indexes, migrate_face_records
+from services.metrics import metrics, HTTP_REQUEST_SECONDS
 
 app = FastAPI(title="Intelligent Event Photo Retrieval System")
 
-# Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
 # Include Routers
 app.include_router(auth.router)
 app.include_router(uploads.router)
 app.include_router(events.router)
 app.include_router(search.router)
+app.include_router(profiles.router)
+# Catch-all GET /uploads/{path}; after the uploads router so its API routes win
+app.include_router(media.router)
 
 # Enable CORS
 app.add_middleware(
@@ -22,23 +27,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination, profiling results and cache validators travel in headers
+    expose_headers=["X-Next-Cursor", "X-Profile-Id", "ETag"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    if settings.METRICS_ENABLED:
+        # Route template, not the raw path, keeps label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=response.status_code)
+    return response
+
 @app.on_event("startup")
 async def startup():
     await db.connect()
+    await ensure_indexes()
+    # Data migrations can take a while on large collections; don't block startup
+    app.state.migration_task = asyncio.create_task(migrate_face_records())
     print("DEBUG: Registered Routes:")
     for route in app.routes:
         print(f"DEBUG: {route.path} {route.methods}")
 
 @app.on_event("shutdown")
 async def shutdown():
+    migration_task = getattr(app.state, "migration_task", None)
+    if migration_task is not None and not migration_task.done():
+        # Cancelling releases the migration's claim, so the next startup resumes it right away
+        migration_task.cancel()
+        await asyncio.gather(migration_task, return_exceptions=True)
     db.close()
 
 @app.get("/")
 async def root():
     return {"message": "Server is running and connected to MongoDB!"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: this API process plus every live Celery worker."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
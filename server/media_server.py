@@ -0,0 +1,28 @@
+"""
+Media-only app: serves /uploads without loading the API routers or the ML
+stack, so photo delivery runs in its own processes instead of competing
+with selfie inference in the API workers.
+
+Usage:
+    uvicorn media_server:app --port 8001 --workers 4
+
+Point MEDIA_BASE_URL at it (or at the nginx/CDN in front of it).
+"""
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from routers import media
+
+app = FastAPI(title="Event Photo Media", docs_url=None, redoc_url=None, openapi_url=None)
+app.include_router(media.router)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["GET", "HEAD"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges"],
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -4,6 +4,7 @@ import numpy as np
 from typing import List, Dict, Optional, Union
 import logging
 from PIL import Image, ImageDraw, ImageFont
+from services.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,7 @@ class FaceDetector:
         
         return [x1, y1, x2, y2]
 
+    @timed("detect")
     def detect_faces(self, image: np.ndarray, min_confidence: float = 0.90) -> List[Dict]:
         """
         Detect faces in a numpy array image (RGB).
@@ -52,7 +54,8 @@ class FaceDetector:
             image: Standard numpy array (H, W, 3).
             min_confidence: Minimum confidence threshold to accept a detection.
         Returns:
-            List of dicts: {'box': [x1, y1, x2, y2], 'confidence': float, 'face': tensor}
+            List of dicts: {'box': [x1, y1, x2, y2], 'confidence': float, 'face': tensor,
+                            'landmarks': [[x, y] * 5] (eyes, nose, mouth corners)}
         """
         if image is None:
             logger.warning("FaceDetector received None image.")
@@ -60,7 +63,7 @@ class FaceDetector:
 
         try:
             # 1. Detect boxes and probabilities
-            boxes, probs = self.mtcnn.detect(image)
+            boxes, probs, landmarks = self.mtcnn.detect(image, landmarks=True)
             
             results = []
             if boxes is not None and len(boxes) > 0:
@@ -93,7 +96,8 @@ class FaceDetector:
                     results.append({
                         'box': valid_box,
                         'confidence': float(prob),
-                        'face': face_tensor
+                        'face': face_tensor,
+                        'landmarks': landmarks[i].tolist() if landmarks is not None else None
                     })
                     
                 logger.info(f"Detected {len(results)} valid faces.")
@@ -106,6 +110,14 @@ class FaceDetector:
             logger.error(f"Error during face detection: {e}")
             return []
 
+    def extract_face(self, image: np.ndarray, box: List[int]) -> Optional[torch.Tensor]:
+        """
+        Crop a known box into the standardized 160x160 tensor detect_faces produces.
+        Lets re-embedding reuse stored bounding boxes instead of running detection.
+        """
+        face_tensor = self.mtcnn.extract(Image.fromarray(image), [box], save_path=None)
+        return face_tensor[0] if face_tensor is not None else None
+
     def draw_boxes(self, image: np.ndarray, results: List[Dict]) -> Image.Image:
         """
         Draw bounding boxes on the image for visualization.
@@ -3,24 +3,75 @@ from facenet_pytorch import InceptionResnetV1
 import numpy as np
 from typing import List, Optional, Union
 import logging
+from config.settings import settings
+from services.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# Embedding models by version tag. The tag is stored with every FAISS index
+# (see FaissService.model_version) so vectors of different models never mix.
+# Register a new tag here, then run jobs.reembed to migrate to it.
+MODEL_REGISTRY = {
+    "facenet-vggface2-v1": {"pretrained": "vggface2", "dimension": 512},
+    "facenet-casia-webface-v1": {"pretrained": "casia-webface", "dimension": 512},
+}
+
 class FaceEncoder:
-    def __init__(self):
+    def __init__(self, model_version: Optional[str] = None):
         """
         Initialize FaceNet (InceptionResnetV1) model.
-        Pretrained on VGGFace2.
+        
+        Args:
+            model_version: Tag from MODEL_REGISTRY (default EMBEDDING_MODEL_VERSION,
+                           FaceNet pretrained on VGGFace2).
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f"Initializing FaceEncoder on device: {self.device}")
-        
+        self.model = None
+        self.model_version = None
+        self.dimension = None
+        self.load(model_version or settings.EMBEDDING_MODEL_VERSION)
+
+    def load(self, model_version: str):
+        """
+        Switch to another registered model. No-op if it is already loaded.
+        Called after an index cutover so new faces match the active index.
+        """
+        if model_version == self.model_version:
+            return
+        spec = MODEL_REGISTRY.get(model_version)
+        if spec is None:
+            raise ValueError(f"Unknown embedding model version: {model_version}")
+
         try:
-            self.model = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
+            self.model = InceptionResnetV1(pretrained=spec["pretrained"]).eval().to(self.device)
         except Exception as e:
             logger.error(f"Failed to initialize FaceNet model: {e}")
             raise
+        self.model_version = model_version
+        self.dimension = spec["dimension"]
+        logger.info(f"Loaded embedding model {model_version}")
+
+    @timed("encode")
+    def encode_tensors(self, batch: torch.Tensor, batch_size: int = 32) -> np.ndarray:
+        """
+        Embed an already stacked (N, 3, 160, 160) batch of standardized face tensors,
+        e.g. crops streamed from the face crop store.
+        
+        Returns:
+            np.ndarray: (N, dimension) float32 L2-normalized embeddings.
+        """
+        embeddings_list = []
+        for i in range(0, len(batch), batch_size):
+            with torch.no_grad():
+                emb_batch = self.model(batch[i : i + batch_size].to(self.device))
+                emb_batch = torch.nn.functional.normalize(emb_batch, p=2, dim=1)
+                embeddings_list.append(emb_batch.detach().cpu().numpy())
+        if not embeddings_list:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(embeddings_list, axis=0).astype(np.float32)
 
+    @timed("encode")
     def encode_faces(self, faces: List[dict]) -> List[dict]:
         """
         Generate embeddings for a list of face detection results.
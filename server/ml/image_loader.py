@@ -5,6 +5,8 @@ import logging
 import os
 from typing import List, Optional
 
+from services.metrics import timed
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -86,6 +88,7 @@ class ImageLoader:
 
         return np.array(image)
 
+    @timed("decode")
     def load_from_path(self, path: str) -> Optional[np.ndarray]:
         """
         Load image from a file path with validations.
@@ -114,6 +117,7 @@ class ImageLoader:
             logger.error(f"Unexpected error loading image from path {path}: {e}")
             return None
 
+    @timed("decode")
     def load_from_bytes(self, data: bytes) -> Optional[np.ndarray]:
         """
         Load image from bytes (standard for API uploads).
@@ -0,0 +1,144 @@
+import math
+import logging
+from typing import List, Dict, Optional
+
+from ml.quality_checker import FaceQualityChecker, face_tensors_to_crops
+
+logger = logging.getLogger(__name__)
+
+REJECTION_REASONS = ("too_small", "pose", "blurry", "too_dark")
+
+class IngestFilter:
+    def __init__(
+        self,
+        enabled: bool = True,
+        min_face_px: int = 32,
+        min_face_ratio: float = 0.03,
+        blur_threshold: float = 40.0,
+        darkness_threshold: float = 30.0,
+        max_yaw: float = 0.6,
+        max_roll_degrees: float = 40.0
+    ):
+        """
+        Drop faces at ingest that will never match a selfie, before they cost
+        encoder time, FAISS memory and scan time.
+        Args:
+            enabled: When False every detection is kept (counters still recorded).
+            min_face_px: Minimum face width/height in pixels.
+            min_face_ratio: Minimum face side relative to the image's shorter side.
+            blur_threshold: Minimum Laplacian variance of the 160x160 face crop.
+            darkness_threshold: Minimum mean brightness of the 160x160 face crop.
+            max_yaw: Maximum nose offset asymmetry between the eyes (0 = frontal, 1 = profile).
+            max_roll_degrees: Maximum tilt of the eye line.
+        """
+        self.enabled = enabled
+        self.min_face_px = min_face_px
+        self.min_face_ratio = min_face_ratio
+        self.max_yaw = max_yaw
+        self.max_roll_degrees = max_roll_degrees
+        self.quality_checker = FaceQualityChecker(
+            blur_threshold=blur_threshold,
+            darkness_threshold=darkness_threshold
+        )
+
+        self.faces_seen = 0
+        self.rejected = {reason: 0 for reason in REJECTION_REASONS}
+
+    @classmethod
+    def from_policy(cls, policy: Optional[Dict] = None) -> "IngestFilter":
+        """
+        Build a filter from the global settings, overridden by an event's ingest policy.
+        Policy keys match the constructor arguments; None values fall back to settings.
+        """
+        from config.settings import settings
+
+        options = {
+            "enabled": settings.INGEST_FILTER_ENABLED,
+            "min_face_px": settings.INGEST_MIN_FACE_PX,
+            "min_face_ratio": settings.INGEST_MIN_FACE_RATIO,
+            "blur_threshold": settings.INGEST_BLUR_THRESHOLD,
+            "darkness_threshold": settings.INGEST_DARKNESS_THRESHOLD,
+            "max_yaw": settings.INGEST_MAX_YAW,
+            "max_roll_degrees": settings.INGEST_MAX_ROLL_DEGREES,
+        }
+        for key, value in (policy or {}).items():
+            if key in options and value is not None:
+                options[key] = value
+        return cls(**options)
+
+    def _estimate_pose(self, landmarks: List[List[float]]) -> (float, float):
+        """
+        Rough yaw/roll from the 5 MTCNN landmarks.
+        Returns: (yaw_asymmetry, roll_degrees)
+        """
+        (lx, ly), (rx, ry), (nx, _) = landmarks[0], landmarks[1], landmarks[2]
+
+        roll = abs(math.degrees(math.atan2(ry - ly, rx - lx)))
+
+        eye_span = rx - lx
+        if eye_span <= 0:
+            # Eyes swapped or collapsed: full profile
+            return 1.0, roll
+        yaw = abs((nx - lx) - (rx - nx)) / eye_span
+        return yaw, roll
+
+    def _reject(self, reason: str) -> bool:
+        self.rejected[reason] += 1
+        return self.enabled
+
+    def filter_geometry(self, detections: List[Dict], image_shape: tuple) -> List[Dict]:
+        """
+        Size and pose gating for the detections of one image.
+        """
+        self.faces_seen += len(detections)
+        min_side = max(self.min_face_px, self.min_face_ratio * min(image_shape[:2]))
+
+        kept = []
+        for det in detections:
+            x1, y1, x2, y2 = det['box']
+            if min(x2 - x1, y2 - y1) < min_side:
+                if self._reject("too_small"):
+                    continue
+            elif det.get('landmarks') is not None:
+                yaw, roll = self._estimate_pose(det['landmarks'])
+                if yaw > self.max_yaw or roll > self.max_roll_degrees:
+                    if self._reject("pose"):
+                        continue
+            kept.append(det)
+        return kept
+
+    def filter_quality(self, detections: List[Dict]) -> List[Dict]:
+        """
+        Blur and brightness gating over all face crops in one vectorized pass.
+        """
+        with_face = [det for det in detections if det.get('face') is not None]
+        if not with_face:
+            return detections
+
+        crops = face_tensors_to_crops([det['face'] for det in with_face])
+        verdicts = self.quality_checker.check_batch(crops)
+
+        kept = [det for det in detections if det.get('face') is None]
+        for det, verdict in zip(with_face, verdicts):
+            blur_score = verdict['scores']['blur']
+            dark_score = verdict['scores']['brightness']
+            det['quality'] = {"blur": float(blur_score), "brightness": float(dark_score)}
+
+            if blur_score < self.quality_checker.blur_threshold:
+                if self._reject("blurry"):
+                    continue
+            elif dark_score < self.quality_checker.darkness_threshold:
+                if self._reject("too_dark"):
+                    continue
+            kept.append(det)
+        return kept
+
+    def stats(self) -> Dict:
+        """Counters for the task result."""
+        rejected_total = sum(self.rejected.values()) if self.enabled else 0
+        return {
+            "enabled": self.enabled,
+            "faces_detected": self.faces_seen,
+            "faces_kept": self.faces_seen - rejected_total,
+            "rejected": dict(self.rejected)
+        }
@@ -1,6 +1,9 @@
 import cv2
 import numpy as np
 import logging
+from typing import List, Union
+
+from services.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -87,5 +90,97 @@ class FaceQualityChecker:
             "scores": {"blur": blur_score, "brightness": dark_score}
         }
 
+    def _batch_scores(self, crops: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Compute blur and brightness scores for a stack of crops in one pass.
+        The stack is viewed as a single tall (N*H, W, 3) image so OpenCV runs
+        one grayscale conversion and one Laplacian for the whole batch.
+        Args:
+            crops: uint8 array of shape (N, H, W, 3) in RGB order.
+        Returns: (blur_scores, brightness_scores), each of shape (N,)
+        """
+        n, h, w = crops.shape[:3]
+        if crops.dtype != np.uint8:
+            crops = np.clip(crops, 0, 255).astype(np.uint8)
+        tall = np.ascontiguousarray(crops).reshape(n * h, w, 3)
+        pixels = h * w
+
+        # Brightness: HSV V channel is max(R, G, B)
+        r, g, b = cv2.split(tall)
+        value = cv2.max(cv2.max(r, g), b)
+        brightness = value.reshape(n, pixels).sum(axis=1, dtype=np.int64) / pixels
+
+        # Shared grayscale conversion for the whole stack
+        gray = cv2.cvtColor(tall, cv2.COLOR_RGB2GRAY)
+        lap = cv2.Laplacian(gray, cv2.CV_16S).reshape(n, h, w)
+
+        # The tall image leaks neighbouring crops into each crop's first/last row.
+        # Recompute those rows with the BORDER_REFLECT_101 rule cv2 uses per image.
+        if n > 1 and h > 1 and w > 1:
+            g32 = gray.reshape(n, h, w).astype(np.int32)
+            for row, inner in ((0, 1), (h - 1, h - 2)):
+                edge = g32[:, row, :]
+                horizontal = np.empty_like(edge)
+                horizontal[:, 1:-1] = edge[:, :-2] + edge[:, 2:]
+                horizontal[:, 0] = 2 * edge[:, 1]
+                horizontal[:, -1] = 2 * edge[:, -2]
+                lap[:, row, :] = horizontal + 2 * g32[:, inner, :] - 4 * edge
+
+        # Variance of Laplacian from exact integer moments
+        flat = lap.reshape(n, pixels)
+        total = flat.sum(axis=1, dtype=np.int64)
+        wide = flat.astype(np.int32)
+        total_sq = np.einsum("ij,ij->i", wide, wide, dtype=np.int64)
+        blur = total_sq / pixels - (total / pixels) ** 2
+
+        return blur, brightness
+
+    @timed("quality")
+    def check_batch(self, crops: Union[np.ndarray, List[np.ndarray]]) -> List[dict]:
+        """
+        Validate a stack of same-sized face crops (N, H, W, 3) in one vectorized pass.
+        Returns one dict per crop, in the same format as check_face.
+        """
+        if crops is None or len(crops) == 0:
+            return []
+
+        try:
+            if not isinstance(crops, np.ndarray):
+                crops = np.stack(crops)
+            if crops.ndim != 4 or crops.shape[3] != 3:
+                raise ValueError(f"Expected (N, H, W, 3) crops, got shape {crops.shape}")
+
+            blur_scores, brightness_scores = self._batch_scores(crops)
+        except Exception as e:
+            logger.error(f"Error during batch quality check: {e}")
+            # Fall back to the per-crop path so one bad stack doesn't drop everything
+            return [self.check_face(np.asarray(crop)) for crop in crops]
+
+        results = []
+        for blur_score, dark_score in zip(blur_scores.tolist(), brightness_scores.tolist()):
+            issues = []
+            if blur_score < self.blur_threshold:
+                issues.append(f"Too Blurry (Score: {blur_score:.1f} < {self.blur_threshold})")
+            if dark_score < self.darkness_threshold:
+                issues.append(f"Too Dark (Score: {dark_score:.1f} < {self.darkness_threshold})")
+
+            results.append({
+                "is_valid": not issues,
+                "issues": issues,
+                "scores": {"blur": blur_score, "brightness": dark_score}
+            })
+        return results
+
+def face_tensors_to_crops(tensors) -> np.ndarray:
+    """
+    Convert MTCNN face tensors (3x160x160, post-processed to roughly [-1, 1])
+    back into a uint8 (N, 160, 160, 3) RGB stack suitable for check_batch.
+    """
+    import torch
+
+    batch = torch.stack(list(tensors)).detach().cpu()
+    batch = (batch * 128.0 + 127.5).clamp_(0, 255).round_().to(torch.uint8)
+    return batch.permute(0, 2, 3, 1).numpy()
+
 # Singleton
 quality_checker = FaceQualityChecker()
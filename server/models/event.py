@@ -5,9 +5,20 @@ from bson import ObjectId
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
+class IngestPolicy(BaseModel):
+    """Per-event overrides for ingest-time face filtering. None = use server default."""
+    enabled: Optional[bool] = None
+    min_face_px: Optional[int] = Field(None, ge=0)
+    min_face_ratio: Optional[float] = Field(None, ge=0, le=1)
+    blur_threshold: Optional[float] = Field(None, ge=0)
+    darkness_threshold: Optional[float] = Field(None, ge=0, le=255)
+    max_yaw: Optional[float] = Field(None, ge=0)
+    max_roll_degrees: Optional[float] = Field(None, ge=0, le=180)
+
 class EventBase(BaseModel):
     name: str
     is_active: bool = True
+    ingest_policy: Optional[IngestPolicy] = None
 
 class EventCreate(EventBase):
     pass
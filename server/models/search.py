@@ -0,0 +1,6 @@
+from typing import List
+from pydantic import BaseModel, Field
+
+class PhotoDownloadRequest(BaseModel):
+    event_id: str
+    photo_ids: List[str] = Field(..., min_length=1)  # photo_id values from a search response
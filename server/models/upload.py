@@ -0,0 +1,8 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+class UploadSessionCreate(BaseModel):
+    event_id: str
+    filename: str
+    size: int = Field(..., gt=0)  # Total file size in bytes
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")  # Verified once the upload completes
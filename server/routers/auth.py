@@ -3,8 +3,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from config.database import db
 from models.user import UserCreate, UserInDB, Token, UserResponse, UserRole
-from auth.utils import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from auth.dependencies import get_current_active_user
+from auth.utils import verify_password_async, get_password_hash_async, needs_rehash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.dependencies import get_current_active_user, invalidate_user
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -21,7 +24,7 @@ async def register(user: UserCreate):
             )
         
         # Hash password
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         
         # Create user dict
         user_data = user.model_dump(exclude={"password"})
@@ -49,12 +52,21 @@ async def register(user: UserCreate):
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     # Find user
     user = await db.db.users.find_one({"email": form_data.username}) # OAuth2 form uses 'username' for email
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if needs_rehash(user["hashed_password"]):
+        # BCRYPT_ROUNDS changed: upgrade the stored hash while we have the plain password
+        try:
+            new_hash = await get_password_hash_async(form_data.password)
+            await db.db.users.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": new_hash}})
+            invalidate_user(str(user["_id"]))
+        except Exception as e:
+            logger.warning(f"Failed to rehash password for user {user['_id']}: {e}")
     
     # Create token
     # Create token
@@ -1,13 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Header, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import List, Optional
+import hashlib
+import json
+import logging
+import uuid
 from models.event import EventCreate, EventResponse, EventInDB
 from models.user import UserResponse
 from auth.dependencies import get_current_photographer
-from services.event_service import create_event, get_event_by_id, get_events_by_photographer
+from services.event_service import create_event, get_event_by_id, get_events_by_photographer, build_share_link, slugify
 from config.settings import settings
+from services.cache import TieredCache, etag_matches
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/event", tags=["Events"])
 
+# event hex id -> {"status", "body", "etag"} of the public event page; shared via Redis when enabled
+public_event_cache = TieredCache("public_event", maxsize=settings.PUBLIC_EVENT_CACHE_MAX_ENTRIES, ttl=settings.PUBLIC_EVENT_CACHE_TTL_SECONDS)
+# Missing/inactive answers are cached briefly: a lookup error also looks like "missing"
+NEGATIVE_CACHE_TTL_SECONDS = 5
+
+async def invalidate_public_event(event_hex_id: str):
+    """Drop the cached public page of an event; call after changing or deleting it."""
+    await public_event_cache.adelete(event_hex_id)
+
+async def _get_owned_event(event_hex_id: str, current_user) -> EventInDB:
+    event = await get_event_by_id(event_hex_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.created_by != str(current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to modify this event")
+    return event
+
+def _after_delete(event_hex_id: str, background_tasks: BackgroundTasks, recluster: bool = False):
+    """
+    Drop cached search results for the event and schedule a FAISS compaction
+    (plus re-clustering of the event's faces when it still exists).
+    Without Redis (dev mode) the jobs run in-process after the response.
+    """
+    from routers.search import search_generation, search_result_cache, cluster_cache
+    # The generation reaches every worker; the prefix drop just frees this worker's entries
+    search_generation.bump(event_hex_id)
+    search_result_cache.invalidate_prefix(f"{event_hex_id}:")
+    cluster_cache.delete(event_hex_id)
+
+    try:
+        from jobs.scheduling import schedule_faiss_compaction, schedule_event_clustering
+        schedule_faiss_compaction()
+        if recluster and settings.CLUSTERING_ENABLED:
+            schedule_event_clustering(event_hex_id)
+    except Exception as e:
+        logger.info(f"Could not schedule maintenance via Celery ({e}). Using BackgroundTasks fallback.")
+        from jobs.tasks import compact_faiss_index_logic, cluster_event_faces_logic
+        background_tasks.add_task(compact_faiss_index_logic, str(uuid.uuid4()))
+        if recluster and settings.CLUSTERING_ENABLED:
+            background_tasks.add_task(cluster_event_faces_logic, str(uuid.uuid4()), event_hex_id)
+
 # Photographer Endpoints
 
 @router.post("/", response_model=EventResponse, status_code=status.HTTP_201_CREATED)
@@ -23,7 +73,7 @@ async def create_new_event(
         new_event = await create_event(event, user_id)
         
         from services.event_service import generate_share_link
-        share_link = await generate_share_link(new_event, user_id)
+        share_link = await generate_share_link(new_event, user_id, current_user["name"])
         
         return EventResponse(
             **new_event.dict(exclude={"id"}),
@@ -35,21 +85,68 @@ async def create_new_event(
 
 @router.get("/", response_model=List[EventResponse])
 async def list_events(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user: UserResponse = Depends(get_current_photographer)
 ):
     """
-    List all events created by the current photographer.
+    List the events created by the current photographer, newest first.
+    - limit: Page size.
+    - cursor: Value of the previous page's X-Next-Cursor header.
+    The X-Next-Cursor response header is set when more events follow.
     """
     user_id = str(current_user["_id"])
-    events = await get_events_by_photographer(user_id)
-    
-    from services.event_service import generate_share_link
-    resp = []
-    for event in events:
-        link = await generate_share_link(event, user_id)
-        resp.append(EventResponse(**event.dict(exclude={"id"}), id=str(event.id), share_link=link))
-    return resp
+    try:
+        events, next_cursor = await get_events_by_photographer(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # All events belong to the current user, so one slug serves every share link
+    photographer_slug = slugify(current_user["name"])
+    return [
+        EventResponse(**event.dict(exclude={"id"}), id=str(event.id), share_link=build_share_link(str(event.id), photographer_slug))
+        for event in events
+    ]
+
+@router.delete("/{event_hex_id}")
+async def delete_event_endpoint(
+    event_hex_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Delete an event with all of its photos and faces. Only for the event creator.
+    Face vectors are removed from the search index by a background compaction.
+    """
+    await _get_owned_event(event_hex_id, current_user)
 
+    from services.event_service import delete_event
+    deleted = await delete_event(event_hex_id)
+    await invalidate_public_event(event_hex_id)
+    _after_delete(event_hex_id, background_tasks)
+    return {"message": "Event deleted", **deleted}
+
+@router.delete("/{event_hex_id}/photos/{photo_id}")
+async def delete_photo_endpoint(
+    event_hex_id: str,
+    photo_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Delete one photo and its faces from an event. Only for the event creator.
+    """
+    await _get_owned_event(event_hex_id, current_user)
+
+    from services.event_service import delete_photo
+    deleted = await delete_photo(event_hex_id, photo_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    _after_delete(event_hex_id, background_tasks, recluster=True)
+    return {"message": "Photo deleted", **deleted}
 
 @router.get("/{photographer_slug}/{event_hex_id}/share-link", response_model=dict)
 async def get_share_link_v2(
@@ -69,24 +166,43 @@ async def get_share_link_v2(
         raise HTTPException(status_code=403, detail="Not authorized to access this event")
         
     from services.event_service import generate_share_link
-    return {"share_link": await generate_share_link(event, str(current_user["_id"]))}
+    return {"share_link": await generate_share_link(event, str(current_user["_id"]), current_user["name"])}
 
 
 # Public Endpoints
 
-@router.get("/{photographer_slug}/{event_hex_id}", response_model=EventResponse)
-async def get_event_details_v2(photographer_slug: str, event_hex_id: str):
-    """
-    Get event details by photographer slug and event hex ID. Public access for guests.
-    """
+async def _load_public_event(event_hex_id: str, photographer_slug: str) -> dict:
     event = await get_event_by_id(event_hex_id, photographer_slug)
-    
     if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-        
+        return {"status": 404, "body": "Event not found"}
     if not event.is_active:
-        raise HTTPException(status_code=400, detail="Event is not active")
-        
+        return {"status": 400, "body": "Event is not active"}
+
     from services.event_service import generate_share_link
     share_link = await generate_share_link(event, event.created_by)
-    return EventResponse(**event.dict(exclude={"id"}), id=str(event.id), share_link=share_link)
+    body = jsonable_encoder(EventResponse(**event.dict(exclude={"id"}), id=str(event.id), share_link=share_link))
+    etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+    return {"status": 200, "body": body, "etag": etag}
+
+@router.get("/{photographer_slug}/{event_hex_id}", response_model=EventResponse)
+async def get_event_details_v2(photographer_slug: str, event_hex_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Get event details by photographer slug and event hex ID. Public access for guests.
+    Served from a read-through cache with an ETag, so guest spikes after a
+    link is shared don't reach MongoDB; If-None-Match revalidation gets a 304.
+    """
+    entry = await public_event_cache.aget(event_hex_id)
+    if entry is None:
+        entry = await _load_public_event(event_hex_id, photographer_slug)
+        await public_event_cache.aset(event_hex_id, entry, ttl=None if entry["status"] == 200 else NEGATIVE_CACHE_TTL_SECONDS)
+
+    if entry["status"] != 200:
+        raise HTTPException(status_code=entry["status"], detail=entry["body"])
+
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": f"public, max-age={settings.PUBLIC_EVENT_MAX_AGE_SECONDS}, stale-while-revalidate={settings.PUBLIC_EVENT_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(entry["body"], headers=headers)
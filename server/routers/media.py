@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse
+from typing import Optional, Tuple
+import asyncio
+import mimetypes
+import os
+import re
+import stat
+
+from config.settings import settings
+from services.cache import etag_matches
+from services.derivatives import VARIANTS, derivative_path
+
+router = APIRouter(prefix="/uploads", tags=["Media"])
+
+MEDIA_ROOT = os.path.realpath("uploads")
+os.makedirs(MEDIA_ROOT, exist_ok=True)
+
+# Uploads are stored as <uuid4><ext> and variants as <uuid4>_<variant><ext>; neither is ever rewritten
+UUID_NAME = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(_[a-z]+)?\.[a-z0-9]+")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+VARIANT_PATTERN = "^(" + "|".join(name for name, _ in VARIANTS) + ")$"
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+def _resolve(path: str, variant: Optional[str]) -> Optional[Tuple[str, os.stat_result, bool]]:
+    """
+    File to serve for a request path, its stat and whether a requested
+    variant fell back to the original; None if there is nothing to serve.
+    A missing variant falls back to the original (photos ingested before
+    derivatives existed), matching the URLs the search API hands out.
+    """
+    full_path = os.path.realpath(os.path.join(MEDIA_ROOT, path))
+    if os.path.commonpath([full_path, MEDIA_ROOT]) != MEDIA_ROOT or full_path.endswith(".part"):
+        return None
+
+    candidates = []
+    if variant:
+        # Configured format first; variants of older ingests may use the other one
+        exts = (".avif", ".webp") if settings.DERIVATIVE_FORMAT.upper() == "AVIF" else (".webp", ".avif")
+        candidates += [derivative_path(full_path, variant, ext) for ext in exts]
+    candidates.append(full_path)
+
+    for candidate in candidates:
+        try:
+            stat_result = os.stat(candidate)
+        except OSError:
+            continue
+        if stat.S_ISREG(stat_result.st_mode):
+            return candidate, stat_result, bool(variant) and candidate == full_path
+    return None
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_media(path: str,
+                      variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN),
+                      if_none_match: Optional[str] = Header(None)):
+    """
+    Serve a stored photo or one of its variants (?variant=thumb|preview).
+    Strong ETag from size and mtime (files are only ever replaced atomically),
+    a year of immutable caching for UUID-named files, and byte ranges.
+    A variant served by its original is revalidated on every use instead,
+    since the same URL serves the variant once it has been generated.
+    With MEDIA_ACCEL_REDIRECT_PREFIX set, nginx sends the body instead.
+    """
+    resolved = await asyncio.to_thread(_resolve, path, variant)
+    if resolved is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    file_path, stat_result, fell_back = resolved
+
+    filename = os.path.basename(file_path)
+    if fell_back:
+        cache_control = "no-cache"
+    elif UUID_NAME.fullmatch(filename):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = f"public, max-age={settings.MEDIA_MUTABLE_MAX_AGE_SECONDS}"
+    headers = {
+        "ETag": f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"',
+        "Cache-Control": cache_control,
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the internal location with sendfile and handles Range itself
+        relative_path = os.path.relpath(file_path, MEDIA_ROOT).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative_path
+        return Response(headers=headers, media_type=media_type)
+
+    # FileResponse streams in chunks off the event loop and answers Range/If-Range requests
+    return FileResponse(file_path, headers=headers, media_type=media_type, stat_result=stat_result)
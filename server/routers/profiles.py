@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from auth.dependencies import get_current_admin
+from config.settings import settings
+from services.profiling import list_profiles, profile_artifact_path
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+def _require_enabled():
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+
+@router.get("/")
+async def get_profiles(current_user: dict = Depends(get_current_admin)):
+    """
+    List stored profiles (newest first). Captures are triggered with the
+    X-Profile header on search/upload requests or profile=True on ingest tasks.
+    """
+    _require_enabled()
+    return {"profiles": list_profiles()}
+
+@router.get("/{profile_id}/{artifact}")
+async def download_profile_artifact(profile_id: str, artifact: str, current_user: dict = Depends(get_current_admin)):
+    """
+    Download one artifact: stacks.folded (flame graph input), cpu_summary.json,
+    torch_trace.json (chrome://tracing / Perfetto), torch_ops.txt or meta.json.
+    """
+    _require_enabled()
+    path = profile_artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile artifact not found")
+    return FileResponse(path, filename=f"{profile_id}-{artifact}")
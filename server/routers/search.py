@@ -1,22 +1,47 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Response, status
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from bson.errors import InvalidId
 from ml.image_loader import image_loader
 from ml.face_detector import face_detector
 from ml.face_encoder import face_encoder
 from ml.quality_checker import quality_checker
 from services.faiss_service import faiss_service
+from services.clustering import nearest_cluster
+from services.cache import GenerationCounter, TieredCache, TTLCache
+from services.metrics import stage_timer
+from services.profiling import profile_session, profiling_requested
+from services.zip_stream import stream_zip, archive_names
+from models.search import PhotoDownloadRequest
 from config.database import db
 from config.settings import settings
 import numpy as np
 import torch
 import logging
+import hashlib
 from PIL import Image
 import io
 import os
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/search", tags=["Search"])
 
+# Selfie bytes hash -> embedding or rejection reason (skips decode/MTCNN/FaceNet on retries)
+selfie_cache = TieredCache("selfie", maxsize=settings.SELFIE_CACHE_MAX_ENTRIES, ttl=settings.SELFIE_CACHE_TTL_SECONDS)
+# (event, embedding, index version) -> full search response; event first so deletes can drop an event's entries
+search_result_cache = TieredCache("search", maxsize=settings.SEARCH_RESULT_CACHE_MAX_ENTRIES, ttl=settings.SEARCH_RESULT_CACHE_TTL_SECONDS)
+# event_id -> generation, bumped on photo/event deletes so every worker stops serving cached results at once
+search_generation = GenerationCounter("search", ttl=2 * settings.SEARCH_RESULT_CACHE_TTL_SECONDS)
+# event_id -> its current identity clusters (centroid matrix + photo lists)
+cluster_cache = TTLCache(maxsize=256, ttl=settings.CLUSTER_CACHE_TTL_SECONDS)
+
+# Search for top matches (get more than needed to filter by event_id)
+# 1.0 is a reasonable squared L2 distance threshold for FaceNet
+MAX_DISTANCE = 0.8
+K_SEARCH = 100
+
 def preprocess_image(image_array: np.ndarray) -> np.ndarray:
     """
     Placeholder for preprocessing function.
@@ -91,19 +116,171 @@ def get_public_url(file_path: str) -> str:
     # Extract the part starting from 'uploads'
     if "uploads/" in file_path:
         relative_path = file_path.split("uploads/")[1]
-        return f"{settings.BASE_URL}/uploads/{relative_path}"
+        return f"{settings.MEDIA_BASE_URL or settings.BASE_URL}/uploads/{relative_path}"
     
     return file_path
 
-@router.post("/")
-async def search_by_selfie(
-    event_id: str,
-    selfie: UploadFile = File(...)
-):
+def compute_selfie_embedding(contents: bytes) -> np.ndarray:
     """
-    Upload a selfie to search for matching photos in a specific event.
-    - event_id: ID of the event to search within.
-    - selfie: The user's selfie image.
+    Run the selfie pipeline: decode -> detect -> crop -> quality check -> encode.
+    Raises HTTPException (400) when the selfie is unusable.
+    """
+    # 3. Step 2: Convert bytes to NumPy array
+    with stage_timer("decode"):
+        image_array = load_image_from_bytes(contents)
+    
+    if image_array is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to process image. It might be corrupt or an unsupported format."
+        )
+
+    # 4. Step 3: Face Detection
+    face_data = detect_face(image_array)
+    
+    # 5. Step 4: Crop Face
+    face_crop = crop_face(image_array, face_data['box'])
+    
+    # 6. Quality Check
+    with stage_timer("quality"):
+        quality_result = quality_checker.check_face(face_crop)
+    
+    if not quality_result['is_valid']:
+        issues_str = ", ".join(quality_result['issues'])
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Selfie quality too low: {issues_str}. Please take a clearer photo."
+        )
+
+    # 6. Face Encoding (Generate 512-dim embedding)
+    # encode_faces expects a list of detection results
+    encoded_faces = face_encoder.encode_faces([face_data])
+    embedding = encoded_faces[0].get('embedding')
+    
+    if embedding is None:
+         raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate face embedding."
+        )
+
+    return embedding
+
+async def load_event_clusters(event_id: str):
+    """
+    Current identity clusters of an event, or None if it was never clustered.
+    Returns a dict with 'centroids' (K x 512 float32), 'photos' (per-cluster
+    member lists), 'faces_version' (of the event when clustered) and
+    'model_version' of the embeddings they were built from.
+    """
+    clusters = cluster_cache.get(event_id)
+    if clusters is not None:
+        return clusters or None
+
+    with stage_timer("mongo_clusters_lookup"):
+        docs = await db.db.face_clusters.find(
+            {"event_id": event_id},
+            {"generation": 1, "centroid": 1, "photos": 1, "faces_version": 1, "model_version": 1}
+        ).sort("generation", -1).to_list(length=None)
+
+    clusters = {}
+    if docs:
+        # A re-clustering run may be mid-swap; only use the newest generation
+        docs = [doc for doc in docs if doc["generation"] == docs[0]["generation"]]
+        clusters = {
+            "centroids": np.stack([np.frombuffer(doc["centroid"], dtype=np.float32) for doc in docs]),
+            "photos": [doc["photos"] for doc in docs],
+            "faces_version": docs[0].get("faces_version"),
+            "model_version": docs[0].get("model_version")
+        }
+    cluster_cache.set(event_id, clusters)
+    return clusters or None
+
+async def match_clusters(embedding: np.ndarray, event_id: str):
+    """
+    Match the selfie against the event's identity centroids.
+    Only the nearest cluster's photos are returned, and only when it is
+    clearly nearer than the runner-up (CLUSTER_MATCH_MARGIN).
+    Returns {photo_id: {distance, confidence}}, or None when the clusters
+    can't answer (event not clustered yet, faces changed since, or the
+    nearest two centroids are too close to tell apart).
+    """
+    clusters = await load_event_clusters(event_id)
+    if clusters is None or (clusters["model_version"] or settings.EMBEDDING_MODEL_VERSION) != faiss_service.model_version:
+        # Not clustered yet, or clustered before a model cutover
+        return None
+
+    with stage_timer("mongo_event_lookup"):
+        # Bumped by every ingest and delete of the event's faces (jobs.tasks.bump_faces_version)
+        event = await db.db.events.find_one({"_id": ObjectId(event_id)}, {"faces_version": 1}) if ObjectId.is_valid(event_id) else None
+    if event is None or event.get("faces_version", 0) != clusters["faces_version"]:
+        return None
+
+    with stage_timer("cluster_match"):
+        best_cluster, distance, ambiguous = nearest_cluster(clusters["centroids"], embedding, settings.CLUSTER_MATCH_MARGIN)
+    if distance > settings.CLUSTER_MATCH_DISTANCE:
+        return {}
+    if ambiguous:
+        return None
+
+    best_by_photo = {}
+    for member in clusters["photos"][best_cluster]:
+        best_by_photo[member["photo_id"]] = {"distance": distance, "confidence": float(member.get("confidence", 0))}
+    return best_by_photo
+
+async def match_index(embedding: np.ndarray, event_id: str) -> dict:
+    """
+    Match the selfie against the global FAISS index, scoped to the event via faces.
+    Returns {photo_id: {distance, confidence}}.
+    """
+    distances, indices = faiss_service.search(embedding.tolist(), k=K_SEARCH)
+    
+    # Filter by distance threshold
+    valid_results = [
+        (idx, dist) for idx, dist in zip(indices, distances) 
+        if idx != -1 and dist <= MAX_DISTANCE
+    ]
+    if not valid_results:
+        return {}
+
+    # 8. Query MongoDB to filter by event_id and get metadata
+    matched_faiss_ids = [r[0] for r in valid_results]
+    id_to_distance = {r[0]: r[1] for r in valid_results}
+    
+    # Find records matching these FAISS IDs correctly scoped to the event_id.
+    # Projection stays within the event_faiss_lookup index (covered query).
+    cursor = db.db.faces.find(
+        {
+            "image_embedded_number": {"$in": matched_faiss_ids},
+            "event_id": event_id
+        },
+        {"_id": 0, "image_embedded_number": 1, "photo_id": 1, "confidence": 1}
+    )
+    
+    with stage_timer("mongo_faces_lookup"):
+        face_records = await cursor.to_list(length=K_SEARCH)
+    
+    # 9. Group by photo to avoid duplicates if multiple people were matched in the same photo
+    # (Though with a single query selfie, we just want photos containing THIS person)
+    best_by_photo = {}
+    
+    for record in face_records:
+        photo_id = record.get('photo_id')
+        if photo_id is None:
+            continue
+        faiss_id = record['image_embedded_number']
+        distance = id_to_distance.get(faiss_id, float('inf'))
+        
+        # If photo already added, keep the one with better distance
+        if photo_id not in best_by_photo or distance < best_by_photo[photo_id]['distance']:
+            best_by_photo[photo_id] = {
+                "distance": float(distance),
+                "confidence": float(record.get('confidence', 0))
+            }
+    return best_by_photo
+
+async def run_selfie_search(event_id: str, selfie: UploadFile) -> dict:
+    """
+    Selfie search pipeline behind search_by_selfie.
     """
     # 1. Validate file exists and is an image
     if not selfie:
@@ -122,105 +299,87 @@ async def search_by_selfie(
         # 2. Read file bytes
         contents = await selfie.read()
         
-        # 3. Step 2: Convert bytes to NumPy array
-        image_array = load_image_from_bytes(contents)
-        
-        if image_array is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to process image. It might be corrupt or an unsupported format."
-            )
-
-        # 4. Step 3: Face Detection
-        face_data = detect_face(image_array)
-        
-        # 5. Step 4: Crop Face
-        face_crop = crop_face(image_array, face_data['box'])
-        
-        # 6. Quality Check
-        quality_result = quality_checker.check_face(face_crop)
-        
-        if not quality_result['is_valid']:
-            issues_str = ", ".join(quality_result['issues'])
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Selfie quality too low: {issues_str}. Please take a clearer photo."
-            )
-
-        # 6. Face Encoding (Generate 512-dim embedding)
-        # encode_faces expects a list of detection results
-        encoded_faces = face_encoder.encode_faces([face_data])
-        embedding = encoded_faces[0].get('embedding')
-        
-        if embedding is None:
-             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate face embedding."
-            )
-
-        # 7. Perform Search in FAISS
-        # Reload index to get latest data
+        # Reload index to get latest data (no-op when the file is unchanged);
+        # the selfie must be embedded by the model that built the serving index
         faiss_service.reload_index()
+        face_encoder.load(faiss_service.model_version)
+
+        # 3-6. Embedding, reused across retries of the same selfie
+        selfie_hash = f"{face_encoder.model_version}:{hashlib.sha256(contents).hexdigest()}"
+        verdict = await selfie_cache.aget(selfie_hash)
+        if verdict is None:
+            try:
+                embedding = compute_selfie_embedding(contents)
+                verdict = {"embedding": embedding.tolist(), "error": None}
+            except HTTPException as e:
+                if e.status_code != status.HTTP_400_BAD_REQUEST:
+                    raise
+                # Cache the rejection too so a resubmitted bad selfie fails fast
+                verdict = {"embedding": None, "error": e.detail}
+            await selfie_cache.aset(selfie_hash, verdict)
+
+        if verdict["error"]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=verdict["error"])
+        embedding = np.asarray(verdict["embedding"], dtype=np.float32)
+
+        # 7. Perform Search
+        embedding_digest = hashlib.sha1(embedding.tobytes()).hexdigest()
+        generation = await search_generation.aget(event_id)
+        # Without a readable generation a cached result could predate a delete; skip the cache
+        result_key = f"{event_id}:{generation}:{embedding_digest}:{faiss_service.index_version}" if generation is not None else None
+        cached_response = await search_result_cache.aget(result_key) if result_key else None
+        if cached_response is not None:
+            return cached_response
         
-        # Search for top matches (get more than needed to filter by event_id)
-        # 1.0 is a reasonable squared L2 distance threshold for FaceNet
-        MAX_DISTANCE = 0.8 
-        K_SEARCH = 100
-        
-        distances, indices = faiss_service.search(embedding.tolist(), k=K_SEARCH)
-        
-        # Filter by distance threshold
-        valid_results = [
-            (idx, dist) for idx, dist in zip(indices, distances) 
-            if idx != -1 and dist <= MAX_DISTANCE
-        ]
-        
-        if not valid_results:
-            return {
+        # A clustered event answers from its identity centroids; otherwise scan the index
+        best_by_photo = await match_clusters(embedding, event_id) if settings.CLUSTERING_ENABLED else None
+        matched_via = "clusters"
+        if best_by_photo is None:
+            best_by_photo = await match_index(embedding, event_id)
+            matched_via = "index"
+
+        if not best_by_photo:
+            response = {
                 "status": "success",
                 "message": "No matches found in the system.",
                 "results": []
             }
+            if result_key:
+                await search_result_cache.aset(result_key, response)
+            return response
 
-        # 8. Query MongoDB to filter by event_id and get metadata
-        matched_faiss_ids = [r[0] for r in valid_results]
-        id_to_distance = {r[0]: r[1] for r in valid_results}
-        
-        # Find records matching these FAISS IDs correctly scoped to the event_id
-        cursor = db.db.faces.find({
-            "image_embedded_number": {"$in": matched_faiss_ids},
-            "event_id": event_id
-        })
-        
-        face_records = await cursor.to_list(length=K_SEARCH)
-        
-        # 9. Format Results
-        # Group by file_path to avoid duplicates if multiple people were matched in the same photo
-        # (Though with a single query selfie, we just want photos containing THIS person)
+        photos_cursor = db.db.photos.find(
+            {"_id": {"$in": list(best_by_photo.keys())}},
+            {"file_path": 1, "variants": 1}
+        )
+        with stage_timer("mongo_photos_lookup"):
+            photos = await photos_cursor.to_list(length=None)
         unique_photos = {}
-        
-        for record in face_records:
-            path = record['file_path']
-            faiss_id = record['image_embedded_number']
-            distance = id_to_distance.get(faiss_id, float('inf'))
-            
-            # If photo already added, keep the one with better distance
-            if path not in unique_photos or distance < unique_photos[path]['distance']:
-                unique_photos[path] = {
-                    "photo_url": get_public_url(path),
-                    "distance": float(distance),
-                    "confidence": float(record.get('confidence', 0))
-                }
+        for photo in photos:
+            photo_url = get_public_url(photo['file_path'])
+            variants = photo.get('variants') or {}
+            unique_photos[photo['_id']] = {
+                "photo_id": str(photo['_id']),
+                "photo_url": photo_url,
+                # Photos ingested before derivatives existed fall back to the original
+                "thumbnail_url": get_public_url(variants['thumb']['path']) if 'thumb' in variants else photo_url,
+                "preview_url": get_public_url(variants['preview']['path']) if 'preview' in variants else photo_url,
+                **best_by_photo[photo['_id']]
+            }
         
         # Sort by distance (ascending)
         sorted_results = sorted(unique_photos.values(), key=lambda x: x['distance'])
 
-        return {
+        response = {
             "status": "success",
             "message": f"Found {len(sorted_results)} matching photos",
             "event_id": event_id,
+            "matched_via": matched_via,
             "results": sorted_results
         }
+        if result_key:
+            await search_result_cache.aset(result_key, response)
+        return response
 
     except HTTPException as e:
         raise e
@@ -230,3 +389,62 @@ async def search_by_selfie(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
+
+@router.post("/")
+async def search_by_selfie(
+    event_id: str,
+    response: Response,
+    selfie: UploadFile = File(...),
+    x_profile: Optional[str] = Header(None)
+):
+    """
+    Upload a selfie to search for matching photos in a specific event.
+    - event_id: ID of the event to search within.
+    - selfie: The user's selfie image.
+    - X-Profile header (PROFILING_TOKEN): capture a CPU + torch profile of this request.
+    """
+    if not profiling_requested(x_profile):
+        return await run_selfie_search(event_id, selfie)
+
+    with profile_session(f"search-{event_id}", kind="search") as session:
+        result = await run_selfie_search(event_id, selfie)
+    if session is not None:
+        response.headers["X-Profile-Id"] = session.profile_id
+    return result
+
+@router.post("/download")
+async def download_photos(request: PhotoDownloadRequest):
+    """
+    Download matched photos as one ZIP, in the order given.
+    The archive is streamed straight from disk (store-only, no buffering), so
+    one request replaces a full-size request per photo.
+    - event_id: Event the photos belong to.
+    - photo_ids: photo_id values from a search response (up to DOWNLOAD_MAX_PHOTOS).
+    """
+    if len(request.photo_ids) > settings.DOWNLOAD_MAX_PHOTOS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.DOWNLOAD_MAX_PHOTOS} photos per download")
+    try:
+        photo_ids = list(dict.fromkeys(ObjectId(photo_id) for photo_id in request.photo_ids))
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid photo id")
+
+    # Scoped to the event, so ids from another event's results are ignored
+    photos = await db.db.photos.find(
+        {"_id": {"$in": photo_ids}, "event_id": request.event_id}, {"file_path": 1}
+    ).to_list(length=None)
+    paths_by_id = {photo["_id"]: photo["file_path"] for photo in photos if photo.get("file_path")}
+    paths = [paths_by_id[photo_id] for photo_id in photo_ids if photo_id in paths_by_id]
+    if not paths:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No matching photos found")
+
+    safe_event_id = "".join(c for c in request.event_id if c.isalnum() or c in "-_")
+    # Sync generator: Starlette pulls it chunk by chunk on the threadpool as the client reads
+    return StreamingResponse(
+        stream_zip(zip(archive_names(paths), paths)),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="photos-{safe_event_id}.zip"',
+            "Cache-Control": "no-store",
+        }
+    )
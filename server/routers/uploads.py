@@ -1,33 +1,86 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status, BackgroundTasks
-from fastapi.responses import JSONResponse
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status, BackgroundTasks, Request, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import os
 import uuid
-from typing import List
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 from auth.dependencies import get_current_photographer
 from models.user import UserResponse
-from celery.result import AsyncResult
+from jobs.status import get_job_status
+from services.progress_stream import progress_broadcaster
+from services.profiling import profiling_requested
+from services.upload_writer import save_uploads
+from services import resumable_upload
+from services.resumable_upload import UploadSessionError
+from models.upload import UploadSessionCreate
+from config.settings import settings
 
 router = APIRouter(prefix="/uploads", tags=["Uploads"])
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+def _ingest_policy(event_doc) -> Optional[dict]:
+    return event_doc.ingest_policy.model_dump() if event_doc and event_doc.ingest_policy else None
+
+def _start_processing(file_paths: List[str], event_id: str, current_user: dict, event_doc, background_tasks: BackgroundTasks, profile: bool = False) -> (str, str):
+    """
+    Enqueue processing for saved files.
+    Default to Celery for scalability, fallback to local BackgroundTasks if Redis is down (Dev mode).
+    profile: Profile the ingest task(s) (X-Profile header).
+    Returns (task_id, message).
+    """
+    from jobs.tasks import dispatch_batch_upload, process_batch_upload_logic, cluster_event_faces_logic
+    from redis import Redis
+
+    task_args = (file_paths, event_id, str(current_user["_id"]), current_user["name"], _ingest_policy(event_doc))
+
+    task_id = str(uuid.uuid4())
+    use_celery = False
+
+    # Quick check if Redis is available to avoid Celery's long retry loop
+    try:
+        r = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
+        if r.ping():
+            use_celery = True
+            r.close()
+    except Exception:
+        use_celery = False
+
+    if use_celery:
+        try:
+            # Try to start Celery task(s); large batches fan out into parallel chunks
+            task_id = dispatch_batch_upload(*task_args, profile=profile)
+            return task_id, f"Batch processing started (Celery Task: {task_id})"
+        except Exception as e:
+            # In case it fails despite ping
+            logger.warning(f"Celery task failed to start despite Redis ping. Falling back. Error: {e}")
+    else:
+        logger.info("Redis not reachable. Using BackgroundTasks fallback.")
+
+    background_tasks.add_task(process_batch_upload_logic, task_id, *task_args, profile=profile)
+    if settings.CLUSTERING_ENABLED:
+        # Background tasks run in order, so this sees the faces just indexed
+        background_tasks.add_task(cluster_event_faces_logic, task_id, event_id)
+    return task_id, f"Batch processing started (Background Task: {task_id})"
+
 @router.post("/", status_code=status.HTTP_202_ACCEPTED)
 async def upload_images(
     event_id: str,
     background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
-    current_user: UserResponse = Depends(get_current_photographer)
+    current_user: UserResponse = Depends(get_current_photographer),
+    x_profile: Optional[str] = Header(None)
 ):
     """
     Upload multiple images for processing.
     - Saves files to disk under uploads/{event_id}/
     - Triggers background task for batch processing.
+    - X-Profile header (PROFILING_TOKEN): profile the ingest; the task result carries profile_id.
     - Returns Task ID.
     """
     # Create photographer-specific and event-specific directory
@@ -39,69 +92,46 @@ async def upload_images(
     saved_file_paths = []
 
     try:
-        for file in files:
-            if not file.content_type.startswith("image/"):
-                continue 
-            
-            # Generate unique filename
-            file_ext = os.path.splitext(file.filename)[1]
-            filename = f"{uuid.uuid4()}{file_ext}"
-            file_path = os.path.join(event_dir, filename)
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            saved_file_paths.append(os.path.abspath(file_path))
+        # Stream files to disk off the event loop; type comes from magic bytes, not content_type
+        saved_uploads = await save_uploads(files, event_dir)
+
+        seen_hashes = set()
+        rejected_count = 0
+        duplicate_count = 0
+        for saved in saved_uploads:
+            if saved is None:
+                rejected_count += 1
+                continue
+            # Same photo selected twice in one upload: keep one copy
+            if saved.sha256 in seen_hashes:
+                os.remove(saved.path)
+                duplicate_count += 1
+                continue
+            seen_hashes.add(saved.sha256)
+            saved_file_paths.append(saved.path)
             
         if not saved_file_paths:
              raise HTTPException(400, "No valid images uploaded")
 
-        # Trigger Processing
-        # Default to Celery for scalability, fallback to local BackgroundTasks if Redis is down (Dev mode)
-        from jobs.tasks import process_batch_upload, process_batch_upload_logic
-        from redis import Redis
-        from config.settings import settings
-        
-        task_id = str(uuid.uuid4())
-        use_celery = False
-
-        # Quick check if Redis is available to avoid Celery's long retry loop
-        try:
-            r = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
-            if r.ping():
-                use_celery = True
-                r.close()
-        except Exception:
-            use_celery = False
-
-        if use_celery:
-            try:
-                # Try to start Celery task
-                celery_task = process_batch_upload.delay(saved_file_paths, event_id, str(current_user["_id"]), current_user["name"])
-                task_id = celery_task.id
-                message = f"Batch processing started (Celery Task: {task_id})"
-            except Exception as e:
-                # In case it fails despite ping
-                logger.warning(f"Celery task failed to start despite Redis ping. Falling back. Error: {e}")
-                background_tasks.add_task(process_batch_upload_logic, task_id, saved_file_paths, event_id, str(current_user["_id"]), current_user["name"])
-                message = f"Batch processing started (Background Task: {task_id})"
-        else:
-            logger.info("Redis not reachable. Using BackgroundTasks fallback.")
-            background_tasks.add_task(process_batch_upload_logic, task_id, saved_file_paths, event_id, str(current_user["_id"]), current_user["name"])
-            message = f"Batch processing started (Background Task: {task_id})"
-        
         from services.event_service import get_event_by_id, generate_share_link
         event_doc = await get_event_by_id(event_id)
-        share_link = await generate_share_link(event_doc, str(current_user["_id"])) if event_doc else f"http://localhost:3000/event/{photographer_slug}/{event_id}"
+
+        task_id, message = _start_processing(saved_file_paths, event_id, current_user, event_doc, background_tasks,
+                                             profile=profiling_requested(x_profile))
+        
+        share_link = await generate_share_link(event_doc, str(current_user["_id"]), current_user["name"]) if event_doc else f"http://localhost:3000/event/{photographer_slug}/{event_id}"
 
         return {
             "message": message,
             "task_id": task_id,
             "files_saved": len(saved_file_paths),
+            "files_rejected": rejected_count,
+            "duplicates_skipped": duplicate_count,
             "share_link": share_link
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         raise HTTPException(500, detail=f"Failed to upload images: {str(e)}")
@@ -110,16 +140,154 @@ async def upload_images(
 async def get_task_status(task_id: str, current_user: UserResponse = Depends(get_current_photographer)):
     """
     Check the status of a background processing task.
+    Fanned-out uploads report a combined status across their chunk tasks.
     """
-    task_result = AsyncResult(task_id)
+    return await asyncio.to_thread(get_job_status, task_id)
 
-    response = {
-        "task_id": task_id,
-        "status": task_result.status,
-        "result": task_result.result if task_result.ready() else None
-    }
-    
-    if task_result.failed():
-        response["error"] = str(task_result.result)
-        
-    return response
+@router.get("/status/{task_id}/stream")
+async def stream_task_status(task_id: str, current_user: UserResponse = Depends(get_current_photographer)):
+    """
+    Server-sent events stream of task progress ('progress' events, then one 'done').
+    All clients watching the same task share a single backend poll loop.
+    """
+    return StreamingResponse(
+        progress_broadcaster.event_stream(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Resumable (tus-style) uploads: one session per file, appended with PATCH at an
+# explicit Upload-Offset. Completed files are batched per event for a few seconds
+# (or until POST /sessions/finalize), so ingest starts while the rest of the memory
+# card is still uploading without paying one ingest task per file.
+
+@router.post("/sessions", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    session: UploadSessionCreate,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Start a resumable upload for one file. Returns the upload_id to PATCH chunks to.
+    """
+    try:
+        meta = resumable_upload.create_session(
+            session.event_id, str(current_user["_id"]), current_user["name"],
+            session.filename, session.size, session.sha256
+        )
+    except UploadSessionError as e:
+        raise HTTPException(e.status_code, detail=e.detail)
+
+    return {"upload_id": meta["upload_id"], "offset": 0, "size": meta["size"], "expires_at": meta["expires_at"]}
+
+@router.api_route("/sessions/{upload_id}", methods=["GET", "HEAD"])
+async def get_upload_session(
+    upload_id: str,
+    response: Response,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Current offset of a resumable upload; clients resume from here after a dropped connection.
+    """
+    try:
+        meta = resumable_upload.get_session(upload_id, str(current_user["_id"]))
+    except UploadSessionError as e:
+        raise HTTPException(e.status_code, detail=e.detail)
+
+    response.headers["Upload-Offset"] = str(meta["offset"])
+    response.headers["Upload-Length"] = str(meta["size"])
+    response.headers["Cache-Control"] = "no-store"
+    completed = meta.get("completed")
+    result = {"upload_id": upload_id, "offset": meta["offset"], "size": meta["size"], "completed": completed is not None}
+    if completed:
+        result.update({"task_id": completed["task_id"], "message": completed["message"]})
+    return result
+
+@router.patch("/sessions/{upload_id}")
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Append the raw request body at Upload-Offset. The body is streamed to disk,
+    never buffered. When the last byte arrives the file is verified, moved into
+    the event directory and queued for ingest together with the event's other
+    files completing within RESUMABLE_INGEST_DELAY_SECONDS.
+    Retrying the final PATCH returns the same completed result.
+    """
+    user_id = str(current_user["_id"])
+    try:
+        meta = resumable_upload.get_session(upload_id, user_id)
+        offset = await resumable_upload.append_chunk(meta, upload_offset, request.stream())
+
+        result = {"upload_id": upload_id, "offset": offset, "size": meta["size"], "completed": False}
+        if offset < meta["size"]:
+            return JSONResponse(result, headers={"Upload-Offset": str(offset)})
+
+        from services.event_service import slugify, get_event_by_id
+        event_dir = os.path.join(UPLOAD_DIR, slugify(current_user["name"]), meta["event_id"])
+        completed, finalized_now = await asyncio.to_thread(resumable_upload.finalize_session, meta, event_dir)
+    except UploadSessionError as e:
+        raise HTTPException(e.status_code, detail=e.detail)
+
+    if not finalized_now:
+        result.update({"completed": True, "task_id": completed["task_id"], "message": completed["message"]})
+        return JSONResponse(result, headers={"Upload-Offset": str(offset)})
+
+    file_path = completed["file_path"]
+    event_doc = await get_event_by_id(meta["event_id"])
+    try:
+        from jobs.scheduling import queue_pending_file
+        await asyncio.to_thread(queue_pending_file, file_path, meta["event_id"], user_id,
+                                current_user["name"], _ingest_policy(event_doc))
+        task_id, message = None, "Queued for ingest with the event's other completed uploads"
+    except Exception as e:
+        # No Redis/broker (dev mode): ingest this file on its own
+        logger.warning(f"Could not batch resumable upload {upload_id}, ingesting it alone: {e}")
+        task_id, message = _start_processing([file_path], meta["event_id"], current_user, event_doc, background_tasks)
+
+    await asyncio.to_thread(resumable_upload.record_completion, upload_id, task_id, message)
+    result.update({"completed": True, "task_id": task_id, "message": message})
+    return JSONResponse(result, headers={"Upload-Offset": str(offset)})
+
+@router.post("/sessions/finalize")
+async def finalize_upload_sessions(
+    event_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Ingest the event's completed resumable uploads now instead of after the
+    batching delay. Call once the last file is uploaded; returns the task id to poll.
+    """
+    from jobs.scheduling import take_pending_files
+    try:
+        file_paths = await asyncio.to_thread(take_pending_files, event_id, str(current_user["_id"]))
+    except Exception as e:
+        # Without Redis every completed file was already ingested on its own
+        logger.warning(f"Pending uploads unavailable for event {event_id}: {e}")
+        file_paths = []
+
+    if not file_paths:
+        return {"files": 0, "task_id": None, "message": "No completed uploads waiting for ingest"}
+
+    from services.event_service import get_event_by_id
+    event_doc = await get_event_by_id(event_id)
+    task_id, message = _start_processing(file_paths, event_id, current_user, event_doc, background_tasks)
+    return {"files": len(file_paths), "task_id": task_id, "message": message}
+
+@router.delete("/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(
+    upload_id: str,
+    current_user: UserResponse = Depends(get_current_photographer)
+):
+    """
+    Abandon a resumable upload and discard the received bytes.
+    """
+    try:
+        resumable_upload.get_session(upload_id, str(current_user["_id"]))
+    except UploadSessionError as e:
+        raise HTTPException(e.status_code, detail=e.detail)
+    resumable_upload.delete_session(upload_id)
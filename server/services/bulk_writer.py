@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional
+
+from config.settings import settings
+from services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class BulkWriter:
+    """
+    Persists documents to MongoDB from a background thread.
+    Callers buffer documents per collection with add(); full batches are written
+    with unordered insert_many while the caller keeps working. close() flushes,
+    waits for the writer and returns the counters.
+    """
+
+    def __init__(self, database, batch_size: Optional[int] = None, max_pending_batches: Optional[int] = None, label: str = ""):
+        """
+        Args:
+            database: pymongo Database (use config.database.get_sync_db()).
+            batch_size: Documents per insert_many (default MONGO_BULK_BATCH_SIZE).
+            max_pending_batches: Bound on queued batches so memory stays flat (default MONGO_WRITER_MAX_PENDING_BATCHES).
+            label: Prefix for log lines (e.g. task id).
+        """
+        self.database = database
+        self.batch_size = batch_size or settings.MONGO_BULK_BATCH_SIZE
+        self.label = label
+        self.buffers: Dict[str, List[dict]] = {}
+        self.inserted: Dict[str, int] = {}
+        self.write_errors = 0
+        self.fatal_error: Optional[Exception] = None
+
+        self._queue = queue.Queue(maxsize=max_pending_batches or settings.MONGO_WRITER_MAX_PENDING_BATCHES)
+        self._thread = threading.Thread(target=self._run, name=f"bulk-writer-{label}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        from pymongo.errors import BulkWriteError
+
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            collection, docs = item
+            if self.fatal_error is not None:
+                continue
+            try:
+                with stage_timer("mongo_bulk_insert"):
+                    result = self.database[collection].insert_many(docs, ordered=False)
+                self.inserted[collection] = self.inserted.get(collection, 0) + len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Unordered: everything except the failed documents was written
+                details = e.details or {}
+                self.inserted[collection] = self.inserted.get(collection, 0) + details.get("nInserted", 0)
+                self.write_errors += len(details.get("writeErrors", []))
+                logger.warning(f"[{self.label}] {len(details.get('writeErrors', []))} write errors in {collection} batch")
+            except Exception as e:
+                logger.error(f"[{self.label}] Bulk write to {collection} failed: {e}")
+                self.fatal_error = e
+
+    def add(self, collection: str, docs: List[dict]):
+        """Buffer documents; full batches are handed to the writer thread."""
+        if self.fatal_error is not None:
+            raise self.fatal_error
+
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.extend(docs)
+        while len(buffer) >= self.batch_size:
+            self._queue.put((collection, buffer[:self.batch_size]))
+            del buffer[:self.batch_size]
+
+    def flush(self):
+        """Hand every partially filled buffer to the writer thread."""
+        for collection, buffer in self.buffers.items():
+            if buffer:
+                self._queue.put((collection, list(buffer)))
+                buffer.clear()
+
+    def close(self) -> Dict:
+        """
+        Flush, wait for all pending writes and stop the thread.
+        Raises the first fatal error (e.g. lost connection) so the task can fail loudly.
+        """
+        if self._thread.is_alive():
+            self.flush()
+            self._queue.put(_STOP)
+            self._thread.join()
+
+        if self.fatal_error is not None:
+            raise self.fatal_error
+
+        return {"inserted": dict(self.inserted), "write_errors": self.write_errors}
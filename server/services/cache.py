@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry time-to-live.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        """
+        Args:
+            maxsize: Maximum number of entries; least recently used entries are evicted first.
+            ttl: Default time-to-live in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches the predicate. Returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class TieredCache:
+    """
+    TTLCache in front of an optional shared Redis tier.
+    Keys are strings and values must be JSON serializable. Redis errors are
+    logged and treated as misses so a Redis outage never fails a request.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 60.0, use_redis: Optional[bool] = None):
+        """
+        Args:
+            namespace: Redis key prefix (e.g. 'selfie').
+            maxsize: Local tier size.
+            ttl: Time-to-live in seconds for both tiers.
+            use_redis: Enable the Redis tier (default CACHE_REDIS_ENABLED).
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.use_redis = settings.CACHE_REDIS_ENABLED if use_redis is None else use_redis
+        self._redis = None
+
+    def _redis_client(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            from redis import Redis
+            self._redis = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return self._redis
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _redis_get(self, key: str, default: Any) -> Any:
+        client = self._redis_client()
+        if client is None:
+            return default
+        try:
+            pipe = client.pipeline()
+            pipe.get(self._redis_key(key))
+            pipe.pttl(self._redis_key(key))
+            raw, remaining_ms = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis cache read failed ({self.namespace}): {e}")
+            return default
+        if raw is None:
+            return default
+
+        value = json.loads(raw)
+        # Keep the writer's expiry (e.g. a short negative entry) rather than restarting the default TTL
+        self.local.set(key, value, remaining_ms / 1000 if remaining_ms and remaining_ms > 0 else self.ttl)
+        return value
+
+    def _redis_set(self, key: str, value: Any, ttl: float):
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.set(self._redis_key(key), json.dumps(value, default=str), ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.warning(f"Redis cache write failed ({self.namespace}): {e}")
+
+    def _redis_delete(self, key: str):
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.delete(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Redis cache delete failed ({self.namespace}): {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        return self._redis_get(key, default)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        self._redis_set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        self._redis_delete(key)
+
+    # Async variants for request handlers: local hits stay inline, the Redis
+    # round trip runs in a worker thread so it never blocks the event loop
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if not self.use_redis:
+            return default
+        return await asyncio.to_thread(self._redis_get, key, default)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        if self.use_redis:
+            await asyncio.to_thread(self._redis_set, key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.local.delete(key)
+        if self.use_redis:
+            await asyncio.to_thread(self._redis_delete, key)
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """
+        Drop every entry whose key starts with prefix, in both tiers.
+        The Redis tier is SCANned, so keep this for rare events like deletes.
+        """
+        removed = self.local.invalidate_where(lambda key: key.startswith(prefix))
+
+        client = self._redis_client()
+        if client is None:
+            return removed
+        try:
+            keys = list(client.scan_iter(match=f"{self._redis_key(prefix)}*", count=500))
+            if keys:
+                removed += client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Redis cache invalidation failed ({self.namespace}): {e}")
+        return removed
+
+class GenerationCounter:
+    """
+    Per-key generation numbers for cache keys that must change in every
+    process at once, e.g. an event's search results after a photo is deleted:
+    a local invalidate_prefix only reaches the worker that handled the delete.
+    Shared through Redis when the Redis cache tier is enabled, process-local otherwise.
+    """
+
+    def __init__(self, namespace: str, ttl: float, use_redis: Optional[bool] = None):
+        """
+        Args:
+            namespace: Redis key prefix.
+            ttl: Seconds a bumped generation is kept; must outlive the entries keyed by it.
+            use_redis: Share generations via Redis (default CACHE_REDIS_ENABLED).
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.use_redis = settings.CACHE_REDIS_ENABLED if use_redis is None else use_redis
+        self._local = {}
+        self._redis = None
+
+    def _redis_client(self):
+        if self._redis is None:
+            from redis import Redis
+            self._redis = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return self._redis
+
+    def _redis_key(self, key: str) -> str:
+        return f"generation:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[int]:
+        """Current generation, or None if it can't be read (callers then skip caching)."""
+        if not self.use_redis:
+            return self._local.get(key, 0)
+        try:
+            raw = self._redis_client().get(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Redis generation read failed ({self.namespace}): {e}")
+            return None
+        return int(raw) if raw is not None else 0
+
+    async def aget(self, key: str) -> Optional[int]:
+        """get() for async handlers; the Redis read runs in a worker thread."""
+        if not self.use_redis:
+            return self._local.get(key, 0)
+        return await asyncio.to_thread(self.get, key)
+
+    def bump(self, key: str):
+        """Move key to a new generation, orphaning every entry keyed by the old one."""
+        self._local[key] = self._local.get(key, 0) + 1
+        if not self.use_redis:
+            return
+        try:
+            pipe = self._redis_client().pipeline()
+            pipe.incr(self._redis_key(key))
+            pipe.expire(self._redis_key(key), max(1, int(self.ttl)))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis generation bump failed ({self.namespace}): {e}")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header matches etag, so a 304 can be sent."""
+    if not if_none_match:
+        return False
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,209 @@
+import numpy as np
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _connected_components(n: int, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    Label the connected components of an undirected graph given as edge arrays.
+    Min-label propagation with pointer jumping; converges in a few passes.
+
+    Returns:
+        np.ndarray: Component label per node, renumbered 0..k-1.
+    """
+    labels = np.arange(n)
+    while True:
+        previous = labels.copy()
+        # Pull the smaller label across every edge, in both directions
+        np.minimum.at(labels, rows, labels[cols])
+        np.minimum.at(labels, cols, labels[rows])
+        # Pointer jumping: follow labels to their own label until stable
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            break
+    return np.unique(labels, return_inverse=True)[1]
+
+def _distances_from(vectors: np.ndarray, sq_norms: np.ndarray, point: int) -> np.ndarray:
+    """Squared L2 distance from one vector to every vector of the set."""
+    distances = vectors @ vectors[point]
+    distances *= -2
+    distances += sq_norms
+    distances += sq_norms[point]
+    return np.maximum(distances, 0, out=distances)
+
+def _farthest_pair(vectors: np.ndarray, sq_norms: np.ndarray, batch_size: int) -> Tuple[int, int, float]:
+    """
+    Exact farthest pair of a set of vectors, from the same blocked GEMM as the
+    linking pass, so peak memory stays at N x batch_size.
+
+    Returns:
+        (first, second, squared L2 distance)
+    """
+    n = len(vectors)
+    best = (0, 0, 0.0)
+    for start in range(0, n, batch_size):
+        block = vectors[start:start + batch_size]
+        distances = vectors[start:] @ block.T
+        distances *= -2
+        distances += sq_norms[start:, None]
+        distances += sq_norms[None, start:start + len(block)]
+        later, row = np.unravel_index(np.argmax(distances), distances.shape)
+        if distances[later, row] > best[2]:
+            best = (int(row + start), int(later + start), float(distances[later, row]))
+    return best
+
+def _split_to_diameter(vectors: np.ndarray, members: np.ndarray, max_diameter: float,
+                       batch_size: int) -> List[np.ndarray]:
+    """
+    Bisect a component until no part has two faces further apart than
+    max_diameter. A chain of links through one bridging face puts two people
+    in the same component; two far-apart faces seed the split, so the cut
+    falls at the bridge.
+    Seeds come from a double sweep (the face farthest from any member, then
+    the face farthest from that one), which costs O(N) per part. Only parts
+    the sweep can't decide pay for the exact blocked farthest-pair search.
+
+    Returns:
+        List of member index arrays.
+    """
+    parts, pending = [], [members]
+    while pending:
+        members = pending.pop()
+        if len(members) < 2:
+            parts.append(members)
+            continue
+        part = vectors[members]
+        sq_norms = np.einsum("ij,ij->i", part, part)
+
+        first = int(np.argmax(_distances_from(part, sq_norms, 0)))
+        from_first = _distances_from(part, sq_norms, first)
+        second = int(np.argmax(from_first))
+        radius = from_first[second]
+        if radius <= max_diameter:
+            # Every face is within sqrt(radius) of the first seed, so no pair is
+            # further apart than 4 * radius (squared)
+            if 4 * radius <= max_diameter:
+                parts.append(members)
+                continue
+            first, second, diameter = _farthest_pair(part, sq_norms, batch_size)
+            if diameter <= max_diameter:
+                parts.append(members)
+                continue
+            from_first = _distances_from(part, sq_norms, first)
+
+        # Every other member goes with the nearer of the two seeds
+        nearer_second = _distances_from(part, sq_norms, second) < from_first
+        pending += [members[~nearer_second], members[nearer_second]]
+    return parts
+
+def cluster_embeddings(vectors: np.ndarray, link_distance: float, max_diameter: Optional[float] = None,
+                       batch_size: int = 2048) -> np.ndarray:
+    """
+    Group face embeddings into identities: faces closer than link_distance
+    (squared L2, same scale as search distances) are linked, and each
+    connected component of that graph is one person. Components wider than
+    max_diameter are split, so single-link chaining can't merge two people.
+
+    Args:
+        vectors: (N, D) float32 embeddings.
+        link_distance: Squared L2 threshold for linking two faces.
+        max_diameter: Squared L2 cap between any two faces of one cluster (None: no cap).
+        batch_size: Rows per distance block; peak memory is N x batch_size
+            distances, for the linking pass and the diameter splits alike.
+
+    Returns:
+        np.ndarray: Cluster label per vector, 0..k-1.
+    """
+    n = len(vectors)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    # Blocked |a|^2 + |b|^2 - 2ab over the upper triangle only; one GEMM per
+    # block is several times faster than a per-query range_search here
+    rows, cols = [], []
+    for start in range(0, n, batch_size):
+        block = vectors[start:start + batch_size]
+        distances = vectors[start:] @ block.T
+        distances *= -2
+        distances += sq_norms[start:, None]
+        distances += sq_norms[None, start:start + len(block)]
+        later, row = np.nonzero(distances <= link_distance)
+        rows.append(row + start)
+        cols.append(later + start)
+
+    labels = _connected_components(n, np.concatenate(rows), np.concatenate(cols))
+    if max_diameter is not None:
+        order = np.argsort(labels, kind="stable")
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        components = [members for component in np.split(order, boundaries)
+                      for members in _split_to_diameter(vectors, component, max_diameter, batch_size)]
+        labels = np.empty(n, dtype=np.int64)
+        for label, members in enumerate(components):
+            labels[members] = label
+
+    logger.info(f"Clustered {n} faces into {labels.max() + 1} identities")
+    return labels
+
+def summarize_clusters(labels: np.ndarray, vectors: np.ndarray, faces: List[Dict]) -> List[Dict]:
+    """
+    Build one summary per cluster: normalized centroid and member photos.
+
+    Args:
+        labels: Cluster label per face (from cluster_embeddings).
+        vectors: Embeddings aligned with labels.
+        faces: Face records aligned with labels (photo_id, confidence).
+
+    Returns:
+        List of dicts with 'centroid' (float32 array), 'size' and
+        'photos' ([{photo_id, confidence}], best confidence per photo).
+    """
+    clusters = []
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    for members in np.split(order, boundaries):
+        centroid = vectors[members].mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroid = centroid / norm
+
+        best_by_photo = {}
+        for i in members:
+            photo_id = faces[i]["photo_id"]
+            confidence = float(faces[i].get("confidence", 0))
+            if confidence > best_by_photo.get(photo_id, -1.0):
+                best_by_photo[photo_id] = confidence
+
+        clusters.append({
+            "centroid": centroid.astype(np.float32),
+            "size": int(len(members)),
+            "photos": [{"photo_id": photo_id, "confidence": confidence} for photo_id, confidence in best_by_photo.items()]
+        })
+    return clusters
+
+def nearest_cluster(centroids: np.ndarray, embedding: np.ndarray, margin: float) -> Tuple[int, float, bool]:
+    """
+    Nearest centroid to a query embedding.
+
+    Args:
+        centroids: (K, D) cluster centroids, K >= 1.
+        embedding: (D,) query embedding.
+        margin: Squared L2 gap the runner-up must trail by.
+
+    Returns:
+        (cluster index, squared L2 distance, ambiguous): ambiguous when the
+        runner-up is within margin of the nearest, i.e. the query sits
+        between two identities.
+    """
+    distances = ((centroids - embedding[None, :]) ** 2).sum(axis=1)
+    order = np.argsort(distances)
+    best = int(order[0])
+    ambiguous = len(order) > 1 and distances[order[1]] - distances[best] < margin
+    return best, float(distances[best]), bool(ambiguous)
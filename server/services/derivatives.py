@@ -0,0 +1,134 @@
+from PIL import Image, features
+import numpy as np
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "_derived"
+
+# name -> longest edge in px; generated largest first so each step downsizes the previous one
+VARIANTS = (
+    ("preview", lambda: settings.PREVIEW_MAX_PX),
+    ("thumb", lambda: settings.THUMBNAIL_MAX_PX),
+)
+
+def _output_format() -> Tuple[str, str]:
+    """(PIL format, extension) to encode with; AVIF needs a Pillow built with libavif."""
+    fmt = settings.DERIVATIVE_FORMAT.upper()
+    if fmt == "AVIF" and features.check("avif"):
+        return "AVIF", ".avif"
+    if fmt == "AVIF":
+        logger.warning("AVIF encoding not available in this Pillow build; using WebP")
+    return "WEBP", ".webp"
+
+def derivative_path(source_path: str, name: str, ext: str) -> str:
+    """uploads/<photographer>/<event>/_derived/<stem>_<name><ext>"""
+    directory, filename = os.path.split(source_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, DERIVED_DIR, f"{stem}_{name}{ext}")
+
+@timed("derivatives")
+def generate_derivatives(image: np.ndarray, source_path: str) -> Dict[str, Dict]:
+    """
+    Encode thumbnail and preview variants of an already decoded image.
+
+    Args:
+        image: RGB image array as produced by ImageLoader (EXIF-rotated).
+        source_path: Path of the original; variants are written next to it under _derived/.
+
+    Returns:
+        Dict of variant name -> {path, width, height, bytes}.
+    """
+    fmt, ext = _output_format()
+    os.makedirs(os.path.join(os.path.dirname(source_path), DERIVED_DIR), exist_ok=True)
+
+    # WebP method 4 is the default speed/size trade-off; 6 is ~2x slower for a few % smaller
+    save_options = {"quality": settings.DERIVATIVE_QUALITY}
+    if fmt == "WEBP":
+        save_options["method"] = 4
+
+    current = Image.fromarray(image)
+    variants = {}
+    for name, max_px in VARIANTS:
+        limit = max_px()
+        if max(current.size) > limit:
+            scale = limit / max(current.size)
+            current = current.resize(
+                (max(1, round(current.width * scale)), max(1, round(current.height * scale))),
+                Image.Resampling.LANCZOS
+            )
+
+        path = derivative_path(source_path, name, ext)
+        tmp_path = f"{path}.part"
+        current.save(tmp_path, format=fmt, **save_options)
+        os.replace(tmp_path, path)
+
+        variants[name] = {
+            "path": os.path.abspath(path),
+            "width": current.width,
+            "height": current.height,
+            "bytes": os.path.getsize(path)
+        }
+    return variants
+
+def variant_paths(photo: Dict) -> List[str]:
+    """Every file belonging to a photo document: the original plus its variants."""
+    paths = [photo["file_path"]] if photo.get("file_path") else []
+    paths += [variant["path"] for variant in (photo.get("variants") or {}).values() if variant.get("path")]
+    return paths
+
+class DerivativePipeline:
+    """
+    Encodes derivatives on a small thread pool (Pillow releases the GIL while
+    encoding) so it overlaps face detection. At most max_pending images are
+    held in memory; submit() blocks on the oldest job beyond that.
+    Results come back in submission order with the caller's payload.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        self.enabled = settings.DERIVATIVES_ENABLED
+        self.max_pending = max_pending or settings.DERIVATIVE_MAX_PENDING
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or settings.DERIVATIVE_WORKERS,
+                                            thread_name_prefix="derivatives") if self.enabled else None
+        self._pending: "deque[Tuple[object, Optional[Future]]]" = deque()
+
+    def submit(self, image: np.ndarray, source_path: str, payload) -> List[Tuple[object, Dict]]:
+        """
+        Queue variants for one image. Returns the (payload, variants) pairs that
+        finished and had to be collected to stay under max_pending.
+        """
+        future = self._executor.submit(generate_derivatives, image, source_path) if self.enabled else None
+        self._pending.append((payload, future))
+        done = []
+        while len(self._pending) > self.max_pending:
+            done.append(self._collect_oldest())
+        return done
+
+    def drain(self) -> List[Tuple[object, Dict]]:
+        """Wait for every queued image; returns the remaining (payload, variants) pairs."""
+        done = []
+        while self._pending:
+            done.append(self._collect_oldest())
+        return done
+
+    def _collect_oldest(self) -> Tuple[object, Dict]:
+        payload, future = self._pending.popleft()
+        if future is None:
+            return payload, {}
+        try:
+            return payload, future.result()
+        except Exception as e:
+            # A missing thumbnail must never fail ingest; clients fall back to the original
+            logger.warning(f"Derivative generation failed: {e}")
+            return payload, {}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -1,7 +1,13 @@
 from models.event import EventCreate, EventInDB
 from config.database import db
 from config.settings import settings
+from services.cache import TTLCache
+import base64
+import json
 import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
 from pymongo import ReturnDocument
 
 logger = logging.getLogger(__name__)
@@ -68,26 +74,188 @@ async def get_event_by_id(event_hex_id: str, photographer_slug: str = None):
         logger.error(f"Error retrieving event by ID {event_hex_id}: {e}")
         return None
 
-async def generate_share_link(event_doc: EventInDB, user_id: str) -> str:
+# user id -> photographer slug; share links are built without a users lookup per event
+photographer_slug_cache = TTLCache(maxsize=4096, ttl=settings.PHOTOGRAPHER_SLUG_CACHE_TTL_SECONDS)
+
+async def get_photographer_slugs(user_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Resolve photographer slugs for many users with at most one users query.
+    Unknown users are left out (callers fall back to "photographer").
+    """
+    slugs = {}
+    missing = []
+    for user_id in set(user_ids):
+        slug = photographer_slug_cache.get(user_id)
+        if slug is None:
+            missing.append(user_id)
+        else:
+            slugs[user_id] = slug
+
+    object_ids = [ObjectId(user_id) for user_id in missing if ObjectId.is_valid(user_id)]
+    if object_ids:
+        async for user in db.db.users.find({"_id": {"$in": object_ids}}, {"name": 1}):
+            slug = slugify(user["name"])
+            photographer_slug_cache.set(str(user["_id"]), slug)
+            slugs[str(user["_id"])] = slug
+    return slugs
+
+def build_share_link(event_hex_id: str, photographer_slug: str) -> str:
+    """Format: {BASE_URL}/event/{photographer_slug}/{event_hex_id}"""
+    return f"{settings.BASE_URL}/event/{photographer_slug}/{event_hex_id}"
+
+async def generate_share_link(event_doc: EventInDB, user_id: str, photographer_name: str = None) -> str:
     """
     Generate a shareable link using photographer name slug and event hex ID.
     Format: /event/{photographer_slug}/{event_hex_id}
+    photographer_name: Pass it when known (e.g. the current user) to skip the lookup.
     """
-    from bson import ObjectId
-    user = await db.db.users.find_one({"_id": ObjectId(user_id)})
-    photographer_slug = slugify(user["name"]) if user else "photographer"
-    
+    if photographer_name:
+        photographer_slug = slugify(photographer_name)
+    else:
+        photographer_slug = (await get_photographer_slugs([user_id])).get(user_id, "photographer")
+
     # We use the document's MongoDB ID as the unique event identifier
-    return f"{settings.BASE_URL}/event/{photographer_slug}/{str(event_doc.id)}"
+    return build_share_link(str(event_doc.id), photographer_slug)
 
-async def get_events_by_photographer(user_id: str):
+def _encode_cursor(event: dict) -> str:
+    payload = json.dumps({"t": event["created_at"].isoformat(), "id": str(event["_id"])})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for malformed cursors."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def get_events_by_photographer(user_id: str, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[EventInDB], Optional[str]]:
     """
-    Retrieve all events created by a specific photographer.
+    Retrieve a page of the events created by a photographer, newest first.
+
+    Args:
+        user_id: Photographer's user id.
+        limit: Page size.
+        cursor: Opaque cursor from the previous page (None for the first page).
+
+    Returns:
+        (events, next_cursor); next_cursor is None on the last page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
     """
+    query = {"created_by": user_id}
+    if cursor:
+        created_at, last_id = _decode_cursor(cursor)
+        # Keyset pagination on (created_at, _id): stable while events are added
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+
     try:
-        cursor = db.db.events.find({"created_by": user_id}).sort("created_at", -1)
-        events_list = await cursor.to_list(length=100)
-        return [EventInDB(**event) for event in events_list]
+        docs = await db.db.events.find(query).sort([("created_at", -1), ("_id", -1)]).to_list(length=limit + 1)
     except Exception as e:
         logger.error(f"Error retrieving events for user {user_id}: {e}")
-        return []
+        return [], None
+
+    next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return [EventInDB(**event) for event in docs[:limit]], next_cursor
+
+async def _tombstone_faces(query: dict) -> int:
+    """
+    Record the FAISS ids of the matching faces in faiss_tombstones, then delete
+    the face records. The vectors stay in the index (unreachable, since search
+    resolves ids through faces) until compact_faiss_index removes them.
+    """
+    from datetime import datetime
+    cursor = db.db.faces.find(query, {"_id": 0, "image_embedded_number": 1, "event_id": 1, "photo_id": 1})
+
+    batch = []
+    tombstoned = 0
+    async for face in cursor:
+        if face.get("image_embedded_number", -1) < 0:
+            continue
+        batch.append({
+            "faiss_id": face["image_embedded_number"],
+            "event_id": face.get("event_id"),
+            "photo_id": face.get("photo_id"),
+            "created_at": datetime.utcnow()
+        })
+        if len(batch) >= settings.MONGO_BULK_BATCH_SIZE:
+            await db.db.faiss_tombstones.insert_many(batch, ordered=False)
+            tombstoned += len(batch)
+            batch = []
+    if batch:
+        await db.db.faiss_tombstones.insert_many(batch, ordered=False)
+        tombstoned += len(batch)
+
+    # Tombstones first: a crash here leaves harmless orphan face records, never orphan vectors
+    await db.db.faces.delete_many(query)
+    return tombstoned
+
+def remove_photo_files(file_paths: list):
+    """Delete photo files (originals and variants) from disk, then any directories left empty."""
+    import os
+    dirs = set()
+    for path in file_paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to delete {path}: {e}")
+        dirs.add(os.path.dirname(path))
+    # Deepest first so _derived/ goes before its event directory
+    for directory in sorted(dirs, key=len, reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # Not empty or already gone
+
+async def delete_photo(event_hex_id: str, photo_id: str) -> dict:
+    """
+    Delete one photo of an event: its faces (tombstoned for compaction), its
+    photos record and the file on disk. Returns None if the photo isn't in the event.
+    """
+    import asyncio
+    from bson import ObjectId
+    if not ObjectId.is_valid(photo_id):
+        return None
+
+    from services.derivatives import variant_paths
+    photo = await db.db.photos.find_one({"_id": ObjectId(photo_id), "event_id": event_hex_id}, {"file_path": 1, "variants": 1})
+    if not photo:
+        return None
+
+    faces_removed = await _tombstone_faces({"photo_id": photo["_id"]})
+    await db.db.photos.delete_one({"_id": photo["_id"]})
+    # Stored clusters still hold the photo; search ignores them until re-clustered
+    await db.db.events.update_one({"_id": ObjectId(event_hex_id)}, {"$inc": {"faces_version": 1}})
+    await asyncio.to_thread(remove_photo_files, variant_paths(photo))
+    return {"photos_deleted": 1, "faces_deleted": faces_removed}
+
+async def delete_event(event_hex_id: str) -> dict:
+    """
+    Delete an event with all of its photos, faces and files.
+    Face vectors are tombstoned and reclaimed by the next FAISS compaction.
+    """
+    import asyncio
+    from bson import ObjectId
+
+    faces_removed = await _tombstone_faces({"event_id": event_hex_id})
+
+    from services.derivatives import variant_paths
+    file_paths = []
+    photos_deleted = 0
+    async for photo in db.db.photos.find({"event_id": event_hex_id}, {"file_path": 1, "variants": 1}):
+        file_paths.extend(variant_paths(photo))
+        photos_deleted += 1
+    await db.db.photos.delete_many({"event_id": event_hex_id})
+    await db.db.face_clusters.delete_many({"event_id": event_hex_id})
+    await db.db.events.delete_one({"_id": ObjectId(event_hex_id)})
+
+    await asyncio.to_thread(remove_photo_files, file_paths)
+    from services.face_crop_store import face_crop_store
+    await asyncio.to_thread(face_crop_store.delete_event, event_hex_id)
+    return {"photos_deleted": photos_deleted, "faces_deleted": faces_removed}
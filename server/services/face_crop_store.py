@@ -0,0 +1,189 @@
+import numpy as np
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from services.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CROP_SIZE = 160
+CROP_SHAPE = (CROP_SIZE, CROP_SIZE, 3)
+CROP_BYTES = CROP_SIZE * CROP_SIZE * 3
+ID_BYTES = 8
+
+class FaceCropStore:
+    """
+    Packed on-disk store of the exact 160x160 face crops FaceNet was fed.
+
+    Layout: each process appends an event's crops to a rolling shard,
+    <root>/<event_id>/<shard>.crops (raw uint8 rows of 160x160x3) with
+    <shard>.ids (the int64 FAISS id of each row), and starts a new shard once
+    it reaches FACE_CROP_SHARD_MAX_MB. Shards are never shared between
+    processes, so appends need no cross-process locking. Face records point at
+    their row with {"crop": {"shard", "offset"}}. Shards written before
+    appending existed (<shard>.crops.npy / <shard>.ids.npy) are still read.
+
+    Crops are stored as uint8 pixels: MTCNN's (x - 127.5) / 128 standardization
+    of uint8 pixels inverts exactly, so re-encoding from the store reproduces
+    the original model input without decoding or detecting again.
+    """
+
+    def __init__(self, root: str = None, max_shard_bytes: int = None):
+        """
+        Args:
+            root (str): Base directory of the store (default FACE_CROP_STORE_DIR).
+            max_shard_bytes (int): Size at which a shard is closed (default FACE_CROP_SHARD_MAX_MB).
+        """
+        self.root = root or settings.FACE_CROP_STORE_DIR
+        self.max_shard_bytes = max_shard_bytes or settings.FACE_CROP_SHARD_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._open_shards = {}  # event_id -> shard this process appends to
+
+    def _event_dir(self, event_id: str) -> str:
+        # Event ids become directory names; refuse anything path-like
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", event_id):
+            raise ValueError(f"Invalid event id for crop store: {event_id!r}")
+        return os.path.join(self.root, event_id)
+
+    def _paths(self, event_id: str, shard: str) -> Tuple[str, str]:
+        base = os.path.join(self._event_dir(event_id), shard)
+        return f"{base}.crops", f"{base}.ids"
+
+    def _legacy_paths(self, event_id: str, shard: str) -> Tuple[str, str]:
+        base = os.path.join(self._event_dir(event_id), shard)
+        return f"{base}.crops.npy", f"{base}.ids.npy"
+
+    def _shard_for(self, event_id: str) -> str:
+        if os.getpid() != self._pid:
+            # Forked worker: the parent's shards belong to the parent
+            self._pid = os.getpid()
+            self._open_shards = {}
+        shard = self._open_shards.get(event_id)
+        if shard is not None:
+            crops_path, _ = self._paths(event_id, shard)
+            if not os.path.exists(crops_path) or os.path.getsize(crops_path) < self.max_shard_bytes:
+                return shard
+        shard = uuid.uuid4().hex
+        self._open_shards[event_id] = shard
+        return shard
+
+    @timed("crop_store_write")
+    def append(self, event_id: str, faiss_ids: np.ndarray, crops: np.ndarray) -> Tuple[str, int]:
+        """
+        Append crops to this process's current shard of the event. Rows count
+        as written once their ids are appended, which happens last; a torn
+        append (crash mid-write) is cut off by the next append to the shard.
+
+        Args:
+            event_id: Event the faces belong to.
+            faiss_ids: (N,) FAISS ids, row-aligned with crops.
+            crops: (N, 160, 160, 3) uint8 crops.
+
+        Returns:
+            (shard, first offset): crop i is row first_offset + i of the shard.
+        """
+        crops = np.asarray(crops, dtype=np.uint8)
+        if crops.ndim != 4 or crops.shape[1:] != CROP_SHAPE:
+            raise ValueError(f"Expected (N, {CROP_SIZE}, {CROP_SIZE}, 3) crops, got {crops.shape}")
+        if len(crops) != len(faiss_ids):
+            raise ValueError("faiss_ids and crops must have the same length")
+
+        with self._lock:
+            shard = self._shard_for(event_id)
+            if len(crops) == 0:
+                return shard, 0
+
+            os.makedirs(self._event_dir(event_id), exist_ok=True)
+            crops_path, ids_path = self._paths(event_id, shard)
+            rows = os.path.getsize(ids_path) // ID_BYTES if os.path.exists(ids_path) else 0
+            with open(crops_path, "ab") as f:
+                f.truncate(rows * CROP_BYTES)
+                f.write(np.ascontiguousarray(crops).tobytes())
+            with open(ids_path, "ab") as f:
+                f.truncate(rows * ID_BYTES)
+                f.write(np.asarray(faiss_ids, dtype=np.int64).tobytes())
+            return shard, rows
+
+    def shards(self, event_id: str) -> List[str]:
+        """Shards of an event, least recently written first."""
+        directory = self._event_dir(event_id)
+        if not os.path.isdir(directory):
+            return []
+        names = [name for name in os.listdir(directory)
+                 if (name.endswith(".ids") or name.endswith(".ids.npy")) and ".part" not in name]
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+        return [name.split(".", 1)[0] for name in names]
+
+    def open_shard(self, event_id: str, shard: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            ids (np.ndarray): FAISS id per row.
+            crops (np.memmap): Read-only (N, 160, 160, 3) view; pages load on access.
+        """
+        crops_path, ids_path = self._paths(event_id, shard)
+        if not os.path.exists(ids_path):
+            crops_path, ids_path = self._legacy_paths(event_id, shard)
+            return np.load(ids_path), np.load(crops_path, mmap_mode="r")
+
+        # Only rows whose id was written are complete
+        ids = np.fromfile(ids_path, dtype=np.int64, count=os.path.getsize(ids_path) // ID_BYTES)
+        if len(ids) == 0:
+            return ids, np.zeros((0,) + CROP_SHAPE, dtype=np.uint8)
+        return ids, np.memmap(crops_path, dtype=np.uint8, mode="r", shape=(len(ids),) + CROP_SHAPE)
+
+    def load(self, event_id: str, shard: str, offsets: List[int]) -> np.ndarray:
+        """Fetch specific rows of a shard (e.g. from face records' crop refs)."""
+        _, crops = self.open_shard(event_id, shard)
+        return np.asarray(crops[np.asarray(offsets, dtype=np.int64)])
+
+    def iter_event(self, event_id: str, batch_size: int = 256, live_ids: Optional[set] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Stream an event's crops in batches, shard by shard, at disk speed.
+
+        Args:
+            event_id: Event to read.
+            batch_size: Crops per yielded batch.
+            live_ids: If given, only rows whose FAISS id is in this set
+                      (skips faces deleted after their shard was written).
+
+        Yields:
+            (ids, crops) with crops a uint8 (B, 160, 160, 3) array.
+        """
+        for shard in self.shards(event_id):
+            try:
+                ids, crops = self.open_shard(event_id, shard)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable crop shard {event_id}/{shard}: {e}")
+                continue
+
+            rows = np.arange(len(ids))
+            if live_ids is not None:
+                rows = rows[np.fromiter((int(i) in live_ids for i in ids), dtype=bool, count=len(ids))]
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                yield ids[batch], np.asarray(crops[batch])
+
+    def delete_event(self, event_id: str):
+        with self._lock:
+            self._open_shards.pop(event_id, None)
+            shutil.rmtree(self._event_dir(event_id), ignore_errors=True)
+
+def crops_to_face_tensors(crops: np.ndarray):
+    """
+    Inverse of quality_checker.face_tensors_to_crops: uint8 (N, 160, 160, 3)
+    crops back to the standardized (N, 3, 160, 160) float tensors FaceNet takes.
+    """
+    import torch
+
+    batch = torch.from_numpy(np.ascontiguousarray(crops)).permute(0, 3, 1, 2).float()
+    return (batch - 127.5) / 128.0
+
+# Singleton instance
+face_crop_store = FaceCropStore()
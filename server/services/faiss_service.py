@@ -1,43 +1,120 @@
 import faiss
 import numpy as np
+import json
 import logging
 import os
 from typing import List, Tuple, Optional
+from config.settings import settings
+from services.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+LEGACY_INDEX_PATH = "faiss_index.bin"
+
+# Ids are global across indexes (re-embedding keeps them), so one counter serves every index
+NEXT_ID_KEY = "faiss:next_id"
+# Atomically hand out ARGV[2] ids, never starting below the index's next id ARGV[1]
+RESERVE_IDS_SCRIPT = """
+local start = math.max(tonumber(redis.call('GET', KEYS[1]) or '0'), tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], start + tonumber(ARGV[2]))
+return start
+"""
+
+def read_active_index() -> Tuple[str, Optional[str]]:
+    """
+    (index_path, model_version) named by the active-index pointer file.
+    Without a pointer the legacy faiss_index.bin is active.
+    """
+    try:
+        with open(settings.FAISS_ACTIVE_INDEX_FILE) as f:
+            active = json.load(f)
+        return active["index_path"], active.get("model_version")
+    except (OSError, ValueError, KeyError):
+        return LEGACY_INDEX_PATH, None
+
+def set_active_index(index_path: str, model_version: str):
+    """
+    Atomically point every process at another index (model cutover).
+    Readers pick it up on their next reload_index().
+    """
+    tmp_path = f"{settings.FAISS_ACTIVE_INDEX_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"index_path": index_path, "model_version": model_version}, f)
+    os.replace(tmp_path, settings.FAISS_ACTIVE_INDEX_FILE)
+    logger.info(f"Active FAISS index is now {index_path} ({model_version})")
+
 class FaissService:
     """
     Service for managing FAISS vector index operations.
     Encapsulates initialization, adding vectors, searching, and persistence.
     """
     
-    def __init__(self, dimension: int = 512, index_path: str = "faiss_index.bin"):
+    def __init__(self, dimension: int = 512, index_path: Optional[str] = None, model_version: Optional[str] = None):
         """
         Initialize the FAISS service.
         
         Args:
             dimension (int): Dimensionality of the embeddings (default 512 for FaceNet).
-            index_path (str): File path to save/load the index.
+            index_path (str): File path to save/load the index. If omitted, the
+                              active index is used and followed across cutovers.
+            model_version (str): Embedding model tag for a new index (default
+                                 EMBEDDING_MODEL_VERSION). Existing indexes keep their own tag.
         """
+        self.follow_active = index_path is None
+        active_path, active_version = read_active_index()
         self.dimension = dimension
-        self.index_path = index_path
+        self.index_path = index_path or active_path
+        # Model that produced the vectors; stored in the sidecar meta file
+        self.model_version = model_version or (active_version if self.follow_active else None) or settings.EMBEDDING_MODEL_VERSION
         self.index = None
+        # (mtime_ns, size) of the index file this process last loaded or wrote
+        self._file_signature = None
+        # Next id to assign; ids are never reused, even after removal
+        self.next_id = 0
+        # Next id reserve_ids hands out when Redis is unavailable (single-process mode)
+        self._next_local_id = 0
         
-        if os.path.exists(index_path):
-            self.load_index(index_path)
+        if os.path.exists(self.index_path):
+            self.load_index(self.index_path)
         else:
-            # Using IndexFlatL2 for exact search (best for <100k vectors)
-            # Requires embeddings to be L2 normalized for cosine capability
-            self.index = faiss.IndexFlatL2(dimension)
-            logger.info(f"Initialized new FAISS IndexFlatL2 with dimension {dimension}")
+            self.index = self._new_index(dimension)
+            logger.info(f"Initialized new FAISS IndexIDMap2(IndexFlatL2) with dimension {dimension}")
+
+    @staticmethod
+    def _new_index(dimension: int) -> faiss.Index:
+        # IndexFlatL2 for exact search (best for <100k vectors), wrapped in an
+        # id map so vectors keep their ids when others are removed.
+        # Requires embeddings to be L2 normalized for cosine capability
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+    @staticmethod
+    def _with_ids(index: faiss.Index) -> faiss.Index:
+        """
+        Wrap a legacy sequential-id index in an IndexIDMap2, keeping each
+        vector's position as its id so existing face records stay valid.
+        """
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return index
+        wrapped = FaissService._new_index(index.d)
+        if index.ntotal:
+            vectors = index.reconstruct_n(0, index.ntotal)
+            wrapped.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+        logger.info(f"Converted legacy FAISS index ({index.ntotal} vectors) to IndexIDMap2")
+        return wrapped
+
+    def _max_id(self) -> int:
+        if self.index.ntotal == 0:
+            return -1
+        return int(faiss.vector_to_array(self.index.id_map).max())
 
-    def add_vectors(self, embeddings: List[List[float]]) -> np.ndarray:
+    @timed("faiss_add")
+    def add_vectors(self, embeddings: List[List[float]], ids: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Adds vectors to the FAISS index.
         
         Args:
             embeddings: List of embedding vectors (list of floats).
+            ids: Explicit ids (re-embedding keeps each face's id); new ids are assigned if omitted.
             
         Returns:
             np.ndarray: Array of IDs (indices) for the added vectors.
@@ -55,15 +132,76 @@ class FaissService:
         if vectors.shape[1] != self.dimension:
             raise ValueError(f"Embedding dimension mismatch. Expected {self.dimension}, got {vectors.shape[1]}")
             
-        start_id = self.index.ntotal
-        self.index.add(vectors)
-        end_id = self.index.ntotal
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+        self.index.add_with_ids(vectors, ids)
+        self.next_id = max(self.next_id, int(ids.max()) + 1)
         
-        logger.info(f"Added {len(embeddings)} vectors to FAISS index. Total: {end_id}")
+        logger.info(f"Added {len(embeddings)} vectors to FAISS index. Total: {self.index.ntotal}")
+        # In-memory contents diverged from the file until the next save
+        self._file_signature = None
         
-        # Return the sequential IDs assigned by IndexFlatL2
-        return np.arange(start_id, end_id)
+        return ids
+
+    def reserve_ids(self, count: int) -> np.ndarray:
+        """
+        Hand out ids for vectors that will be added later with add_vectors(ids=...),
+        so ingest can write face records while it is still encoding. Ids come from
+        a Redis counter shared by all workers and never below next_id; without
+        Redis they are reserved in this process only (like the index lock).
+
+        Args:
+            count: Number of ids.
 
+        Returns:
+            np.ndarray: Consecutive int64 ids.
+        """
+        try:
+            from redis import Redis
+            client = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+            start = int(client.eval(RESERVE_IDS_SCRIPT, 1, NEXT_ID_KEY, self.next_id, count))
+        except Exception as e:
+            logger.warning(f"FAISS id counter unavailable, reserving ids in-process: {e}")
+            start = max(self.next_id, self._next_local_id)
+        self._next_local_id = max(self._next_local_id, start + count)
+        return np.arange(start, start + count, dtype=np.int64)
+
+    @timed("faiss_remove")
+    def remove_ids(self, ids: List[int]) -> int:
+        """
+        Removes vectors by id. Ids that are not in the index are ignored.
+        
+        Args:
+            ids: FAISS ids (faces.image_embedded_number) to remove.
+            
+        Returns:
+            int: Number of vectors actually removed.
+        """
+        if len(ids) == 0:
+            return 0
+        removed = self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        if removed:
+            self._file_signature = None
+        logger.info(f"Removed {removed} vectors from FAISS index. Total: {self.index.ntotal}")
+        return int(removed)
+
+    def get_vectors(self, ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fetches stored vectors by id, skipping ids that are not in the index.
+        
+        Returns:
+            found_ids (np.ndarray): The ids that were found, in input order.
+            vectors (np.ndarray): (len(found_ids), dimension) float32 vectors.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        found_ids = ids[np.isin(ids, faiss.vector_to_array(self.index.id_map))]
+        if len(found_ids) == 0:
+            return found_ids, np.zeros((0, self.dimension), dtype=np.float32)
+        return found_ids, self.index.reconstruct_batch(found_ids)
+
+    @timed("faiss_search")
     def search(self, query_vector: List[float], k: int = 5) -> Tuple[List[float], List[int]]:
         """
         Searches for the k nearest neighbors for a single query vector.
@@ -87,11 +225,17 @@ class FaissService:
         # Return flat lists for easier consumption
         return distances[0].tolist(), indices[0].tolist()
 
+    @timed("faiss_save")
     def save_index(self, file_path: Optional[str] = None):
         """Saves the current index to disk."""
         target_path = file_path or self.index_path
         try:
+            # next_id first: a stale meta file next to a newer index must never hand out used ids
+            with open(f"{target_path}.meta.json", "w") as f:
+                json.dump({"next_id": self.next_id, "model_version": self.model_version, "dimension": self.dimension}, f)
             faiss.write_index(self.index, target_path)
+            if target_path == self.index_path:
+                self._file_signature = self._read_signature()
             logger.info(f"Saved FAISS index to {target_path}")
         except Exception as e:
             logger.error(f"Failed to save FAISS index: {e}")
@@ -100,21 +244,69 @@ class FaissService:
     def load_index(self, file_path: str):
         """Loads an index from disk."""
         try:
-            self.index = faiss.read_index(file_path)
+            signature = self._read_signature() if file_path == self.index_path else None
+            self.index = self._with_ids(faiss.read_index(file_path))
             self.dimension = self.index.d
+            self._file_signature = signature
+            meta = self._read_meta(file_path)
+            self.next_id = max(int(meta.get("next_id", 0)), self._max_id() + 1)
+            # Untagged (pre-versioning) indexes were built with the original model
+            self.model_version = meta.get("model_version") or settings.EMBEDDING_MODEL_VERSION
             logger.info(f"Loaded FAISS index from {file_path}. Total vectors: {self.index.ntotal}")
         except Exception as e:
             logger.error(f"Failed to load index from {file_path}: {e}")
             # Fallback to new index to prevent service failure
             logger.warning("Initializing empty index due to load failure.")
-            self.index = faiss.IndexFlatL2(self.dimension)
+            self.index = self._new_index(self.dimension)
 
-    def reload_index(self):
-        """Reloads the index from disk if the file exists."""
-        if os.path.exists(self.index_path):
-            self.load_index(self.index_path)
-        else:
+    @staticmethod
+    def _read_meta(file_path: str) -> dict:
+        try:
+            with open(f"{file_path}.meta.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_signature(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) of the index file, or None if it doesn't exist."""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def index_version(self) -> str:
+        """
+        Identifies the index contents; changes whenever vectors are added or
+        the file on disk is replaced. Used to key search result caches.
+        """
+        if self._file_signature is None:
+            return f"{self.model_version}:mem-{id(self.index)}-{self.index.ntotal}"
+        mtime_ns, size = self._file_signature
+        return f"{self.model_version}:{mtime_ns}-{size}"
+
+    @timed("faiss_reload")
+    def reload_index(self, force: bool = False):
+        """
+        Reloads the index from disk if the file exists and changed since the
+        last load/save. Pass force=True to always re-read it.
+        Follows the active-index pointer, so a model cutover is picked up here.
+        """
+        if self.follow_active:
+            active_path, _ = read_active_index()
+            if active_path != self.index_path:
+                logger.info(f"Active FAISS index moved to {active_path}")
+                self.index_path = active_path
+                force = True
+
+        if not os.path.exists(self.index_path):
             logger.warning("Index file not found during reload. Keeping current in-memory index.")
+            return
+
+        if not force and self._file_signature is not None and self._read_signature() == self._file_signature:
+            return
+        self.load_index(self.index_path)
 
 # Singleton instance
 faiss_service = FaissService()
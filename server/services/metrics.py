@@ -0,0 +1,250 @@
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans sub-millisecond FAISS searches up to multi-minute ingest tasks
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+WORKER_SNAPSHOT_PREFIX = "metrics:worker:"
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = {json.dumps(key): value for key, value in self._values.items()}
+        return {"type": self.kind, "help": self.documentation, "labelnames": self.labelnames, "samples": samples}
+
+class Histogram(Counter):
+    """
+    Cumulative-bucket histogram with labels, in Prometheus semantics
+    (per-bucket counts, sum and count; quantiles are computed by the server).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # bisect_left: a value equal to a bound belongs to that bucket (le semantics)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            entry["counts"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = {json.dumps(key): {"counts": list(entry["counts"]), "sum": entry["sum"], "count": entry["count"]}
+                       for key, entry in self._values.items()}
+        return {"type": self.kind, "help": self.documentation, "labelnames": self.labelnames,
+                "buckets": list(self.buckets), "samples": samples}
+
+class MetricsRegistry:
+    """
+    Process-local metrics. The API renders its own registry plus the latest
+    snapshot every Celery worker process pushed to Redis, so one /metrics
+    scrape covers the whole deployment.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._last_push = 0.0
+
+    def _register(self, metric: Counter) -> Counter:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def push_snapshot(self, force: bool = False):
+        """
+        Store this process's snapshot in Redis for the API to merge. Called by
+        workers after each task; throttled to METRICS_PUSH_INTERVAL_SECONDS.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_push < settings.METRICS_PUSH_INTERVAL_SECONDS:
+            return
+        self._last_push = now
+        try:
+            from redis import Redis
+            client = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+            key = f"{WORKER_SNAPSHOT_PREFIX}{socket.gethostname()}:{os.getpid()}"
+            client.set(key, json.dumps(self.snapshot()), ex=settings.METRICS_WORKER_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not push metrics snapshot: {e}")
+
+    def render(self, include_workers: bool = True) -> str:
+        """Prometheus text exposition (format 0.0.4) of this process plus worker snapshots."""
+        snapshots = [self.snapshot()]
+        if include_workers:
+            snapshots += read_worker_snapshots()
+        return render_snapshots(snapshots)
+
+def read_worker_snapshots() -> List[Dict]:
+    """Latest snapshot of every live worker process; empty without Redis."""
+    try:
+        from redis import Redis
+        client = Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+        keys = list(client.scan_iter(match=f"{WORKER_SNAPSHOT_PREFIX}*", count=500))
+        payloads = client.mget(keys) if keys else []
+    except Exception as e:
+        logger.warning(f"Could not read worker metrics: {e}")
+        return []
+    return [json.loads(payload) for payload in payloads if payload]
+
+def _merge(snapshots: Iterable[Dict]) -> Dict[str, Dict]:
+    """Sum samples of the same metric and labels across processes."""
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = target = dict(metric, samples={})
+            elif target.get("buckets") != metric.get("buckets"):
+                logger.warning(f"Skipping {name} snapshot with different buckets")
+                continue
+            for key, value in metric["samples"].items():
+                current = target["samples"].get(key)
+                if metric["type"] == "histogram":
+                    if current is None:
+                        target["samples"][key] = {"counts": list(value["counts"]), "sum": value["sum"], "count": value["count"]}
+                    else:
+                        current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                else:
+                    target["samples"][key] = (current or 0.0) + value
+    return merged
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def render_snapshots(snapshots: Iterable[Dict]) -> str:
+    lines = []
+    for name, metric in sorted(_merge(snapshots).items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(metric["samples"].items()):
+            label_values = json.loads(key)
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(metric['labelnames'], label_values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], value["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{name}_bucket{_labels(metric['labelnames'], label_values, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labelnames'], label_values)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(metric['labelnames'], label_values)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+# Singleton instance
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "stage_duration_seconds", "Time spent in one pipeline stage (decode, detect, encode, faiss_*, mongo_*)",
+    ["stage", "scope"]
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+CELERY_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "celery_queue_wait_seconds", "Time a task spent in the broker queue before a worker started it", ["task", "queue"]
+)
+CELERY_TASK_SECONDS = metrics.histogram(
+    "celery_task_duration_seconds", "Celery task run time by final state", ["task", "state"]
+)
+
+# Label for stage timings: "api" in the web process, the task name while a worker runs a task
+_scope = {"name": "api"}
+
+def set_scope(name: str):
+    _scope["name"] = name
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one pipeline stage."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, scope=_scope["name"])
+
+def timed(stage: str):
+    """Decorator form of stage_timer for sync functions and methods."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,211 @@
+import hmac
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# No leading dot, so ids and artifact names can never be "." or ".."
+PROFILE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
+# torch.profiler is process-global, so one session at a time per process
+_session_lock = threading.Lock()
+
+def profiling_requested(header_value: Optional[str]) -> bool:
+    """
+    True when a request asked to be profiled with a valid X-Profile header.
+    Header triggering needs PROFILING_TOKEN; without it only the task kwarg works.
+    """
+    if not settings.PROFILING_ENABLED or not settings.PROFILING_TOKEN or not header_value:
+        return False
+    return hmac.compare_digest(header_value.encode(), settings.PROFILING_TOKEN.encode())
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for one thread: every interval it records the
+    thread's Python stack from sys._current_frames(). Cheap enough to leave on
+    for a whole ingest batch, unlike cProfile's per-call tracing. Captures
+    whatever that thread runs, so for async handlers other requests served by
+    the event loop meanwhile show up too.
+    """
+
+    def __init__(self, thread_id: int, interval: float, max_seconds: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_samples = int(max_seconds / interval)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, directory: str) -> Dict:
+        """Write folded stacks (flamegraph.pl / speedscope input) and a top-functions summary."""
+        with open(os.path.join(directory, "stacks.folded"), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        self_samples, total_samples = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for label in set(frames):
+                total_samples[label] += count
+        summary = {
+            "samples": self.samples,
+            "interval_seconds": self.interval,
+            "truncated": self.samples >= self.max_samples,
+            "top_self": [{"function": label, "samples": n, "share": round(n / max(1, self.samples), 4)}
+                         for label, n in self_samples.most_common(30)],
+            "top_total": [{"function": label, "samples": n, "share": round(n / max(1, self.samples), 4)}
+                          for label, n in total_samples.most_common(30)],
+        }
+        with open(os.path.join(directory, "cpu_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+class ProfileSession:
+    """
+    One profiling capture: a stack sampler on the calling thread plus a
+    torch.profiler trace of model calls. Artifacts go to PROFILE_DIR/<profile_id>/.
+    """
+
+    def __init__(self, name: str, kind: str):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)[:64]
+        self.profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{safe_name}-{uuid.uuid4().hex[:6]}"
+        self.kind = kind
+        self.directory = os.path.join(settings.PROFILE_DIR, self.profile_id)
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_SECONDS, settings.PROFILE_MAX_SECONDS)
+        self.torch_profiler = None
+        self.started_at = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if settings.PROFILE_TORCH:
+            try:
+                import torch
+                activities = [torch.profiler.ProfilerActivity.CPU]
+                if torch.cuda.is_available():
+                    activities.append(torch.profiler.ProfilerActivity.CUDA)
+                self.torch_profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+                self.torch_profiler.__enter__()
+            except Exception as e:
+                logger.warning(f"torch.profiler unavailable, CPU sampling only: {e}")
+                self.torch_profiler = None
+        self.started_at = time.time()
+        self.sampler.start()
+
+    def stop(self) -> Dict:
+        self.sampler.stop()
+        duration = time.time() - self.started_at
+        artifacts = {"cpu": self.sampler.write(self.directory)}
+
+        if self.torch_profiler is not None:
+            try:
+                self.torch_profiler.__exit__(None, None, None)
+                # Chrome trace: open in chrome://tracing or ui.perfetto.dev
+                self.torch_profiler.export_chrome_trace(os.path.join(self.directory, "torch_trace.json"))
+                with open(os.path.join(self.directory, "torch_ops.txt"), "w") as f:
+                    f.write(self.torch_profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=40))
+            except Exception as e:
+                logger.warning(f"Failed to export torch profile {self.profile_id}: {e}")
+
+        meta = {
+            "profile_id": self.profile_id,
+            "kind": self.kind,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_seconds": round(duration, 3),
+            "cpu_samples": artifacts["cpu"]["samples"],
+            "pid": os.getpid(),
+            "artifacts": sorted(os.listdir(self.directory)) + ["meta.json"]
+        }
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        logger.info(f"Profile {self.profile_id} written ({meta['duration_seconds']}s, {meta['cpu_samples']} samples)")
+        return meta
+
+@contextmanager
+def profile_session(name: str, kind: str):
+    """
+    Profile the enclosed block. Yields the ProfileSession, or None when
+    profiling is disabled or another capture is running in this process
+    (the block then runs unprofiled).
+    """
+    if not settings.PROFILING_ENABLED or not _session_lock.acquire(blocking=False):
+        if settings.PROFILING_ENABLED:
+            logger.info(f"Profile of {name} skipped: another capture is running")
+        yield None
+        return
+
+    session = ProfileSession(name, kind)
+    try:
+        session.start()
+        yield session
+    finally:
+        try:
+            session.stop()
+            prune_profiles()
+        except Exception as e:
+            logger.warning(f"Failed to write profile {session.profile_id}: {e}")
+        finally:
+            _session_lock.release()
+
+def list_profiles() -> List[Dict]:
+    """Metadata of stored profiles, newest first."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for profile_id in os.listdir(settings.PROFILE_DIR):
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, profile_id, "meta.json")) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Still being written, or not a profile
+    return sorted(profiles, key=lambda meta: meta.get("started_at", ""), reverse=True)
+
+def profile_artifact_path(profile_id: str, artifact: str) -> Optional[str]:
+    """Path of one artifact, or None if the id/name is invalid or missing."""
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id) or not PROFILE_ID_PATTERN.fullmatch(artifact):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, profile_id, artifact)
+    return path if os.path.isfile(path) else None
+
+def prune_profiles():
+    """Keep the newest PROFILE_MAX_KEPT profiles."""
+    for meta in list_profiles()[settings.PROFILE_MAX_KEPT:]:
+        shutil.rmtree(os.path.join(settings.PROFILE_DIR, meta["profile_id"]), ignore_errors=True)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Dict, Set
+
+from config.settings import settings
+from jobs.status import get_job_status, TERMINAL_STATES
+
+logger = logging.getLogger(__name__)
+
+class ProgressBroadcaster:
+    """
+    Fans one backend poll loop per task id out to every connected client.
+    A hundred dashboards watching the same upload cost one Redis poll per
+    interval instead of a hundred, and clients only receive changed snapshots.
+    """
+
+    def __init__(self, poll_interval: float = None):
+        self.poll_interval = poll_interval or settings.PROGRESS_STREAM_POLL_SECONDS
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._latest: Dict[str, dict] = {}
+
+    async def _poll(self, task_id: str):
+        last_payload = None
+        try:
+            while self._subscribers.get(task_id):
+                try:
+                    status = await asyncio.to_thread(get_job_status, task_id)
+                except Exception as e:
+                    logger.warning(f"Progress poll failed for {task_id}: {e}")
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                payload = json.dumps(status, default=str)
+                if payload != last_payload:
+                    last_payload = payload
+                    self._latest[task_id] = status
+                    for queue in list(self._subscribers.get(task_id, ())):
+                        # Slow clients only need the newest snapshot
+                        if queue.full():
+                            queue.get_nowait()
+                        queue.put_nowait(status)
+
+                if status.get("status") in TERMINAL_STATES:
+                    break
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            self._pollers.pop(task_id, None)
+            self._latest.pop(task_id, None)
+
+    async def subscribe(self, task_id: str) -> AsyncIterator[dict]:
+        """Yield status snapshots for task_id until it reaches a terminal state."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        if task_id in self._latest:
+            queue.put_nowait(self._latest[task_id])
+        if task_id not in self._pollers:
+            self._pollers[task_id] = asyncio.create_task(self._poll(task_id))
+
+        try:
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=settings.PROGRESS_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None  # Keepalive tick
+                    if task_id not in self._pollers:
+                        # Poller finished while we were idle and nothing new arrived
+                        return
+                    continue
+                yield status
+                if status.get("status") in TERMINAL_STATES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    self._subscribers.pop(task_id, None)
+
+    async def event_stream(self, task_id: str) -> AsyncIterator[str]:
+        """Server-sent events framing for subscribe()."""
+        async for status in self.subscribe(task_id):
+            if status is None:
+                yield ": keepalive\n\n"
+                continue
+            event = "done" if status.get("status") in TERMINAL_STATES else "progress"
+            yield f"event: {event}\ndata: {json.dumps(status, default=str)}\n\n"
+
+progress_broadcaster = ProgressBroadcaster()
@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Tuple
+
+from config.settings import settings
+from services.upload_writer import detect_image_type
+
+logger = logging.getLogger(__name__)
+
+class UploadSessionError(Exception):
+    """Raised for client errors on a resumable upload; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _session_dir(upload_id: str) -> str:
+    # upload_id is always a uuid4 hex we generated; reject anything else to keep paths safe
+    try:
+        uuid.UUID(hex=upload_id)
+    except ValueError:
+        raise UploadSessionError(404, "Upload session not found")
+    return os.path.join(settings.UPLOAD_SESSION_DIR, upload_id)
+
+def _meta_path(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "meta.json")
+
+def _data_path(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "data")
+
+def _lock_path(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "lock")
+
+def create_session(event_id: str, user_id: str, photographer_name: str, filename: str, size: int, sha256: Optional[str] = None) -> dict:
+    """
+    Start a resumable upload for one file.
+    Session state lives on disk (meta.json + data), so any API worker can resume it.
+    """
+    if size <= 0 or size > settings.UPLOAD_MAX_FILE_MB * 1024 * 1024:
+        raise UploadSessionError(413, f"File size must be between 1 byte and {settings.UPLOAD_MAX_FILE_MB}MB")
+
+    cleanup_expired_sessions()
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_session_dir(upload_id))
+    meta = {
+        "upload_id": upload_id,
+        "event_id": event_id,
+        "user_id": user_id,
+        "photographer_name": photographer_name,
+        "filename": filename,
+        "size": size,
+        "sha256": sha256.lower() if sha256 else None,
+        "created_at": datetime.utcnow().isoformat(),
+        "expires_at": (datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)).isoformat(),
+    }
+    _write_meta(meta)
+    open(_data_path(upload_id), "wb").close()
+    return meta
+
+def _write_meta(meta: dict):
+    # Replace atomically: lock-free readers (get_session) never see a torn file
+    path = _meta_path(meta["upload_id"])
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({key: value for key, value in meta.items() if key != "offset"}, f)
+    os.replace(f"{path}.tmp", path)
+
+def _read_meta(upload_id: str) -> dict:
+    try:
+        with open(_meta_path(upload_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadSessionError(404, "Upload session not found")
+
+def get_session(upload_id: str, user_id: str) -> dict:
+    """
+    Load a session owned by user_id, with its current offset.
+    A finalized session keeps its 'completed' record (file_path, task_id,
+    message) until it expires, so a client that lost the final response can
+    read the outcome instead of getting a 404.
+    """
+    meta = _read_meta(upload_id)
+    if meta["user_id"] != user_id:
+        raise UploadSessionError(404, "Upload session not found")
+    if datetime.fromisoformat(meta["expires_at"]) < datetime.utcnow():
+        delete_session(upload_id)
+        raise UploadSessionError(410, "Upload session expired")
+
+    if meta.get("completed"):
+        meta["offset"] = meta["size"]
+        return meta
+    try:
+        meta["offset"] = os.path.getsize(_data_path(upload_id))
+    except FileNotFoundError:
+        raise UploadSessionError(404, "Upload session not found")
+    return meta
+
+def delete_session(upload_id: str):
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
+
+def _acquire_lock(upload_id: str):
+    """
+    Cross-process lock (O_EXCL lock file) so two PATCHes can't append at once.
+    Locks older than UPLOAD_SESSION_LOCK_STALE_SECONDS are from crashed requests and are broken.
+    """
+    path = _lock_path(upload_id)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > settings.UPLOAD_SESSION_LOCK_STALE_SECONDS:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            raise UploadSessionError(409, "Another chunk is being written to this upload")
+    raise UploadSessionError(409, "Another chunk is being written to this upload")
+
+async def append_chunk(meta: dict, offset: int, body: AsyncIterator[bytes]) -> int:
+    """
+    Append a request body at the given offset, streaming it to disk.
+    Returns the new offset. The offset must equal the bytes already stored (tus semantics).
+    """
+    upload_id = meta["upload_id"]
+    _acquire_lock(upload_id)
+    try:
+        # Checked under the lock: meta["offset"] was read before it, so two PATCHes
+        # at the same offset could both pass a check against it and append twice
+        if _read_meta(upload_id).get("completed"):
+            # A retried final PATCH: nothing left to append, finalize_session returns the outcome
+            if offset != meta["size"]:
+                raise UploadSessionError(409, f"Offset mismatch: server has {meta['size']} bytes")
+            return offset
+        try:
+            stored = os.path.getsize(_data_path(upload_id))
+        except FileNotFoundError:
+            raise UploadSessionError(404, "Upload session not found")
+        if offset != stored:
+            raise UploadSessionError(409, f"Offset mismatch: server has {stored} bytes")
+
+        written = offset
+        out = await asyncio.to_thread(open, _data_path(upload_id), "ab")
+        try:
+            header_checked = offset >= 16
+            async for chunk in body:
+                if not chunk:
+                    continue
+                if written + len(chunk) > meta["size"]:
+                    raise UploadSessionError(413, "Chunk exceeds declared upload size")
+                if not header_checked and written + len(chunk) >= 16:
+                    # Reject non-images on the first bytes instead of after the whole file
+                    await asyncio.to_thread(out.flush)
+                    with open(_data_path(upload_id), "rb") as f:
+                        head = f.read(written)
+                    if detect_image_type((head + chunk)[:16]) is None:
+                        delete_session(upload_id)
+                        raise UploadSessionError(415, "File is not a supported image")
+                    header_checked = True
+                await asyncio.to_thread(out.write, chunk)
+                written += len(chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+    finally:
+        try:
+            os.remove(_lock_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    return written
+
+def finalize_session(meta: dict, dest_dir: str) -> Tuple[dict, bool]:
+    """
+    Verify a fully received upload and move it into the event directory.
+    Runs under the session lock and is idempotent: a retried final PATCH gets
+    the record of the first finalize back instead of racing it.
+    Returns (completed record, finalized_now). Only the call that finalized
+    (finalized_now) queues the file for ingest, then stores the outcome with
+    record_completion.
+    """
+    upload_id = meta["upload_id"]
+    data_path = _data_path(upload_id)
+    _acquire_lock(upload_id)
+    try:
+        meta = _read_meta(upload_id)
+        if meta.get("completed"):
+            return meta["completed"], False
+
+        hasher = hashlib.sha256()
+        try:
+            with open(data_path, "rb") as f:
+                ext = detect_image_type(f.read(16))
+                f.seek(0)
+                for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+        except FileNotFoundError:
+            raise UploadSessionError(404, "Upload session not found")
+
+        if ext is None:
+            delete_session(upload_id)
+            raise UploadSessionError(415, "File is not a supported image")
+        if meta["sha256"] and hasher.hexdigest() != meta["sha256"]:
+            delete_session(upload_id)
+            raise UploadSessionError(422, "Checksum mismatch; upload discarded")
+
+        os.makedirs(dest_dir, exist_ok=True)
+        final_path = os.path.abspath(os.path.join(dest_dir, f"{uuid.uuid4()}{ext}"))
+        # Recorded before the move, so lock-free readers never see the data gone without an outcome
+        meta["completed"] = {"file_path": final_path, "task_id": None, "message": None}
+        _write_meta(meta)
+        try:
+            shutil.move(data_path, final_path)
+        except BaseException:
+            del meta["completed"]
+            _write_meta(meta)
+            raise
+        return meta["completed"], True
+    finally:
+        try:
+            os.remove(_lock_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+def record_completion(upload_id: str, task_id: Optional[str], message: str):
+    """Store how a finalized upload was queued for ingest, for retries and HEAD."""
+    meta = _read_meta(upload_id)
+    meta["completed"].update({"task_id": task_id, "message": message})
+    _write_meta(meta)
+
+def cleanup_expired_sessions():
+    """Remove abandoned sessions past their expiry."""
+    if not os.path.isdir(settings.UPLOAD_SESSION_DIR):
+        return
+    now = datetime.utcnow()
+    for upload_id in os.listdir(settings.UPLOAD_SESSION_DIR):
+        try:
+            with open(os.path.join(settings.UPLOAD_SESSION_DIR, upload_id, "meta.json")) as f:
+                expires_at = datetime.fromisoformat(json.load(f)["expires_at"])
+        except (OSError, ValueError, KeyError):
+            continue
+        if expires_at < now:
+            shutil.rmtree(os.path.join(settings.UPLOAD_SESSION_DIR, upload_id), ignore_errors=True)
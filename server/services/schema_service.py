@@ -0,0 +1,146 @@
+from config.database import db
+from config.settings import settings
+from bson import ObjectId
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+import uuid
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Index definitions per collection.
+# The faces lookup index covers the search query
+# ({event_id, image_embedded_number: {$in}} projected to photo_id/confidence),
+# so MongoDB answers it from the index without fetching documents.
+INDEXES = {
+    "faces": [
+        IndexModel(
+            [("event_id", ASCENDING), ("image_embedded_number", ASCENDING), ("photo_id", ASCENDING), ("confidence", ASCENDING)],
+            name="event_faiss_lookup"
+        ),
+        IndexModel([("photo_id", ASCENDING)], name="photo_faces"),
+    ],
+    "photos": [
+        IndexModel([("event_id", ASCENDING), ("created_at", DESCENDING)], name="event_photos"),
+        IndexModel([("file_path", ASCENDING)], name="file_path"),
+    ],
+    "events": [
+        IndexModel([("created_by", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="photographer_events"),
+    ],
+    "face_clusters": [
+        IndexModel([("event_id", ASCENDING), ("generation", DESCENDING)], name="event_clusters"),
+    ],
+}
+
+async def ensure_indexes():
+    """
+    Create the indexes the query paths rely on. create_indexes is a no-op for
+    indexes that already exist, so this is safe to run on every startup.
+    """
+    for collection, indexes in INDEXES.items():
+        try:
+            names = await db.db[collection].create_indexes(indexes)
+            logger.info(f"Ensured indexes on {collection}: {names}")
+        except Exception as e:
+            logger.error(f"Failed to create indexes on {collection}: {e}")
+
+async def _claim_migration(name: str, owner: str) -> bool:
+    """
+    Atomically claim a migration so only one API worker runs it.
+    The claim is a lease kept alive by _renew_migration; one whose holder
+    stopped heartbeating (killed mid-run) is taken over.
+    Returns False if it is already done or running elsewhere.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.db.schema_migrations.insert_one({"_id": name, "status": "running", "owner": owner, "started_at": now, "heartbeat_at": now})
+        return True
+    except DuplicateKeyError:
+        pass
+    stale_before = now - timedelta(seconds=settings.MIGRATION_LEASE_SECONDS)
+    taken = await db.db.schema_migrations.find_one_and_update(
+        {"_id": name, "status": "running", "$or": [{"heartbeat_at": {"$lt": stale_before}}, {"heartbeat_at": {"$exists": False}}]},
+        {"$set": {"owner": owner, "started_at": now, "heartbeat_at": now}}
+    )
+    if taken is not None:
+        logger.info(f"Migration {name}: took over the expired lease of {taken.get('owner')}")
+    return taken is not None
+
+async def _renew_migration(name: str, owner: str):
+    """Extend the lease; raises if another worker has taken it over meanwhile."""
+    renewed = await db.db.schema_migrations.find_one_and_update(
+        {"_id": name, "owner": owner}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+    )
+    if renewed is None:
+        raise RuntimeError(f"Migration {name}: lease lost")
+
+async def migrate_face_records():
+    """
+    Move per-face copies of file_path/photographer_name/task_id into one
+    'photos' document per image and point faces at it via photo_id.
+    Safe to resume: photos are upserted on (event_id, file_path), so a run
+    stopped between the two writes of a photo doesn't create it twice.
+    """
+    name = "faces_photo_id_v1"
+    owner = uuid.uuid4().hex
+    if not await _claim_migration(name, owner):
+        return
+
+    migrated_photos = 0
+    renewed_at = time.monotonic()
+    try:
+        pipeline = [
+            {"$match": {"photo_id": {"$exists": False}, "file_path": {"$exists": True}}},
+            {"$group": {
+                "_id": {"event_id": "$event_id", "file_path": "$file_path"},
+                "photographer_name": {"$first": "$photographer_name"},
+                "task_id": {"$first": "$task_id"},
+                "created_at": {"$min": "$created_at"},
+            }},
+        ]
+        async for group in db.db.faces.aggregate(pipeline, allowDiskUse=True):
+            if time.monotonic() - renewed_at > settings.MIGRATION_LEASE_SECONDS / 3:
+                await _renew_migration(name, owner)
+                renewed_at = time.monotonic()
+
+            key = group["_id"]
+            photo = await db.db.photos.find_one_and_update(
+                {"event_id": key["event_id"], "file_path": key["file_path"]},
+                {"$setOnInsert": {
+                    "photographer_name": group.get("photographer_name"),
+                    "task_id": group.get("task_id"),
+                    "created_at": group.get("created_at") or datetime.utcnow(),
+                }},
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            await db.db.faces.update_many(
+                {"event_id": key["event_id"], "file_path": key["file_path"], "photo_id": {"$exists": False}},
+                {
+                    "$set": {"photo_id": photo["_id"]},
+                    "$unset": {"file_path": "", "photographer_name": "", "task_id": ""},
+                }
+            )
+            if ObjectId.is_valid(key["event_id"]):
+                # The faces only now become clusterable
+                await db.db.events.update_one({"_id": ObjectId(key["event_id"])}, {"$inc": {"faces_version": 1}})
+            migrated_photos += 1
+
+        await db.db.schema_migrations.update_one(
+            {"_id": name, "owner": owner},
+            {"$set": {"status": "completed", "completed_at": datetime.utcnow(), "photos_created": migrated_photos}}
+        )
+        logger.info(f"Migration {name} completed: {migrated_photos} photos created")
+    except BaseException as e:
+        # Includes cancellation at shutdown: release the claim so the next startup resumes where this one stopped
+        logger.error(f"Migration {name} stopped after {migrated_photos} photos: {e!r}")
+        try:
+            await asyncio.shield(db.db.schema_migrations.delete_one({"_id": name, "owner": owner, "status": "running"}))
+        except BaseException as release_error:
+            logger.error(f"Migration {name}: could not release the claim, it expires after {settings.MIGRATION_LEASE_SECONDS}s: {release_error!r}")
+        if not isinstance(e, Exception):
+            raise
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from typing import BinaryIO, List, NamedTuple, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """
+    Identify an image from its magic bytes.
+    Returns the file extension to store it under, or None if it isn't a supported image.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"avif", b"avis"):
+        return ".avif"
+    return None
+
+def write_image_stream(source: BinaryIO, dest_dir: str, chunk_size: Optional[int] = None, max_bytes: Optional[int] = None) -> Optional[SavedUpload]:
+    """
+    Copy an image stream to dest_dir in chunks, validating the header and hashing
+    on the way. Writes to a temporary '.part' file that is renamed on success,
+    so a half-written file is never picked up by processing.
+    Returns None if the stream is not a supported image or is too large.
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    max_bytes = max_bytes or settings.UPLOAD_MAX_FILE_MB * 1024 * 1024
+
+    header = source.read(chunk_size)
+    ext = detect_image_type(header[:16])
+    if ext is None:
+        return None
+
+    final_path = os.path.join(dest_dir, f"{uuid.uuid4()}{ext}")
+    part_path = final_path + ".part"
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(part_path, "wb") as out:
+            chunk = header
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File exceeds {settings.UPLOAD_MAX_FILE_MB}MB")
+                hasher.update(chunk)
+                out.write(chunk)
+                chunk = source.read(chunk_size)
+        os.replace(part_path, final_path)
+    except ValueError as e:
+        logger.warning(f"Upload rejected: {e}")
+        os.remove(part_path)
+        return None
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return SavedUpload(os.path.abspath(final_path), hasher.hexdigest(), size)
+
+async def save_uploads(files: list, dest_dir: str, concurrency: Optional[int] = None) -> List[Optional[SavedUpload]]:
+    """
+    Write UploadFiles to disk off the event loop with bounded concurrency.
+    Returns one entry per input file (None for rejected files), in order.
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.UPLOAD_WRITE_CONCURRENCY)
+
+    async def save_one(upload) -> Optional[SavedUpload]:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(write_image_stream, upload.file, dest_dir)
+            except Exception as e:
+                logger.error(f"Failed to save upload {upload.filename}: {e}")
+                return None
+
+    return await asyncio.gather(*(save_one(upload) for upload in files))
@@ -0,0 +1,86 @@
+import io
+import logging
+import os
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only, non-seekable target for ZipFile. Not being seekable makes
+    zipfile write each entry's CRC and sizes in a data descriptor after the
+    data, so nothing already sent ever has to be patched.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+def stream_zip(files: Iterable[Tuple[str, str]], chunk_size: int = None) -> Iterator[bytes]:
+    """
+    Stream a store-only (uncompressed: JPEG/WebP don't shrink) ZIP archive.
+
+    Memory stays at about one chunk: each file is read chunk_size bytes at a
+    time and every chunk is yielded before the next read, so a slow client
+    slows the disk reads instead of growing a buffer. Files that can't be
+    opened are skipped.
+
+    Args:
+        files: (archive name, path on disk) pairs.
+        chunk_size: Bytes per read; defaults to DOWNLOAD_CHUNK_SIZE.
+
+    Returns:
+        Iterator over the archive's bytes.
+    """
+    chunk_size = chunk_size or settings.DOWNLOAD_CHUNK_SIZE
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in files:
+            try:
+                source = open(path, "rb")
+            except OSError as e:
+                logger.warning(f"Skipping {path} in ZIP download: {e}")
+                continue
+            with source:
+                # file_size from stat lets zipfile decide on ZIP64 headers up front
+                info = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, mode="w") as entry:
+                    while chunk := source.read(chunk_size):
+                        entry.write(chunk)
+                        yield from sink.drain()
+            yield from sink.drain()
+    # Central directory
+    yield from sink.drain()
+
+def archive_names(paths: Iterable[str]) -> List[str]:
+    """Unique archive names from file basenames."""
+    names, seen = [], set()
+    for path in paths:
+        stem, ext = os.path.splitext(os.path.basename(path))
+        name, n = f"{stem}{ext}", 1
+        while name in seen:
+            n += 1
+            name = f"{stem}_{n}{ext}"
+        seen.add(name)
+        names.append(name)
+    return names
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("jwt")
+pytest.importorskip("bcrypt")
+pytest.importorskip("motor")
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from auth import dependencies
+from auth.utils import create_access_token
+
+@pytest.fixture
+def users(monkeypatch, fake_async_db):
+    lookups = []
+    find_one = fake_async_db.users.find_one
+
+    async def counting_find_one(query=None, projection=None):
+        lookups.append((query, projection))
+        return await find_one(query, projection)
+
+    monkeypatch.setattr(fake_async_db.users, "find_one", counting_find_one)
+    monkeypatch.setattr(dependencies, "db", SimpleNamespace(db=fake_async_db))
+    dependencies.user_cache.clear()
+    yield SimpleNamespace(collection=fake_async_db.users, lookups=lookups)
+    dependencies.user_cache.clear()
+
+def _current_user(token: str) -> dict:
+    return asyncio.run(dependencies.get_current_user(token))
+
+def test_user_is_looked_up_once_by_object_id(users):
+    user_id = ObjectId()
+    users.collection.docs.append({"_id": user_id, "name": "Ann", "role": "photographer"})
+    token = create_access_token({"sub": str(user_id)})
+
+    assert _current_user(token)["name"] == "Ann"
+    assert _current_user(token)["name"] == "Ann"
+    assert users.lookups == [({"_id": user_id}, {"hashed_password": 0})]
+
+def test_legacy_string_subjects_are_looked_up_as_strings(users):
+    users.collection.docs.append({"_id": "legacy-user", "name": "Bo"})
+    assert _current_user(create_access_token({"sub": "legacy-user"}))["name"] == "Bo"
+    assert users.lookups[0][0] == {"_id": "legacy-user"}
+
+def test_callers_cannot_modify_the_cached_document(users):
+    user_id = ObjectId()
+    users.collection.docs.append({"_id": user_id, "name": "Ann"})
+    token = create_access_token({"sub": str(user_id)})
+
+    _current_user(token)["id"] = "added by a handler"
+    assert "id" not in _current_user(token)
+
+def test_invalidate_user_forces_a_fresh_lookup(users):
+    user_id = ObjectId()
+    users.collection.docs.append({"_id": user_id, "name": "Ann", "role": "photographer"})
+    token = create_access_token({"sub": str(user_id)})
+    _current_user(token)
+
+    users.collection.docs[0]["role"] = "admin"
+    dependencies.invalidate_user(str(user_id))
+    assert _current_user(token)["role"] == "admin"
+    assert len(users.lookups) == 2
+
+def test_expired_and_forged_tokens_are_rejected_even_when_cached(users, monkeypatch):
+    user_id = ObjectId()
+    users.collection.docs.append({"_id": user_id, "name": "Ann"})
+
+    expired = create_access_token({"sub": str(user_id)}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException) as excinfo:
+        _current_user(expired)
+    assert excinfo.value.status_code == 401
+
+    token = create_access_token({"sub": str(user_id)})
+    _current_user(token)
+    monkeypatch.setattr(dependencies, "SECRET_KEY", "another-secret-key-for-unit-tests-only")
+    with pytest.raises(HTTPException):
+        _current_user(token)
+
+def test_unknown_user_is_rejected(users):
+    with pytest.raises(HTTPException) as excinfo:
+        _current_user(create_access_token({"sub": str(ObjectId())}))
+    assert excinfo.value.status_code == 401
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("torch")
+pytest.importorskip("facenet_pytorch")
+
+from config.settings import settings
+from jobs import tasks
+from services.bulk_writer import BulkWriter
+from services.faiss_service import FaissService
+
+DIM = 8
+
+class FakePipeline:
+    """Derivatives are out of scope here; photos are stored without variants."""
+
+    def submit(self, image, file_path, photo_doc):
+        return [(photo_doc, {})]
+
+    def drain(self):
+        return []
+
+    def close(self):
+        pass
+
+class FakeEncoder:
+    model_version = None
+
+    def load(self, model_version):
+        self.model_version = model_version
+
+    def encode_faces(self, faces):
+        for face in faces:
+            face["embedding"] = np.eye(DIM, dtype=np.float32)[face["pixel"] % DIM]
+        return faces
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch, fake_sync_db):
+    monkeypatch.chdir(tmp_path)
+    service = FaissService(dimension=DIM, index_path=str(tmp_path / "index.bin"))
+    events = []
+
+    class RecordingWriter(BulkWriter):
+        def add(self, collection, docs):
+            if collection == "faces":
+                events.append(("faces", len(docs)))
+            super().add(collection, docs)
+
+    def detect_faces(image):
+        events.append(("detect", int(image[0, 0, 0])))
+        return [{"box": [0, 0, 60, 60], "confidence": 0.99, "pixel": int(image[0, 0, 0]), "face": None}]
+
+    monkeypatch.setattr(tasks, "faiss_service", service)
+    monkeypatch.setattr(tasks, "get_sync_db", lambda: fake_sync_db)
+    monkeypatch.setattr(tasks, "BulkWriter", RecordingWriter)
+    monkeypatch.setattr(tasks, "DerivativePipeline", FakePipeline)
+    monkeypatch.setattr(tasks, "face_encoder", FakeEncoder())
+    monkeypatch.setattr(tasks.face_detector, "detect_faces", detect_faces)
+    monkeypatch.setattr(tasks.image_loader, "load_from_path", lambda path: np.full((200, 200, 3), int(path), dtype=np.uint8))
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")  # lock and id counter fall back to in-process
+    monkeypatch.setattr(settings, "FACE_CROP_STORE_ENABLED", False)
+    monkeypatch.setattr(settings, "INGEST_FILTER_ENABLED", False)
+    monkeypatch.setattr(settings, "INGEST_ENCODE_BATCH_SIZE", 2)
+    return service, events
+
+def test_face_records_are_written_while_detection_continues(ingest, fake_sync_db):
+    service, events = ingest
+    result = tasks.process_batch_upload_logic("t1", ["0", "1", "2", "3", "4"], "event1", "user1")
+
+    assert result["status"] == "completed"
+    assert result["faces_indexed"] == 5
+    # Every second face is encoded and handed to the writer before the next image is detected
+    assert events == [
+        ("detect", 0), ("detect", 1), ("faces", 2),
+        ("detect", 2), ("detect", 3), ("faces", 2),
+        ("detect", 4), ("faces", 1),
+    ]
+
+def test_face_records_carry_the_ids_their_vectors_get(ingest, fake_sync_db):
+    service, _ = ingest
+    tasks.process_batch_upload_logic("t1", ["0", "1", "2"], "event1", "user1")
+
+    faces = fake_sync_db.faces.docs
+    assert len(faces) == 3
+    photos = {photo["_id"]: photo["file_path"] for photo in fake_sync_db.photos.docs}
+    on_disk = FaissService(dimension=DIM, index_path=service.index_path)
+    for face in faces:
+        found, vectors = on_disk.get_vectors([face["image_embedded_number"]])
+        assert found.tolist() == [face["image_embedded_number"]]
+        # The fake encoder embeds image n as the n-th basis vector
+        assert int(np.argmax(vectors[0])) == int(photos[face["photo_id"]])
+
+def test_face_records_are_stored_before_vectors_become_searchable(ingest, fake_sync_db, monkeypatch):
+    service, _ = ingest
+    stored_at_add = []
+    add_vectors = service.add_vectors
+
+    def recording_add(embeddings, ids=None):
+        stored_at_add.append(sorted(face["image_embedded_number"] for face in fake_sync_db.faces.docs))
+        return add_vectors(embeddings, ids=ids)
+    monkeypatch.setattr(service, "add_vectors", recording_add)
+
+    tasks.process_batch_upload_logic("t1", ["0", "1", "2"], "event1", "user1")
+    assert stored_at_add == [[0, 1, 2]]
+
+def test_failed_indexing_discards_the_records_already_written(ingest, fake_sync_db, monkeypatch):
+    service, _ = ingest
+
+    def failing_add(embeddings, ids=None):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(service, "add_vectors", failing_add)
+
+    result = tasks.process_batch_upload_logic("t1", ["0", "1", "2"], "event1", "user1")
+    assert result["status"] == "failed"
+    assert fake_sync_db.faces.docs == []
+    assert fake_sync_db.photos.docs == []
+    assert sorted(t["faiss_id"] for t in fake_sync_db.faiss_tombstones.docs) == [0, 1, 2]
+
+def test_lock_timeout_discards_the_records_already_written(ingest, fake_sync_db, monkeypatch):
+    @contextmanager
+    def timed_out_lock(task_id):
+        raise RuntimeError("Could not acquire FAISS index lock")
+        yield
+    monkeypatch.setattr(tasks, "faiss_index_lock", timed_out_lock)
+
+    fake_sync_db.photos.insert_many([{"event_id": "event1", "task_id": "other", "file_path": "x"}])
+    result = tasks.process_batch_upload_logic("t1", ["0", "1", "2"], "event1", "user1")
+    assert result["status"] == "failed"
+    assert fake_sync_db.faces.docs == []
+    # Photos of other tasks are left alone
+    assert [photo["task_id"] for photo in fake_sync_db.photos.docs] == ["other"]
+
+def test_indexed_faces_bump_the_event_faces_version(ingest, fake_sync_db):
+    event_id = ObjectId()
+    fake_sync_db.events.insert_many([{"_id": event_id, "faces_version": 2}])
+
+    tasks.process_batch_upload_logic("t1", ["0", "1"], str(event_id), "user1")
+    assert fake_sync_db.events.docs[0]["faces_version"] == 3
+
+def test_failed_ingest_leaves_the_faces_version_alone(ingest, fake_sync_db, monkeypatch):
+    service, _ = ingest
+    event_id = ObjectId()
+    fake_sync_db.events.insert_many([{"_id": event_id, "faces_version": 2}])
+
+    def failing_save():
+        raise OSError("disk full")
+    monkeypatch.setattr(service, "save_index", failing_save)
+
+    assert tasks.process_batch_upload_logic("t1", ["0", "1"], str(event_id), "user1")["status"] == "failed"
+    assert fake_sync_db.events.docs[0]["faces_version"] == 2
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
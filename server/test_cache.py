@@ -0,0 +1,223 @@
+import asyncio
+import fnmatch
+import json
+import threading
+
+from services import cache as cache_module
+from services.cache import GenerationCounter, TTLCache, TieredCache
+
+class FakeRedis:
+    """In-memory stand-in for the few redis-py calls TieredCache makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.expiry[key] = ex
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self.data.pop(key, None) is not None
+            self.expiry.pop(key, None)
+        return removed
+
+    def scan_iter(self, match="*", count=None):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+    def pttl(self, key):
+        if key not in self.data:
+            return -2
+        return -1 if self.expiry.get(key) is None else int(self.expiry[key] * 1000)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    def expire(self, key, seconds):
+        self.expiry[key] = seconds
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            def execute(self):
+                return [getattr(client, name)(*args) for name, args in self.calls]
+        return Pipeline()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def _tiered(fake_redis: FakeRedis, **kwargs) -> TieredCache:
+    tiered = TieredCache("test", use_redis=True, **kwargs)
+    tiered._redis = fake_redis
+    return tiered
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    ttl_cache = TTLCache(maxsize=10, ttl=5)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2, ttl=60)
+    clock.now += 6
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.get("b") == 2
+
+def test_ttl_cache_evicts_least_recently_used():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    assert ttl_cache.get("a") == 1   # a is now the most recent
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1 and ttl_cache.get("c") == 3
+
+def test_ttl_cache_invalidate_where():
+    ttl_cache = TTLCache()
+    for key in [("e1", 1), ("e1", 2), ("e2", 1)]:
+        ttl_cache.set(key, True)
+    assert ttl_cache.invalidate_where(lambda key: key[0] == "e1") == 2
+    assert len(ttl_cache) == 1
+
+def test_tiered_cache_falls_through_to_redis():
+    fake_redis = FakeRedis()
+    writer = _tiered(fake_redis)
+    writer.set("k", {"v": [1, 2]}, ttl=30)
+    assert json.loads(fake_redis.data["cache:test:k"]) == {"v": [1, 2]}
+    assert fake_redis.expiry["cache:test:k"] == 30
+
+    # Another process: empty local tier, shared Redis tier
+    reader = _tiered(fake_redis)
+    assert reader.get("k") == {"v": [1, 2]}
+    assert reader.local.get("k") == {"v": [1, 2]}
+
+def test_tiered_cache_keeps_remaining_redis_ttl_locally(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    fake_redis = FakeRedis()
+    _tiered(fake_redis, ttl=30).set("missing-event", {"status": 404}, ttl=5)
+    fake_redis.expiry["cache:test:missing-event"] = 2   # 3s later, as Redis would report
+
+    reader = _tiered(fake_redis, ttl=30)
+    assert reader.get("missing-event") == {"status": 404}
+    clock.now += 2.5
+    # Gone locally when it is gone in Redis, not after the 30s default
+    assert reader.local.get("missing-event") is None
+
+def test_tiered_cache_async_methods_use_redis_off_the_event_loop():
+    class ThreadRecordingRedis(FakeRedis):
+        def __init__(self):
+            super().__init__()
+            self.threads = set()
+
+        def set(self, key, value, ex=None):
+            self.threads.add(threading.get_ident())
+            super().set(key, value, ex)
+
+        def pipeline(self):
+            self.threads.add(threading.get_ident())
+            return super().pipeline()
+
+        def delete(self, *keys):
+            self.threads.add(threading.get_ident())
+            return super().delete(*keys)
+
+    fake_redis = ThreadRecordingRedis()
+    writer, reader = _tiered(fake_redis), _tiered(fake_redis)
+
+    async def scenario():
+        await writer.aset("k", [1])
+        value = await reader.aget("k")
+        local_hit = await reader.aget("k")
+        await writer.adelete("k")
+        return value, local_hit, await _tiered(fake_redis).aget("k", "default")
+
+    assert asyncio.run(scenario()) == ([1], [1], "default")
+    assert fake_redis.threads and threading.get_ident() not in fake_redis.threads
+
+def test_tiered_cache_async_without_redis_stays_local():
+    tiered = TieredCache("test", use_redis=False)
+
+    async def scenario():
+        await tiered.aset("k", 1)
+        return await tiered.aget("k"), await tiered.aget("other", "default")
+
+    assert asyncio.run(scenario()) == (1, "default")
+
+def test_tiered_cache_invalidate_prefix_clears_both_tiers():
+    fake_redis = FakeRedis()
+    tiered = _tiered(fake_redis)
+    tiered.set("event1:a", 1)
+    tiered.set("event1:b", 2)
+    tiered.set("event2:a", 3)
+    assert tiered.invalidate_prefix("event1:") == 4   # two local + two Redis entries
+    assert tiered.get("event1:a") is None
+    assert tiered.get("event2:a") == 3
+
+def test_tiered_cache_treats_redis_errors_as_misses():
+    class BrokenRedis:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise ConnectionError("redis down")
+            return fail
+
+    tiered = _tiered(BrokenRedis())
+    tiered.set("k", 1)                  # local write still happens
+    assert tiered.get("k") == 1
+    assert tiered.get("missing", "default") == "default"
+    tiered.delete("k")
+    assert tiered.get("k") is None
+
+def test_generation_counter_local():
+    counter = GenerationCounter("test", ttl=60, use_redis=False)
+    assert counter.get("event1") == 0
+    counter.bump("event1")
+    assert counter.get("event1") == 1
+    assert counter.get("event2") == 0
+
+def test_generation_counter_is_shared_through_redis():
+    shared = FakeRedis()
+    deleting_worker = GenerationCounter("search", ttl=600, use_redis=True)
+    other_worker = GenerationCounter("search", ttl=600, use_redis=True)
+    deleting_worker._redis = other_worker._redis = shared
+
+    assert other_worker.get("event1") == 0
+    deleting_worker.bump("event1")
+    assert other_worker.get("event1") == 1
+    assert shared.expiry["generation:search:event1"] == 600
+
+def test_generation_counter_async_read():
+    shared = FakeRedis()
+    counter = GenerationCounter("search", ttl=600, use_redis=True)
+    counter._redis = shared
+    counter.bump("event1")
+    assert asyncio.run(counter.aget("event1")) == 1
+    assert asyncio.run(GenerationCounter("search", ttl=60, use_redis=False).aget("event1")) == 0
+
+def test_generation_counter_unreadable_without_redis():
+    class BrokenRedis:
+        def get(self, key):
+            raise ConnectionError("redis down")
+
+    counter = GenerationCounter("search", ttl=60, use_redis=True)
+    counter._redis = BrokenRedis()
+    assert counter.get("event1") is None
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,186 @@
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from services.clustering import cluster_embeddings, nearest_cluster, summarize_clusters
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _person(rng, center, count, spread=0.05):
+    return _unit(center + spread * rng.standard_normal((count, len(center))))
+
+def _same_partition(labels, expected):
+    # Labels are arbitrary; compare which faces share a cluster
+    return (labels[:, None] == labels[None, :]).tolist() == (expected[:, None] == expected[None, :]).tolist()
+
+def test_empty_input_has_no_labels():
+    assert cluster_embeddings(np.zeros((0, 8), dtype=np.float32), 0.6).shape == (0,)
+
+def test_separate_people_get_separate_components():
+    rng = np.random.default_rng(1)
+    a = _person(rng, np.eye(16)[0], 5)
+    b = _person(rng, np.eye(16)[1], 4)
+    labels = cluster_embeddings(np.vstack([a, b]), 0.6, batch_size=3)
+    assert _same_partition(labels, np.array([0] * 5 + [1] * 4))
+    assert sorted(set(labels.tolist())) == [0, 1]
+
+def test_blocked_distances_match_single_block():
+    rng = np.random.default_rng(2)
+    vectors = _unit(rng.standard_normal((40, 8)))
+    assert np.array_equal(cluster_embeddings(vectors, 0.8, batch_size=7),
+                          cluster_embeddings(vectors, 0.8, batch_size=4096))
+
+def test_bridging_face_links_two_people_without_diameter_cap():
+    a, b = np.eye(4)[0], np.eye(4)[1]
+    bridge = _unit([a + b])[0]
+    # Each end is 0.59 from the bridge, the two ends are 2.0 apart
+    vectors = _unit([a, a, bridge, b, b])
+    assert len(set(cluster_embeddings(vectors, 0.6).tolist())) == 1
+
+def test_diameter_cap_splits_bridged_component_at_the_bridge():
+    a, b = np.eye(4)[0], np.eye(4)[1]
+    bridge = _unit([a + b])[0]
+    vectors = _unit([a, a, bridge, b, b])
+    labels = cluster_embeddings(vectors, 0.6, max_diameter=1.2)
+    assert labels[0] == labels[1]
+    assert labels[3] == labels[4]
+    assert labels[0] != labels[3]
+    for label in set(labels.tolist()):
+        members = vectors[labels == label]
+        distances = ((members[:, None, :] - members[None, :, :]) ** 2).sum(axis=2)
+        assert distances.max() <= 1.2
+
+def test_diameter_split_of_a_long_chain_stays_within_the_batch_memory():
+    # 4000 faces around a circle: single-link chains them into one component
+    # (a short link distance keeps the edge list itself small)
+    n, batch_size, link_distance = 4000, 256, 0.002
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    vectors = np.zeros((n, 16), dtype=np.float32)
+    vectors[:, 0], vectors[:, 1] = np.cos(angles), np.sin(angles)
+    assert len(set(cluster_embeddings(vectors, link_distance, batch_size=batch_size).tolist())) == 1
+
+    tracemalloc.start()
+    labels = cluster_embeddings(vectors, link_distance, max_diameter=1.2, batch_size=batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # A dense N x N float32 matrix alone would be 64 MB
+    assert peak < 16 * 2 ** 20
+
+    assert 6 <= len(set(labels.tolist())) <= 20
+    for label in set(labels.tolist()):
+        members = vectors[labels == label]
+        distances = ((members[:, None, :] - members[None, :, :]) ** 2).sum(axis=2)
+        assert distances.max() <= 1.2 + 1e-5
+
+def test_diameter_cap_keeps_tight_clusters_whole():
+    rng = np.random.default_rng(3)
+    vectors = np.vstack([_person(rng, np.eye(16)[0], 6), _person(rng, np.eye(16)[1], 6)])
+    assert np.array_equal(cluster_embeddings(vectors, 0.6), cluster_embeddings(vectors, 0.6, max_diameter=1.2))
+
+def test_summarize_clusters_keeps_best_confidence_per_photo():
+    vectors = _unit([[1, 0], [1, 0.1], [0, 1]])
+    faces = [
+        {"photo_id": "p1", "confidence": 0.9},
+        {"photo_id": "p1", "confidence": 0.95},
+        {"photo_id": "p2", "confidence": 0.8},
+    ]
+    clusters = summarize_clusters(np.array([0, 0, 1]), vectors, faces)
+    assert [c["size"] for c in clusters] == [2, 1]
+    assert clusters[0]["photos"] == [{"photo_id": "p1", "confidence": 0.95}]
+    assert np.isclose(np.linalg.norm(clusters[0]["centroid"]), 1.0)
+    assert clusters[0]["centroid"].dtype == np.float32
+
+def test_nearest_cluster_is_clear_when_runner_up_is_far():
+    centroids = _unit([[1, 0, 0], [0, 1, 0]])
+    best, distance, ambiguous = nearest_cluster(centroids, _unit([[1, 0.1, 0]])[0], margin=0.15)
+    assert best == 0
+    assert distance < 0.05
+    assert not ambiguous
+
+def test_nearest_cluster_between_two_identities_is_ambiguous():
+    centroids = _unit([[1, 0, 0], [0, 1, 0]])
+    best, _, ambiguous = nearest_cluster(centroids, _unit([[1, 0.95, 0]])[0], margin=0.15)
+    assert best == 0
+    assert ambiguous
+
+def test_single_centroid_is_never_ambiguous():
+    _, _, ambiguous = nearest_cluster(_unit([[1, 0]]), _unit([[0, 1]])[0], margin=0.15)
+    assert not ambiguous
+
+def _clustering_env(tmp_path, monkeypatch, fake_sync_db):
+    pytest.importorskip("torch")
+    pytest.importorskip("facenet_pytorch")
+    from jobs import tasks
+    from services.faiss_service import FaissService
+
+    monkeypatch.chdir(tmp_path)
+    service = FaissService(dimension=4, index_path=str(tmp_path / "index.bin"))
+    service.add_vectors(_unit([[1, 0, 0, 0], [1, 0.05, 0, 0], [0, 1, 0, 0]]).tolist())
+    service.save_index()
+    monkeypatch.setattr(tasks, "faiss_service", service)
+    monkeypatch.setattr(tasks, "get_sync_db", lambda: fake_sync_db)
+    return tasks
+
+def test_clusters_record_the_event_faces_version(tmp_path, monkeypatch, fake_sync_db):
+    tasks = _clustering_env(tmp_path, monkeypatch, fake_sync_db)
+    event_id = ObjectId()
+    fake_sync_db.events.insert_many([{"_id": event_id, "faces_version": 7}])
+    # Face 3's ingest has written its record but not yet added its vector
+    fake_sync_db.faces.insert_many([
+        {"event_id": str(event_id), "photo_id": f"p{i}", "image_embedded_number": i, "confidence": 0.9} for i in range(4)
+    ])
+
+    result = tasks.cluster_event_faces_logic("t1", str(event_id))
+    assert result["status"] == "completed"
+    assert result["faces"] == 3
+    assert result["clusters"] == 2
+    assert {doc["faces_version"] for doc in fake_sync_db.face_clusters.docs} == {7}
+
+def test_unversioned_event_clusters_at_version_zero(tmp_path, monkeypatch, fake_sync_db):
+    tasks = _clustering_env(tmp_path, monkeypatch, fake_sync_db)
+    event_id = ObjectId()
+    fake_sync_db.events.insert_many([{"_id": event_id}])
+    fake_sync_db.faces.insert_many([{"event_id": str(event_id), "photo_id": "p0", "image_embedded_number": 0}])
+
+    tasks.cluster_event_faces_logic("t1", str(event_id))
+    assert {doc["faces_version"] for doc in fake_sync_db.face_clusters.docs} == {0}
+
+def _search_with_clusters(monkeypatch, fake_async_db, faces_version):
+    pytest.importorskip("torch")
+    pytest.importorskip("fastapi")
+    from routers import search
+
+    async def load_event_clusters(event_id):
+        return {
+            "centroids": _unit([[1, 0, 0, 0], [0, 1, 0, 0]]),
+            "photos": [[{"photo_id": "p0", "confidence": 0.9}], [{"photo_id": "p1", "confidence": 0.8}]],
+            "faces_version": faces_version,
+            "model_version": search.faiss_service.model_version,
+        }
+    monkeypatch.setattr(search, "load_event_clusters", load_event_clusters)
+    monkeypatch.setattr(search, "db", SimpleNamespace(db=fake_async_db))
+    return search
+
+def test_search_uses_clusters_built_from_the_current_faces(monkeypatch, fake_async_db):
+    search = _search_with_clusters(monkeypatch, fake_async_db, faces_version=3)
+    event_id = ObjectId()
+    fake_async_db.events.collection.insert_many([{"_id": event_id, "faces_version": 3}])
+
+    matches = asyncio.run(search.match_clusters(_unit([[1, 0.01, 0, 0]])[0], str(event_id)))
+    assert list(matches) == ["p0"]
+
+def test_search_falls_back_once_the_faces_changed(monkeypatch, fake_async_db):
+    search = _search_with_clusters(monkeypatch, fake_async_db, faces_version=3)
+    event_id = ObjectId()
+    fake_async_db.events.collection.insert_many([{"_id": event_id, "faces_version": 4}])
+
+    assert asyncio.run(search.match_clusters(_unit([[1, 0.01, 0, 0]])[0], str(event_id))) is None
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
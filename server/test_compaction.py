@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("facenet_pytorch")
+
+from bson import ObjectId
+
+from config.settings import settings
+from jobs import tasks
+from services.faiss_service import FaissService
+
+@pytest.fixture
+def index(tmp_path, monkeypatch, fake_sync_db):
+    monkeypatch.chdir(tmp_path)
+    service = FaissService(dimension=8, index_path=str(tmp_path / "index.bin"))
+    service.add_vectors(np.eye(8, dtype=np.float32)[:6].tolist())
+    service.save_index()
+    monkeypatch.setattr(tasks, "faiss_service", service)
+    monkeypatch.setattr(tasks, "get_sync_db", lambda: fake_sync_db)
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")  # lock falls back to unlocked
+    monkeypatch.setattr(settings, "FACE_CROP_STORE_DIR", str(tmp_path / "crops"))
+    return service
+
+def test_compaction_drains_tombstones(index, fake_sync_db):
+    fake_sync_db.faiss_tombstones.insert_many([{"faiss_id": 1}, {"faiss_id": 4}])
+
+    result = tasks.compact_faiss_index_logic("t1")
+    assert result["status"] == "completed"
+    assert result["vectors_removed"] == 2
+    assert fake_sync_db.faiss_tombstones.docs == []
+
+    on_disk = FaissService(dimension=8, index_path=index.index_path)
+    found, _ = on_disk.get_vectors(range(6))
+    assert found.tolist() == [0, 2, 3, 5]
+
+def test_compaction_sweeps_records_of_deleted_events(index, fake_sync_db):
+    live, deleted = ObjectId(), ObjectId()
+    fake_sync_db.events.insert_many([{"_id": live}])
+    fake_sync_db.faces.insert_many([
+        {"event_id": str(live), "image_embedded_number": 0},
+        {"event_id": str(deleted), "image_embedded_number": 2},
+        {"event_id": "legacy-slug", "image_embedded_number": 3},
+    ])
+    fake_sync_db.photos.insert_many([{"event_id": str(deleted), "file_path": "missing.jpg"}])
+
+    result = tasks.compact_faiss_index_logic("t2")
+    assert result["orphan_faces"] == 1
+    assert result["vectors_removed"] == 1
+    assert {face["event_id"] for face in fake_sync_db.faces.docs} == {str(live), "legacy-slug"}
+    assert fake_sync_db.photos.docs == []
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("motor")
+
+from bson import ObjectId
+
+from services import event_service
+from services.event_service import _decode_cursor, _encode_cursor, get_events_by_photographer
+
+@pytest.fixture
+def events(monkeypatch, fake_async_db):
+    monkeypatch.setattr(event_service, "db", SimpleNamespace(db=fake_async_db))
+    return fake_async_db.events
+
+def _add_events(events, user_id: str, created_at: list) -> list:
+    docs = [{"_id": ObjectId(), "name": f"Event {i}", "event_id": f"event-{i}", "created_by": user_id, "created_at": when}
+            for i, when in enumerate(created_at)]
+    events.docs.extend(docs)
+    return docs
+
+def _all_pages(user_id: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        page, cursor = asyncio.run(get_events_by_photographer(user_id, limit=limit, cursor=cursor))
+        pages.append([event.id for event in page])
+        if cursor is None:
+            return pages
+
+def test_cursor_round_trips_and_has_no_padding():
+    event = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456)}
+    cursor = _encode_cursor(event)
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == (event["created_at"], event["_id"])
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "eyJ0IjogMX0"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        _decode_cursor(cursor)
+
+def test_pages_cover_every_event_once_newest_first(events):
+    start = datetime(2024, 1, 1)
+    docs = _add_events(events, "u1", [start + timedelta(days=i) for i in range(7)])
+    _add_events(events, "someone-else", [start])
+
+    pages = _all_pages("u1", limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [str(doc["_id"]) for doc in reversed(docs)]
+
+def test_exact_multiple_of_limit_has_no_empty_last_page(events):
+    _add_events(events, "u1", [datetime(2024, 1, i + 1) for i in range(4)])
+    assert [len(page) for page in _all_pages("u1", limit=2)] == [2, 2]
+    assert _all_pages("u1", limit=4) == [_all_pages("u1", limit=10)[0]]
+
+def test_events_sharing_a_timestamp_split_across_pages_by_id(events):
+    same_time = datetime(2024, 1, 1, 9, 0)
+    docs = _add_events(events, "u1", [same_time] * 5)
+
+    pages = _all_pages("u1", limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted((str(doc["_id"]) for doc in docs), reverse=True)
+
+def test_events_added_between_pages_do_not_shift_the_next_page(events):
+    docs = _add_events(events, "u1", [datetime(2024, 1, i + 1) for i in range(4)])
+    first, cursor = asyncio.run(get_events_by_photographer("u1", limit=2))
+    _add_events(events, "u1", [datetime(2024, 2, 1)])
+
+    second, _ = asyncio.run(get_events_by_photographer("u1", limit=2, cursor=cursor))
+    assert [event.id for event in second] == [str(docs[1]["_id"]), str(docs[0]["_id"])]
+
+def test_photographer_slugs_resolve_in_one_query_then_from_cache(monkeypatch, fake_async_db):
+    monkeypatch.setattr(event_service, "db", SimpleNamespace(db=fake_async_db))
+    event_service.photographer_slug_cache.clear()
+    ann, bo = ObjectId(), ObjectId()
+    fake_async_db.users.docs.extend([{"_id": ann, "name": "Ann Lee"}, {"_id": bo, "name": "Bö Ström"}])
+    queries = []
+    find = fake_async_db.users.find
+
+    def counting_find(query=None, projection=None):
+        queries.append(query)
+        return find(query, projection)
+    monkeypatch.setattr(fake_async_db.users, "find", counting_find)
+
+    user_ids = [str(ann), str(bo), str(ann), "not-an-object-id"]
+    assert asyncio.run(event_service.get_photographer_slugs(user_ids)) == {str(ann): "ann-lee", str(bo): "bo-strom"}
+    assert asyncio.run(event_service.get_photographer_slugs(user_ids[:2])) == {str(ann): "ann-lee", str(bo): "bo-strom"}
+    assert len(queries) == 1
+    event_service.photographer_slug_cache.clear()
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
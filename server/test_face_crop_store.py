@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+
+from services.face_crop_store import CROP_BYTES, CROP_SHAPE, FaceCropStore
+
+def _crops(count, start=0):
+    # Each crop is filled with its own value so rows can be told apart
+    values = (start + np.arange(count)) % 256
+    return np.broadcast_to(values[:, None, None, None], (count,) + CROP_SHAPE).astype(np.uint8)
+
+def test_appends_share_one_shard_with_consecutive_offsets(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    first_shard, first_offset = store.append("event1", np.array([10, 11]), _crops(2))
+    second_shard, second_offset = store.append("event1", np.array([12, 13, 14]), _crops(3, start=2))
+
+    assert first_shard == second_shard
+    assert (first_offset, second_offset) == (0, 2)
+    assert store.shards("event1") == [first_shard]
+
+    ids, crops = store.open_shard("event1", first_shard)
+    assert ids.tolist() == [10, 11, 12, 13, 14]
+    assert crops.shape == (5,) + CROP_SHAPE
+    assert store.load("event1", first_shard, [3, 0])[:, 0, 0, 0].tolist() == [3, 0]
+
+def test_events_get_separate_shards(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    shard_a, _ = store.append("eventA", np.array([1]), _crops(1))
+    shard_b, offset_b = store.append("eventB", np.array([2]), _crops(1))
+    assert offset_b == 0
+    assert store.shards("eventA") == [shard_a]
+    assert store.shards("eventB") == [shard_b]
+
+def test_shard_rolls_over_at_size_cap(tmp_path):
+    store = FaceCropStore(root=str(tmp_path), max_shard_bytes=3 * CROP_BYTES)
+    first, _ = store.append("event1", np.array([1, 2]), _crops(2))
+    again, offset = store.append("event1", np.array([3, 4]), _crops(2))
+    rolled, rolled_offset = store.append("event1", np.array([5]), _crops(1))
+
+    # The cap is checked before an append, so a shard may end slightly above it
+    assert again == first and offset == 2
+    assert rolled != first and rolled_offset == 0
+    assert sorted(store.shards("event1")) == sorted([first, rolled])
+    live = np.concatenate([ids for ids, _ in store.iter_event("event1")])
+    assert sorted(live.tolist()) == [1, 2, 3, 4, 5]
+
+def test_torn_append_is_ignored_and_overwritten(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    shard, _ = store.append("event1", np.array([1]), _crops(1))
+    crops_path = os.path.join(str(tmp_path), "event1", f"{shard}.crops")
+    # A crash after the crops were written but before their ids
+    with open(crops_path, "ab") as f:
+        f.write(b"\xff" * (CROP_BYTES + 100))
+
+    ids, crops = store.open_shard("event1", shard)
+    assert ids.tolist() == [1] and len(crops) == 1
+
+    _, offset = store.append("event1", np.array([2]), _crops(1, start=7))
+    assert offset == 1
+    assert os.path.getsize(crops_path) == 2 * CROP_BYTES
+    assert store.load("event1", shard, [1])[0, 0, 0, 0] == 7
+
+def test_legacy_npy_shards_still_readable(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    event_dir = tmp_path / "event1"
+    event_dir.mkdir()
+    np.save(event_dir / "task123.crops.npy", _crops(2, start=5))
+    np.save(event_dir / "task123.ids.npy", np.array([40, 41], dtype=np.int64))
+
+    assert store.shards("event1") == ["task123"]
+    assert store.load("event1", "task123", [1])[0, 0, 0, 0] == 6
+    batches = list(store.iter_event("event1", live_ids={41}))
+    assert [ids.tolist() for ids, _ in batches] == [[41]]
+
+def test_delete_event_starts_a_fresh_shard(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    shard, _ = store.append("event1", np.array([1]), _crops(1))
+    store.delete_event("event1")
+    assert store.shards("event1") == []
+
+    new_shard, offset = store.append("event1", np.array([2]), _crops(1))
+    assert new_shard != shard and offset == 0
+
+def test_rejects_misshapen_crops_and_path_like_events(tmp_path):
+    store = FaceCropStore(root=str(tmp_path))
+    with pytest.raises(ValueError):
+        store.append("event1", np.array([1]), np.zeros((1, 10, 10, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        store.append("event1", np.array([1, 2]), _crops(1))
+    with pytest.raises(ValueError):
+        store.append("../event1", np.array([1]), _crops(1))
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
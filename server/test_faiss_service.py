@@ -0,0 +1,119 @@
+import faiss
+import numpy as np
+import pytest
+
+from config.settings import settings
+from services.faiss_service import FaissService
+
+DIM = 8
+
+@pytest.fixture(autouse=True)
+def isolated_index_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "FAISS_ACTIVE_INDEX_FILE", str(tmp_path / "faiss_active.json"))
+
+def _vectors(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+def test_removed_ids_are_gone_and_never_reused():
+    service = FaissService(dimension=DIM, index_path="index.bin")
+    ids = service.add_vectors(_vectors(5))
+    assert ids.tolist() == [0, 1, 2, 3, 4]
+
+    assert service.remove_ids([1, 3, 99]) == 2
+    assert service.index.ntotal == 3
+    found, _ = service.get_vectors([0, 1, 2, 3, 4])
+    assert found.tolist() == [0, 2, 4]
+
+    service.remove_ids([4])
+    service.save_index()
+    reloaded = FaissService(dimension=DIM, index_path="index.bin")
+    # 4 was the largest id and is gone, but the persisted next_id still covers it
+    assert reloaded.add_vectors(_vectors(1, seed=1)).tolist() == [5]
+
+def test_search_skips_removed_vectors():
+    service = FaissService(dimension=DIM, index_path="index.bin")
+    vectors = _vectors(4)
+    service.add_vectors(vectors)
+    service.remove_ids([2])
+    _, indices = service.search(vectors[2], k=4)
+    assert 2 not in indices
+    assert -1 in indices
+
+def test_legacy_flat_index_keeps_positional_ids():
+    legacy = faiss.IndexFlatL2(DIM)
+    legacy.add(np.asarray(_vectors(3), dtype=np.float32))
+    faiss.write_index(legacy, "index.bin")
+
+    service = FaissService(dimension=DIM, index_path="index.bin")
+    assert isinstance(service.index, faiss.IndexIDMap2)
+    found, vectors = service.get_vectors([0, 1, 2])
+    assert found.tolist() == [0, 1, 2]
+    np.testing.assert_allclose(vectors, np.asarray(_vectors(3), dtype=np.float32))
+    assert service.add_vectors(_vectors(1, seed=2)).tolist() == [3]
+
+def test_index_version_changes_on_add_and_save():
+    service = FaissService(dimension=DIM, index_path="index.bin")
+    service.save_index()
+    saved_version = service.index_version
+    service.add_vectors(_vectors(1))
+    assert service.index_version != saved_version
+    service.save_index()
+    assert service.index_version != saved_version
+
+def test_reload_picks_up_another_process_removal():
+    writer = FaissService(dimension=DIM, index_path="index.bin")
+    writer.add_vectors(_vectors(3))
+    writer.save_index()
+    reader = FaissService(dimension=DIM, index_path="index.bin")
+
+    writer.remove_ids([0])
+    writer.save_index()
+    reader.reload_index(force=True)
+    assert reader.index.ntotal == 2
+
+class FakeRedis:
+    """Runs the id reservation script against a dict, like Redis would atomically."""
+
+    def __init__(self):
+        self.data = {}
+
+    def eval(self, script, numkeys, key, next_id, count):
+        start = max(int(self.data.get(key, 0)), int(next_id))
+        self.data[key] = start + int(count)
+        return start
+
+def test_reserved_ids_are_shared_across_services_and_respect_next_id(monkeypatch):
+    import redis
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, *args, **kwargs: fake_redis))
+
+    first = FaissService(dimension=DIM, index_path="index.bin")
+    first.add_vectors(_vectors(3))
+    second = FaissService(dimension=DIM, index_path="index.bin")
+
+    assert first.reserve_ids(2).tolist() == [3, 4]
+    # Another worker's reservation continues the shared counter
+    assert second.reserve_ids(3).tolist() == [5, 6, 7]
+
+    # Vectors added later under their reserved ids move next_id past them
+    first.add_vectors(_vectors(2, seed=1), ids=np.array([3, 4]))
+    assert first.index.ntotal == 5
+    assert first.next_id == 5
+
+def test_reserved_ids_fall_back_to_process_counter_without_redis(monkeypatch):
+    import redis
+
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError("no redis")
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, *args, **kwargs: unavailable()))
+
+    service = FaissService(dimension=DIM, index_path="index.bin")
+    service.add_vectors(_vectors(2))
+    assert service.reserve_ids(2).tolist() == [2, 3]
+    assert service.reserve_ids(1).tolist() == [4]
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from ml.ingest_filter import IngestFilter
+
+FRONTAL = [[40, 50], [80, 50], [60, 70], [45, 90], [75, 90]]
+
+def _detection(box, landmarks=FRONTAL):
+    return {"box": box, "landmarks": landmarks}
+
+def test_rejects_small_faces_by_pixels_and_ratio():
+    ingest_filter = IngestFilter(min_face_px=32, min_face_ratio=0.05)
+    detections = [
+        _detection([0, 0, 20, 20]),     # below min_face_px
+        _detection([0, 0, 40, 40]),     # below 5% of a 1000px image
+        _detection([0, 0, 60, 60]),
+    ]
+    kept = ingest_filter.filter_geometry(detections, (1000, 1500, 3))
+    assert kept == [detections[2]]
+    assert ingest_filter.rejected["too_small"] == 2
+
+def test_rejects_profile_and_tilted_faces():
+    ingest_filter = IngestFilter(max_yaw=0.6, max_roll_degrees=40)
+    profile = _detection([0, 0, 100, 100], [[40, 50], [80, 50], [78, 70], [45, 90], [75, 90]])
+    tilted = _detection([0, 0, 100, 100], [[40, 50], [70, 90], [55, 70], [45, 90], [75, 90]])
+    frontal = _detection([0, 0, 100, 100])
+    no_landmarks = _detection([0, 0, 100, 100], None)
+
+    kept = ingest_filter.filter_geometry([profile, tilted, frontal, no_landmarks], (400, 400, 3))
+    assert kept == [frontal, no_landmarks]
+    assert ingest_filter.rejected["pose"] == 2
+
+def test_disabled_filter_keeps_everything_but_counts():
+    ingest_filter = IngestFilter(enabled=False)
+    detections = [_detection([0, 0, 10, 10]), _detection([0, 0, 100, 100])]
+    assert ingest_filter.filter_geometry(detections, (400, 400, 3)) == detections
+    stats = ingest_filter.stats()
+    assert stats["rejected"]["too_small"] == 1
+    assert stats["faces_kept"] == 2
+
+def test_policy_overrides_settings():
+    ingest_filter = IngestFilter.from_policy({"min_face_px": 80, "max_yaw": None, "unknown": 1})
+    assert ingest_filter.min_face_px == 80
+    assert ingest_filter.max_yaw == IngestFilter.from_policy().max_yaw
+
+def test_quality_gate_thresholds():
+    torch = pytest.importorskip("torch")
+    ingest_filter = IngestFilter(blur_threshold=40.0, darkness_threshold=30.0)
+    rng = np.random.default_rng(0)
+    sharp = torch.from_numpy(rng.uniform(-1, 1, size=(3, 160, 160)).astype(np.float32))
+    flat = torch.zeros(3, 160, 160)                       # brightness ~128, no edges
+    dark = torch.from_numpy(rng.uniform(-1, -0.85, size=(3, 160, 160)).astype(np.float32))
+    detections = [{"face": sharp}, {"face": flat}, {"face": dark}]
+
+    kept = ingest_filter.filter_quality(detections)
+    assert kept == [detections[0]]
+    assert ingest_filter.rejected["blurry"] == 1
+    assert ingest_filter.rejected["too_dark"] == 1
+    assert "quality" in detections[0]
+
+if __name__ == "__main__":
+    test_rejects_small_faces_by_pixels_and_ratio()
+    test_rejects_profile_and_tilted_faces()
+    test_disabled_filter_keeps_everything_but_counts()
+    test_policy_overrides_settings()
+    print("✅ Ingest filter tests passed")
@@ -0,0 +1,87 @@
+import pytest
+
+from jobs import status as job_status
+from jobs.status import get_job_status, merge_batch_results
+
+def _chunk(images: int = 10, faces: int = 4, **extra) -> dict:
+    result = {"status": "completed", "images_processed": images, "faces_indexed": faces,
+              "records_stored": faces, "photos_stored": images,
+              "filtering": {"faces_detected": faces + 1, "faces_kept": faces, "rejected": {"blurry": 1}}}
+    result.update(extra)
+    return result
+
+def _failed(error: str = "boom") -> dict:
+    return {"status": "failed", "error": error}
+
+class FakeGroup:
+    def __init__(self, child_ids):
+        self.results = [type("Child", (), {"id": child_id})() for child_id in child_ids]
+
+@pytest.fixture
+def backend(monkeypatch):
+    metas = {}
+    groups = {}
+    monkeypatch.setattr(job_status, "_task_meta", lambda task_id: metas[task_id])
+    monkeypatch.setattr(job_status.GroupResult, "restore", lambda task_id, app=None: groups.get(task_id))
+
+    def add_group(group_id, *chunk_metas):
+        groups[group_id] = FakeGroup([f"{group_id}-{i}" for i in range(len(chunk_metas))])
+        for i, meta in enumerate(chunk_metas):
+            metas[f"{group_id}-{i}"] = meta
+
+    metas["add_group"] = add_group
+    return metas
+
+def test_merge_sums_chunks_and_filtering():
+    merged = merge_batch_results([_chunk(), _chunk(images=5, faces=2, profile_id="p1")])
+    assert merged["status"] == "completed"
+    assert merged["images_processed"] == 15
+    assert merged["faces_indexed"] == 6
+    assert merged["filtering"]["rejected"] == {"blurry": 2}
+    assert merged["profile_ids"] == ["p1"]
+
+def test_merge_reports_partial_and_failed():
+    assert merge_batch_results([_chunk(), _failed()])["status"] == "partial"
+    merged = merge_batch_results([_failed("a"), "Traceback: lost worker"])
+    assert merged["status"] == "failed"
+    assert merged["failed_chunks"] == 2
+    assert merged["errors"] == ["a", "Traceback: lost worker"]
+
+def test_group_of_failed_chunks_is_failure(backend):
+    # Chunks catch their errors and return them, so Celery marks them SUCCESS
+    backend["add_group"]("g1", {"status": "SUCCESS", "result": _failed()}, {"status": "SUCCESS", "result": _failed()})
+    response = get_job_status("g1")
+    assert response["status"] == "FAILURE"
+    assert response["failed_chunks"] == 2
+    assert response["result"]["status"] == "failed"
+
+def test_group_with_some_failed_chunks_is_partial_success(backend):
+    backend["add_group"]("g2", {"status": "SUCCESS", "result": _chunk()}, {"status": "SUCCESS", "result": _failed()})
+    response = get_job_status("g2")
+    assert response["status"] == "SUCCESS"
+    assert response["partial_failure"] is True
+    assert response["result"]["status"] == "partial"
+
+def test_group_in_progress(backend):
+    backend["add_group"](
+        "g3",
+        {"status": "SUCCESS", "result": _chunk(images=10)},
+        {"status": "PROGRESS", "result": {"images_done": 5, "images_total": 10, "faces_found": 3, "images_per_second": 2.0}},
+    )
+    response = get_job_status("g3")
+    assert response["status"] == "PROGRESS"
+    assert response["progress"]["percent"] == 75.0
+    assert response["progress"]["images_done"] == 15
+    assert response["result"] is None
+
+def test_single_task_returning_failure_is_failure(backend):
+    backend["t1"] = {"status": "SUCCESS", "result": _failed("disk full")}
+    response = get_job_status("t1")
+    assert response["status"] == "FAILURE"
+    assert response["error"] == "disk full"
+
+    backend["t2"] = {"status": "SUCCESS", "result": _chunk()}
+    assert get_job_status("t2")["status"] == "SUCCESS"
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
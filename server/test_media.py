@@ -0,0 +1,116 @@
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config.settings import settings
+from routers import media
+from services.derivatives import derivative_path
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    (root / "p1" / "e1").mkdir(parents=True)
+    monkeypatch.setattr(media, "MEDIA_ROOT", os.path.realpath(root))
+    monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "")
+    monkeypatch.setattr(settings, "DERIVATIVE_FORMAT", "WEBP")
+    return root
+
+@pytest.fixture
+def client(media_root):
+    app = FastAPI()
+    app.include_router(media.router)
+    return TestClient(app)
+
+def _write(path, data: bytes = b"0123456789" * 10):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def _photo(media_root) -> str:
+    name = f"{uuid.uuid4()}.jpg"
+    _write(os.path.join(media_root, "p1", "e1", name))
+    return f"p1/e1/{name}"
+
+@pytest.mark.parametrize("path", ["../secret.txt", "p1/../../secret.txt", "/etc/passwd"])
+def test_resolve_rejects_paths_outside_the_media_root(media_root, path):
+    _write(os.path.join(os.path.dirname(media_root), "secret.txt"))
+    assert media._resolve(path, None) is None
+
+def test_resolve_skips_partial_uploads_and_directories(media_root):
+    _write(os.path.join(media_root, "p1", "e1", "upload.jpg.part"))
+    assert media._resolve("p1/e1/upload.jpg.part", None) is None
+    assert media._resolve("p1/e1", None) is None
+
+def test_resolve_prefers_variant_and_reports_fallback(media_root):
+    relative = _photo(media_root)
+    original = os.path.join(os.path.realpath(media_root), relative)
+    assert media._resolve(relative, "thumb")[0] == original
+    assert media._resolve(relative, "thumb")[2] is True
+    assert media._resolve(relative, None)[2] is False
+
+    # Variants of older ingests may be in the other format
+    avif = _write(derivative_path(original, "thumb", ".avif"))
+    file_path, _, fell_back = media._resolve(relative, "thumb")
+    assert (file_path, fell_back) == (avif, False)
+    webp = _write(derivative_path(original, "thumb", ".webp"))
+    assert media._resolve(relative, "thumb")[0] == webp
+
+def test_uuid_named_files_are_immutable_and_revalidate_with_etag(client, media_root):
+    relative = _photo(media_root)
+    response = client.get(f"/uploads/{relative}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == media.IMMUTABLE_CACHE_CONTROL
+    assert response.headers["content-type"] == "image/jpeg"
+
+    etag = response.headers["etag"]
+    revalidated = client.get(f"/uploads/{relative}", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+
+def test_other_files_get_the_mutable_max_age(client, media_root):
+    _write(os.path.join(media_root, "p1", "e1", "cover.jpg"))
+    response = client.get("/uploads/p1/e1/cover.jpg")
+    assert response.headers["cache-control"] == f"public, max-age={settings.MEDIA_MUTABLE_MAX_AGE_SECONDS}"
+
+def test_variant_fallback_is_not_cached_as_immutable(client, media_root):
+    relative = _photo(media_root)
+    fallback = client.get(f"/uploads/{relative}?variant=thumb")
+    assert fallback.status_code == 200
+    assert fallback.headers["cache-control"] == "no-cache"
+
+    original = os.path.join(os.path.realpath(media_root), relative)
+    _write(derivative_path(original, "thumb", ".webp"), b"thumb")
+    variant = client.get(f"/uploads/{relative}?variant=thumb", headers={"If-None-Match": fallback.headers["etag"]})
+    assert variant.status_code == 200
+    assert variant.content == b"thumb"
+    assert variant.headers["cache-control"] == media.IMMUTABLE_CACHE_CONTROL
+
+def test_range_requests_return_partial_content(client, media_root):
+    relative = _photo(media_root)
+    response = client.get(f"/uploads/{relative}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == b"0123456789"
+    assert response.headers["content-range"] == "bytes 10-19/100"
+
+def test_unknown_variant_and_missing_file(client, media_root):
+    relative = _photo(media_root)
+    assert client.get(f"/uploads/{relative}?variant=huge").status_code == 422
+    assert client.get("/uploads/p1/e1/missing.jpg").status_code == 404
+
+def test_accel_redirect_hands_the_body_to_nginx(client, media_root, monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected/")
+    relative = _photo(media_root)
+    response = client.get(f"/uploads/{relative}")
+    assert response.headers["x-accel-redirect"] == f"/protected/{relative}"
+    assert response.content == b""
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from services.metrics import Counter, Histogram, MetricsRegistry, render_snapshots
+
+def _lines(text: str) -> list:
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+def test_histogram_bucket_bounds_are_inclusive():
+    histogram = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.observe(value, stage="decode")
+
+    sample = histogram.snapshot()["samples"][json.dumps(["decode"])]
+    # le semantics: 0.1 counts toward the 0.1 bucket, 1.0 toward the 1.0 bucket
+    assert sample["counts"] == [2, 2, 1]
+    assert sample["count"] == 5
+    assert sample["sum"] == pytest.approx(4.65)
+
+def test_render_histogram_is_cumulative_and_ends_with_inf():
+    histogram = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 3.0):
+        histogram.observe(value, stage="decode")
+
+    text = render_snapshots([{"latency_seconds": histogram.snapshot()}])
+    assert text.startswith("# HELP latency_seconds Latency\n# TYPE latency_seconds histogram\n")
+    assert _lines(text) == [
+        'latency_seconds_bucket{stage="decode",le="0.1"} 1',
+        'latency_seconds_bucket{stage="decode",le="1"} 2',
+        'latency_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'latency_seconds_sum{stage="decode"} 3.55',
+        'latency_seconds_count{stage="decode"} 3',
+    ]
+
+def test_render_sums_snapshots_of_several_processes():
+    api, worker = Counter("tasks_total", "Tasks", ["state"]), Counter("tasks_total", "Tasks", ["state"])
+    api.inc(state="ok")
+    worker.inc(2, state="ok")
+    worker.inc(state="failed")
+
+    text = render_snapshots([{"tasks_total": api.snapshot()}, {"tasks_total": worker.snapshot()}])
+    assert _lines(text) == ['tasks_total{state="failed"} 1', 'tasks_total{state="ok"} 3']
+
+def test_render_merges_histograms_and_skips_mismatched_buckets():
+    first = Histogram("latency_seconds", "Latency", buckets=(1.0,))
+    second = Histogram("latency_seconds", "Latency", buckets=(1.0,))
+    other_buckets = Histogram("latency_seconds", "Latency", buckets=(2.0,))
+    first.observe(0.5)
+    second.observe(1.5)
+    other_buckets.observe(0.5)
+
+    text = render_snapshots([{"latency_seconds": m.snapshot()} for m in (first, second, other_buckets)])
+    assert 'latency_seconds_bucket{le="1"} 1' in _lines(text)
+    assert 'latency_seconds_count 2' in _lines(text)
+
+def test_label_values_are_escaped():
+    counter = Counter("requests_total", "Requests", ["route"])
+    counter.inc(route='/a"b\\c\nd')
+    assert _lines(render_snapshots([{"requests_total": counter.snapshot()}])) == [
+        'requests_total{route="/a\\"b\\\\c\\nd"} 1'
+    ]
+
+def test_registry_returns_existing_metric_and_renders_without_workers():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stages", ["stage"])
+    assert registry.histogram("stage_seconds", "Stages", ["stage"]) is histogram
+
+    with histogram.time(stage="detect"):
+        pass
+    text = registry.render(include_workers=False)
+    assert 'stage_seconds_count{stage="detect"} 1' in _lines(text)
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
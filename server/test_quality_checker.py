@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ml.quality_checker import FaceQualityChecker
+
+def _crops(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sharp = rng.integers(0, 256, size=(4, 160, 160, 3), dtype=np.uint8)
+    flat = np.full((2, 160, 160, 3), 128, dtype=np.uint8)
+    dark = rng.integers(0, 20, size=(2, 160, 160, 3), dtype=np.uint8)
+    gradient = np.tile(np.linspace(0, 255, 160, dtype=np.uint8)[None, :, None], (160, 1, 3))[None]
+    return np.concatenate([sharp, flat, dark, gradient])
+
+def test_check_batch_matches_check_face():
+    checker = FaceQualityChecker()
+    crops = _crops()
+    batch = checker.check_batch(crops)
+    assert len(batch) == len(crops)
+    for crop, verdict in zip(crops, batch):
+        single = checker.check_face(crop)
+        assert verdict["is_valid"] == single["is_valid"]
+        assert verdict["issues"] == single["issues"]
+        assert verdict["scores"]["blur"] == pytest.approx(single["scores"]["blur"], rel=1e-9, abs=1e-6)
+        assert verdict["scores"]["brightness"] == pytest.approx(single["scores"]["brightness"], rel=1e-9, abs=1e-6)
+
+def test_check_batch_flags_blurry_and_dark():
+    checker = FaceQualityChecker()
+    verdicts = checker.check_batch(_crops())
+    assert all(v["is_valid"] for v in verdicts[:4])
+    assert any("Blurry" in issue for issue in verdicts[4]["issues"])
+    assert any("Dark" in issue for issue in verdicts[6]["issues"])
+
+def test_check_batch_accepts_list_and_empty():
+    checker = FaceQualityChecker()
+    crops = _crops(1)
+    assert checker.check_batch([]) == []
+    assert checker.check_batch(list(crops)) == checker.check_batch(crops)
+
+if __name__ == "__main__":
+    test_check_batch_matches_check_face()
+    test_check_batch_flags_blurry_and_dark()
+    test_check_batch_accepts_list_and_empty()
+    print("✅ Quality checker tests passed")
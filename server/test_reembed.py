@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("facenet_pytorch")
+
+from types import SimpleNamespace
+
+from config.settings import settings
+from jobs import reembed
+from services.faiss_service import FaissService, read_active_index
+
+DIM = 8
+
+def _vector(faiss_id: int) -> np.ndarray:
+    return np.eye(DIM, dtype=np.float32)[faiss_id % DIM]
+
+class FakeEncoder:
+    """Embeds the 'tensor' _face_tensors hands out; on_encode runs before each batch."""
+
+    def __init__(self, model_version=None):
+        self.model_version = model_version
+        self.on_encode = None
+
+    def encode_tensors(self, batch):
+        if self.on_encode:
+            self.on_encode()
+        return np.asarray(batch, dtype=np.float32)
+
+@pytest.fixture
+def migration(tmp_path, monkeypatch, fake_sync_db):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "FAISS_ACTIVE_INDEX_FILE", str(tmp_path / "faiss_active.json"))
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")  # index lock falls back to unlocked
+    active = FaissService(dimension=DIM, index_path="faiss_index.bin", model_version="v1")
+    unembeddable = set()
+
+    def face_tensors(faces, sync_db):
+        # Stands in for the crop store: the "tensor" is already the new embedding
+        return {face["image_embedded_number"]: _vector(face["image_embedded_number"])
+                for face in faces if face["image_embedded_number"] not in unembeddable}
+
+    encoder = FakeEncoder("v2")
+    monkeypatch.setattr(reembed, "faiss_service", active)
+    monkeypatch.setattr(reembed, "_face_tensors", face_tensors)
+    monkeypatch.setattr(reembed, "torch", SimpleNamespace(stack=np.stack))
+    monkeypatch.setattr(reembed, "FaceEncoder", lambda model_version: encoder)
+    monkeypatch.setattr(reembed, "MODEL_REGISTRY", {"v2": {"dimension": DIM}})
+    monkeypatch.setattr(reembed, "get_sync_db", lambda: fake_sync_db)
+    monkeypatch.setattr(reembed, "schedule_event_clustering", lambda event_id: None)
+    return SimpleNamespace(active=active, encoder=encoder, unembeddable=unembeddable)
+
+def _ingest(active: FaissService, sync_db, faiss_ids):
+    # Same order as process_batch_upload_logic: records first, then vectors
+    sync_db.faces.insert_many([{"event_id": "event1", "photo_id": f"p{i}", "image_embedded_number": i} for i in faiss_ids])
+    active.add_vectors([_vector(i).tolist() for i in faiss_ids], ids=np.array(faiss_ids))
+    active.save_index()
+
+def test_delta_picks_up_faces_ingested_and_deleted_since_bulk_pass(migration, fake_sync_db):
+    _ingest(migration.active, fake_sync_db, [0, 1, 2])
+    target = FaissService(dimension=DIM, index_path="faiss_index.v2.bin", model_version="v2")
+    assert reembed._sync_delta(migration.encoder, target, fake_sync_db)["added"] == 3
+
+    _ingest(migration.active, fake_sync_db, [3])
+    migration.active.remove_ids([1])
+    migration.active.save_index()
+
+    delta = reembed._sync_delta(migration.encoder, target, fake_sync_db)
+    assert delta == {"added": 1, "removed": 1, "skipped": 0}
+    assert reembed._index_ids(target) == {0, 2, 3}
+
+def test_delta_refuses_to_drop_a_face_it_cannot_reembed(migration, fake_sync_db):
+    _ingest(migration.active, fake_sync_db, [0, 1])
+    migration.unembeddable.add(1)
+    target = FaissService(dimension=DIM, index_path="faiss_index.v2.bin", model_version="v2")
+
+    with pytest.raises(RuntimeError, match="could not be re-embedded"):
+        reembed._sync_delta(migration.encoder, target, fake_sync_db)
+
+def test_delta_skips_vectors_without_face_record(migration, fake_sync_db):
+    _ingest(migration.active, fake_sync_db, [0])
+    # A vector whose record write failed is unreachable from search
+    migration.active.add_vectors([_vector(1).tolist()], ids=np.array([1]))
+    migration.active.save_index()
+    target = FaissService(dimension=DIM, index_path="faiss_index.v2.bin", model_version="v2")
+
+    delta = reembed._sync_delta(migration.encoder, target, fake_sync_db)
+    assert delta == {"added": 1, "removed": 0, "skipped": 1}
+
+def test_ingest_during_reembed_is_in_the_new_index(migration, fake_sync_db):
+    _ingest(migration.active, fake_sync_db, [0, 1, 2])
+
+    def ingest_once():
+        # An upload finishes while the bulk pass is encoding
+        migration.encoder.on_encode = None
+        _ingest(migration.active, fake_sync_db, [3, 4])
+    migration.encoder.on_encode = ingest_once
+
+    result = reembed.reembed_index_logic("t1", "v2")
+    assert result["status"] == "completed"
+    assert read_active_index() == ("faiss_index.v2.bin", "v2")
+
+    new_index = FaissService(dimension=DIM)
+    assert new_index.model_version == "v2"
+    assert reembed._index_ids(new_index) == {0, 1, 2, 3, 4}
+    assert new_index.next_id == 5
+
+def test_failed_delta_leaves_the_active_index_in_place(migration, fake_sync_db):
+    _ingest(migration.active, fake_sync_db, [0, 1])
+    migration.unembeddable.add(1)
+
+    result = reembed.reembed_index_logic("t1", "v2")
+    assert result["status"] == "failed"
+    assert read_active_index()[0] == "faiss_index.bin"
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,166 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from config.settings import settings
+from services import resumable_upload
+from services.resumable_upload import UploadSessionError
+
+def _jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (120, 80, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+async def _body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+def _append(upload_id: str, offset: int, *chunks: bytes) -> int:
+    meta = resumable_upload.get_session(upload_id, "user1")
+    return asyncio.run(resumable_upload.append_chunk(meta, offset, _body(*chunks)))
+
+@pytest.fixture(autouse=True)
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_DIR", str(tmp_path / "sessions"))
+    return tmp_path
+
+def _session(data: bytes, sha256: str = None) -> str:
+    meta = resumable_upload.create_session("event1", "user1", "Photographer", "a.jpg", len(data), sha256)
+    return meta["upload_id"]
+
+def test_resume_from_server_offset_and_finalize(session_dir):
+    data = _jpeg()
+    upload_id = _session(data)
+    assert _append(upload_id, 0, data[:100]) == 100
+    assert resumable_upload.get_session(upload_id, "user1")["offset"] == 100
+    assert _append(upload_id, 100, data[100:200], data[200:]) == len(data)
+
+    meta = resumable_upload.get_session(upload_id, "user1")
+    completed, finalized_now = resumable_upload.finalize_session(meta, str(session_dir / "event"))
+    assert finalized_now
+    with open(completed["file_path"], "rb") as f:
+        assert f.read() == data
+
+def test_offset_mismatch_is_409():
+    data = _jpeg()
+    upload_id = _session(data)
+    _append(upload_id, 0, data[:100])
+    with pytest.raises(UploadSessionError) as error:
+        _append(upload_id, 50, data[50:150])
+    assert error.value.status_code == 409
+
+def test_duplicate_chunk_with_stale_offset_is_not_appended_twice():
+    data = _jpeg()
+    upload_id = _session(data)
+    # Both requests loaded the session (offset 0) before either took the lock
+    first = resumable_upload.get_session(upload_id, "user1")
+    second = resumable_upload.get_session(upload_id, "user1")
+    asyncio.run(resumable_upload.append_chunk(first, 0, _body(data[:100])))
+    with pytest.raises(UploadSessionError) as error:
+        asyncio.run(resumable_upload.append_chunk(second, 0, _body(data[:100])))
+    assert error.value.status_code == 409
+    assert resumable_upload.get_session(upload_id, "user1")["offset"] == 100
+
+def test_concurrent_chunk_is_409_while_locked():
+    data = _jpeg()
+    upload_id = _session(data)
+    resumable_upload._acquire_lock(upload_id)
+    with pytest.raises(UploadSessionError) as error:
+        _append(upload_id, 0, data[:100])
+    assert error.value.status_code == 409
+
+def test_oversized_and_non_image_uploads_are_rejected():
+    data = _jpeg()
+    upload_id = _session(data)
+    with pytest.raises(UploadSessionError) as error:
+        _append(upload_id, 0, data + b"extra")
+    assert error.value.status_code == 413
+
+    upload_id = _session(b"x" * 64)
+    with pytest.raises(UploadSessionError) as error:
+        _append(upload_id, 0, b"x" * 64)
+    assert error.value.status_code == 415
+    with pytest.raises(UploadSessionError) as error:
+        resumable_upload.get_session(upload_id, "user1")
+    assert error.value.status_code == 404
+
+def test_checksum_mismatch_discards_upload(session_dir):
+    data = _jpeg()
+    upload_id = _session(data, sha256="0" * 64)
+    _append(upload_id, 0, data)
+    meta = resumable_upload.get_session(upload_id, "user1")
+    with pytest.raises(UploadSessionError) as error:
+        resumable_upload.finalize_session(meta, str(session_dir / "event"))
+    assert error.value.status_code == 422
+
+def test_retried_final_patch_gets_the_first_result(session_dir):
+    data = _jpeg()
+    upload_id = _session(data)
+    _append(upload_id, 0, data)
+    # Both final PATCHes loaded the session before either finalized
+    first = resumable_upload.get_session(upload_id, "user1")
+    second = resumable_upload.get_session(upload_id, "user1")
+
+    completed, finalized_now = resumable_upload.finalize_session(first, str(session_dir / "event"))
+    resumable_upload.record_completion(upload_id, "task-1", "Queued")
+    assert finalized_now
+
+    # The retry's empty body at offset == size appends nothing and finalizes nothing
+    assert asyncio.run(resumable_upload.append_chunk(second, len(data), _body())) == len(data)
+    again, finalized_now = resumable_upload.finalize_session(second, str(session_dir / "event"))
+    assert not finalized_now
+    assert again == {"file_path": completed["file_path"], "task_id": "task-1", "message": "Queued"}
+    assert len(list((session_dir / "event").iterdir())) == 1
+
+    # A client that lost the response reads the outcome from the session
+    meta = resumable_upload.get_session(upload_id, "user1")
+    assert meta["offset"] == len(data)
+    assert meta["completed"]["task_id"] == "task-1"
+
+def test_concurrent_finalizes_move_the_file_once(session_dir):
+    data = _jpeg()
+    upload_id = _session(data)
+    _append(upload_id, 0, data)
+    metas = [resumable_upload.get_session(upload_id, "user1") for _ in range(8)]
+    barrier = threading.Barrier(len(metas))
+    outcomes = []
+
+    def finalize(meta):
+        barrier.wait()
+        try:
+            outcomes.append(resumable_upload.finalize_session(meta, str(session_dir / "event")))
+        except UploadSessionError as e:
+            # Lost the lock race; the client retries and gets the completed result
+            outcomes.append(e.status_code)
+
+    threads = [threading.Thread(target=finalize, args=(meta,)) for meta in metas]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(outcomes) == len(metas)
+    assert sum(1 for outcome in outcomes if outcome != 409 and outcome[1]) == 1
+    assert {outcome[0]["file_path"] for outcome in outcomes if outcome != 409} == {str(next((session_dir / "event").iterdir()))}
+    assert len(list((session_dir / "event").iterdir())) == 1
+
+def test_final_patch_with_a_wrong_offset_after_completion_is_409(session_dir):
+    data = _jpeg()
+    upload_id = _session(data)
+    _append(upload_id, 0, data)
+    resumable_upload.finalize_session(resumable_upload.get_session(upload_id, "user1"), str(session_dir / "event"))
+    with pytest.raises(UploadSessionError) as error:
+        _append(upload_id, 100, data[100:])
+    assert error.value.status_code == 409
+
+def test_sessions_are_private_to_their_owner():
+    upload_id = _session(_jpeg())
+    with pytest.raises(UploadSessionError) as error:
+        resumable_upload.get_session(upload_id, "someone-else")
+    assert error.value.status_code == 404
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
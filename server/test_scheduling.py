@@ -0,0 +1,88 @@
+import pytest
+
+from config.celery_app import celery_app
+from jobs import scheduling
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value.encode())
+        return len(self.data[key])
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+@pytest.fixture
+def sent(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(scheduling, "_redis", lambda: fake_redis)
+    sent = []
+
+    class Result:
+        id = "task-1"
+
+    def send_task(name, args=None, queue=None, countdown=None):
+        sent.append({"name": name, "args": args, "queue": queue, "countdown": countdown})
+        return Result()
+
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    return sent
+
+def test_completed_files_of_an_event_share_one_ingest_run(sent):
+    assert scheduling.queue_pending_file("a.jpg", "event1", "user1", "Name", {"min_face_px": 40}) == "task-1"
+    assert scheduling.queue_pending_file("b.jpg", "event1", "user1", "Name") is None
+    assert len(sent) == 1
+    assert sent[0]["name"] == "ingest_pending_files"
+    assert sent[0]["queue"] == scheduling.INTERACTIVE_QUEUE
+    assert sent[0]["args"] == ["event1", "user1", "Name", {"min_face_px": 40}]
+
+    assert scheduling.take_pending_files("event1", "user1") == ["a.jpg", "b.jpg"]
+    assert scheduling.take_pending_files("event1", "user1") == []
+
+def test_files_after_a_run_started_schedule_the_next_one(sent):
+    scheduling.queue_pending_file("a.jpg", "event1", "user1")
+    scheduling.take_pending_files("event1", "user1")
+    scheduling.queue_pending_file("b.jpg", "event1", "user1")
+    assert len(sent) == 2
+    assert scheduling.take_pending_files("event1", "user1") == ["b.jpg"]
+
+def test_pending_batches_are_per_event_and_uploader(sent):
+    scheduling.queue_pending_file("a.jpg", "event1", "user1")
+    scheduling.queue_pending_file("b.jpg", "event2", "user1")
+    scheduling.queue_pending_file("c.jpg", "event1", "user2")
+    assert len(sent) == 3
+    assert scheduling.take_pending_files("event1", "user1") == ["a.jpg"]
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
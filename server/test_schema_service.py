@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("motor")
+
+from bson import ObjectId
+
+from config.settings import settings
+from services import schema_service
+
+@pytest.fixture
+def fake_db(monkeypatch, fake_async_db):
+    monkeypatch.setattr(schema_service, "db", SimpleNamespace(db=fake_async_db))
+    return fake_async_db
+
+def test_faces_lookup_index_covers_the_search_query():
+    # match_index filters on event_id + image_embedded_number and projects photo_id/confidence
+    lookup = next(index for index in schema_service.INDEXES["faces"] if index.document["name"] == "event_faiss_lookup")
+    keys = list(lookup.document["key"])
+    assert keys[:2] == ["event_id", "image_embedded_number"]
+    assert {"photo_id", "confidence"} <= set(keys)
+
+def test_migration_moves_per_face_copies_into_photos(fake_db):
+    event_id = str(ObjectId())
+    legacy = {"event_id": event_id, "photographer_name": "Ann", "task_id": "t1", "created_at": datetime(2024, 1, 2)}
+    fake_db.faces.docs.extend([
+        dict(legacy, file_path="uploads/a.jpg", image_embedded_number=0),
+        dict(legacy, file_path="uploads/a.jpg", image_embedded_number=1, created_at=datetime(2024, 1, 1)),
+        dict(legacy, file_path="uploads/b.jpg", image_embedded_number=2),
+    ])
+
+    asyncio.run(schema_service.migrate_face_records())
+
+    photos = {photo["file_path"]: photo for photo in fake_db.photos.docs}
+    assert set(photos) == {"uploads/a.jpg", "uploads/b.jpg"}
+    assert photos["uploads/a.jpg"]["created_at"] == datetime(2024, 1, 1)
+    assert photos["uploads/a.jpg"]["photographer_name"] == "Ann"
+
+    by_id = {face["image_embedded_number"]: face for face in fake_db.faces.docs}
+    assert by_id[0]["photo_id"] == by_id[1]["photo_id"] == photos["uploads/a.jpg"]["_id"]
+    assert by_id[2]["photo_id"] == photos["uploads/b.jpg"]["_id"]
+    for face in by_id.values():
+        assert not {"file_path", "photographer_name", "task_id"} & set(face)
+
+    (migration,) = fake_db.schema_migrations.docs
+    assert migration["status"] == "completed"
+    assert migration["photos_created"] == 2
+
+def test_migration_runs_once(fake_db):
+    asyncio.run(schema_service.migrate_face_records())
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/late.jpg", "image_embedded_number": 5})
+
+    asyncio.run(schema_service.migrate_face_records())
+    assert fake_db.photos.docs == []
+    assert "photo_id" not in fake_db.faces.docs[0]
+
+def test_failed_migration_releases_its_claim(fake_db, monkeypatch):
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+
+    async def failing_upsert(*args, **kwargs):
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(fake_db.photos, "find_one_and_update", failing_upsert)
+
+    asyncio.run(schema_service.migrate_face_records())
+    # The next startup retries
+    assert fake_db.schema_migrations.docs == []
+
+def test_cancelled_migration_releases_its_claim(fake_db, monkeypatch):
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+
+    async def cancelled_upsert(*args, **kwargs):
+        raise asyncio.CancelledError()
+    monkeypatch.setattr(fake_db.photos, "find_one_and_update", cancelled_upsert)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(schema_service.migrate_face_records())
+    assert fake_db.schema_migrations.docs == []
+
+def test_expired_lease_is_taken_over(fake_db):
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+    # Left behind by a worker killed mid-run
+    stale = datetime.utcnow() - timedelta(seconds=settings.MIGRATION_LEASE_SECONDS + 1)
+    fake_db.schema_migrations.docs.append({"_id": "faces_photo_id_v1", "status": "running", "owner": "gone", "started_at": stale, "heartbeat_at": stale})
+
+    asyncio.run(schema_service.migrate_face_records())
+    (migration,) = fake_db.schema_migrations.docs
+    assert migration["status"] == "completed"
+    assert "photo_id" in fake_db.faces.docs[0]
+
+def test_live_lease_is_left_to_its_holder(fake_db):
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+    now = datetime.utcnow()
+    fake_db.schema_migrations.docs.append({"_id": "faces_photo_id_v1", "status": "running", "owner": "other", "started_at": now, "heartbeat_at": now})
+
+    asyncio.run(schema_service.migrate_face_records())
+    assert fake_db.schema_migrations.docs[0]["owner"] == "other"
+    assert "photo_id" not in fake_db.faces.docs[0]
+
+def test_resumed_migration_reuses_the_photo_of_an_interrupted_run(fake_db):
+    # The previous run created the photo, then stopped before updating the faces
+    fake_db.photos.collection.insert_many([{"event_id": "e1", "file_path": "uploads/a.jpg"}])
+    fake_db.faces.docs.append({"event_id": "e1", "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+
+    asyncio.run(schema_service.migrate_face_records())
+    (photo,) = fake_db.photos.docs
+    assert fake_db.faces.docs[0]["photo_id"] == photo["_id"]
+
+def test_migration_bumps_the_faces_version_of_migrated_events(fake_db):
+    event_id = ObjectId()
+    fake_db.events.collection.insert_many([{"_id": event_id, "faces_version": 1}])
+    fake_db.faces.docs.append({"event_id": str(event_id), "file_path": "uploads/a.jpg", "image_embedded_number": 0})
+
+    asyncio.run(schema_service.migrate_face_records())
+    assert fake_db.events.docs[0]["faces_version"] == 2
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,51 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from services.zip_stream import archive_names, stream_zip
+
+def _write(tmp_path, name: str, data: bytes) -> str:
+    path = os.path.join(tmp_path, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_streamed_archive_is_readable_by_zipfile(tmp_path):
+    contents = {"a.jpg": os.urandom(10_000), "b.jpg": b"", "c.jpg": os.urandom(123)}
+    files = [(name, _write(tmp_path, name, data)) for name, data in contents.items()]
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(files, chunk_size=1024))))
+    assert archive.testzip() is None
+    assert archive.namelist() == list(contents)
+    for info in archive.infolist():
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert archive.read(info) == contents[info.filename]
+
+def test_chunks_stay_near_the_read_size(tmp_path):
+    files = [("big.jpg", _write(tmp_path, "big.jpg", os.urandom(50_000)))]
+    chunks = list(stream_zip(files, chunk_size=4096))
+    assert len(chunks) > 10
+    # A data chunk plus at most one entry's headers
+    assert max(len(chunk) for chunk in chunks) < 4096 + 512
+
+def test_unreadable_files_are_skipped(tmp_path):
+    files = [
+        ("missing.jpg", os.path.join(tmp_path, "missing.jpg")),
+        ("ok.jpg", _write(tmp_path, "ok.jpg", b"jpeg bytes")),
+    ]
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(files))))
+    assert archive.namelist() == ["ok.jpg"]
+    assert archive.read("ok.jpg") == b"jpeg bytes"
+
+def test_empty_selection_is_a_valid_empty_archive():
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([]))))
+    assert archive.namelist() == []
+
+def test_archive_names_are_unique_basenames():
+    paths = ["uploads/p/e1/a.jpg", "uploads/p/e2/a.jpg", "uploads/p/e3/a.jpg", "uploads/p/e1/b.png"]
+    assert archive_names(paths) == ["a.jpg", "a_2.jpg", "a_3.jpg", "b.png"]
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))